@@ -23,11 +23,16 @@ from bento._config \
     import \
         USE_PRIVATE_MODULES
 
+# Most modules (commands, yaku) are only imported when first used, possibly
+# after a chdir: make sure they are never looked up relatively to the cwd when
+# bento is imported from a relative sys.path entry (e.g. from the checkout).
+__path__ = [op.abspath(p) for p in __path__]
+
 # FIXME: there has to be a better way to do this ?
 for bundled_pkg in ["_ply", "_simplejson", "_yaku", "_six"]:
     v = "BENTO_UNBUNDLE%s" % bundled_pkg.upper()
     if USE_PRIVATE_MODULES and not os.environ.get(v, False):
-        m_path = op.join(op.dirname(__file__), "private", bundled_pkg)
+        m_path = op.join(op.dirname(op.abspath(__file__)), "private", bundled_pkg)
         # XXX: we always add bundled packages for now because checking for file
         # existence is too naive (does not work for zip-import)
         sys.path.insert(0, m_path)
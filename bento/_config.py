@@ -32,6 +32,33 @@ CONFIGURED_STATE_DUMP = os.path.join(_SUB_BUILD_DIR, ".config.bin")
 DB_FILE = os.path.join(_SUB_BUILD_DIR, "cache.db")
 DISTCHECK_DIR = os.path.join(_SUB_BUILD_DIR, "distcheck")
 BUILD_MANIFEST_PATH = os.path.join(_SUB_BUILD_DIR, "build_manifest.info")
+# Same as BUILD_MANIFEST_PATH, in the binary format read on demand by install
+BUILD_MANIFEST_BIN_PATH = os.path.join(_SUB_BUILD_DIR, "build_manifest.bin")
+# Byte-compiled python files, keyed on source content (see build_egg)
+BYTECODE_CACHE_DIR = os.path.join(_SUB_BUILD_DIR, "bytecode")
+# Members of the archives created by sdist --incremental
+SDIST_MANIFEST_PATH = os.path.join(_SUB_BUILD_DIR, "sdist_manifest.json")
+# Files installed by install --incremental
+INSTALL_RECORD_PATH = os.path.join(_SUB_BUILD_DIR, "install_record.json")
+# Unix socket of the bentomaker server of a build directory
+DAEMON_SOCKET_PATH = os.path.join(_SUB_BUILD_DIR, "daemon.sock")
+# Directory listings of the source tree, reused by the next runs if the
+# BENTOMAKER_FS_SNAPSHOT environment variable is set (see FilesystemSnapshot)
+FILESYSTEM_SNAPSHOT_PATH = os.path.join(_SUB_BUILD_DIR, "fs_snapshot.bin")
+
+# Maximum number of evaluated package descriptions (one per set of user flags)
+# kept in DB_FILE
+PACKAGE_CACHE_SIZE = 16
+
+# Successful configuration tests shared between projects and build
+# directories, unless the BENTOMAKER_CONFTEST_CACHE environment variable is 0
+# (see yaku.conf.ConftestCache)
+CONFTEST_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") \
+                                  or os.path.join(os.path.expanduser("~"), ".cache"),
+                                  "bento", "conftests")
+# Maximum number of results kept in CONFTEST_CACHE_DIR, the least recently
+# used ones are removed first
+CONFTEST_CACHE_SIZE = 4096
 
 BENTO_SCRIPT = "bento.info"
 
@@ -1,5 +1,10 @@
+import os
+
 import os.path as op
 
+from bento._config \
+    import \
+        CONFTEST_CACHE_DIR, CONFTEST_CACHE_SIZE
 from bento.utils.utils \
     import \
         extract_exception
@@ -18,7 +23,11 @@ from bento.errors \
 from bento.backends.core \
     import \
         AbstractBackend
+from bento.utils.watch \
+    import \
+        layout_changed
 
+import yaku.conf
 import yaku.context
 import yaku.errors
 
@@ -28,6 +37,9 @@ class ConfigureYakuContext(ConfigureContext):
         build_path = run_node._ctx.bldnode.path_from(run_node)
         source_path = run_node._ctx.srcnode.path_from(run_node)
         self.yaku_context = yaku.context.get_cfg(src_path=source_path, build_path=build_path)
+        if os.environ.get("BENTOMAKER_CONFTEST_CACHE", "1") != "0":
+            cache_size = int(os.environ.get("BENTOMAKER_CONFTEST_CACHE_SIZE", CONFTEST_CACHE_SIZE))
+            self.yaku_context.conftest_cache = yaku.conf.ConftestCache(CONFTEST_CACHE_DIR, cache_size)
 
     def configure(self):
         extensions = get_extensions(self.pkg, self.run_node)
@@ -71,6 +83,9 @@ class BuildYakuContext(BuildContext):
             jobs = 1
         self.verbose = o.verbose
         self.jobs = jobs
+        # Tasks to run again when rebuilding, None if every task must be
+        # created again
+        self._invalidated_tasks = None
 
         def _builder_factory(category, builder):
             def _build(extension, include_dirs=None, **kw):
@@ -101,6 +116,28 @@ class BuildYakuContext(BuildContext):
         super(BuildYakuContext, self).finish()
         self.yaku_context.store()
 
+    def _rebuilt_categories(self, changes):
+        categories = super(BuildYakuContext, self)._rebuilt_categories(changes)
+        if self._invalidated_tasks is None:
+            return categories
+        else:
+            # the extensions outputs are kept with their tasks
+            return [c for c in categories if not c in ("extensions", "compiled_libraries")]
+
+    def rebuild(self, changes):
+        bld = self.yaku_context
+        paths = [path for event, path in changes]
+        # Content signatures of the changed files are always computed again,
+        # even if their size and mtime look unchanged
+        for path in paths:
+            bld.node_sigs.pop(path, None)
+        if layout_changed(changes):
+            bld.tasks = []
+            self._invalidated_tasks = None
+        else:
+            self._invalidated_tasks = invalidated_tasks(bld.tasks, paths)
+        super(BuildYakuContext, self).rebuild(changes)
+
     def compile(self):
         super(BuildYakuContext, self).compile()
 
@@ -110,21 +147,26 @@ class BuildYakuContext(BuildContext):
 
         reg = self.builder_registry
 
-        for category in ["extensions", "compiled_libraries"]:
-            for name, item in self._node_pkg.iter_category(category):
-                builder = reg.builder(category, name)
-                self.pre_recurse(item.ref_node)
-                try:
-                    item = item.extension_from(item.ref_node)
-                    builder(item)
-                finally:
-                    self.post_recurse()
+        if self._invalidated_tasks is None:
+            for category in ["extensions", "compiled_libraries"]:
+                for name, item in self._node_pkg.iter_category(category):
+                    builder = reg.builder(category, name)
+                    self.pre_recurse(item.ref_node)
+                    try:
+                        item = item.extension_from(item.ref_node)
+                        builder(item)
+                    finally:
+                        self.post_recurse()
+        else:
+            # Other tasks keep their signature, and are not run again
+            for task in self._invalidated_tasks:
+                task.cache = None
 
-        task_manager = yaku.task_manager.TaskManager(bld.tasks)
         if self.jobs < 2:
+            task_manager = yaku.task_manager.TaskManager(bld.tasks)
             runner = yaku.scheduler.SerialRunner(bld, task_manager)
         else:
-            runner = yaku.scheduler.ParallelRunner(bld, task_manager, self.jobs)
+            runner = yaku.scheduler.ParallelRunner(bld, bld.tasks, self.jobs)
         runner.start()
         runner.run()
 
@@ -142,6 +184,27 @@ class BuildYakuContext(BuildContext):
         self.yaku_context.path = self._old_path
         super(BuildYakuContext, self).post_recurse()
 
+def invalidated_tasks(tasks, paths):
+    """Return the tasks depending on one of the given files, directly or
+    through the outputs of another such task."""
+    changed = set(paths)
+    invalidated = set()
+    remaining = list(tasks)
+    while True:
+        found = []
+        for task in remaining:
+            for node in task.inputs + task.deps:
+                if node.abspath() in changed:
+                    found.append(task)
+                    break
+        if not found:
+            break
+        for task in found:
+            invalidated.add(task)
+            changed.update([node.abspath() for node in task.outputs])
+        remaining = [task for task in remaining if not task in invalidated]
+    return [task for task in tasks if task in invalidated]
+
 class YakuBackend(AbstractBackend):
     def register_command_contexts(self, context):
         context.register_command_context("configure", ConfigureYakuContext)
@@ -4,13 +4,16 @@ import os.path as op
 
 from bento.utils.utils \
     import \
-        subst_vars
+        SubstitutionContext, pprint, extract_exception
+from bento.utils.watch \
+    import \
+        create_watcher
 from bento.installed_package_description \
     import \
         BuildManifest, build_manifest_meta_from_pkg
 from bento._config \
     import \
-        BUILD_MANIFEST_PATH
+        BUILD_MANIFEST_PATH, BUILD_MANIFEST_BIN_PATH, BENTO_SCRIPT
 
 from bento.commands.core \
     import \
@@ -21,17 +24,22 @@ from bento.commands.core \
 from bento.utils \
     import \
         cpu_count
+from bento.utils.os2 \
+    import \
+        LINK_MODES
 
 class SectionWriter(object):
     def __init__(self):
         self.sections = {}
 
-    def store(self, filename, pkg):
+    def store(self, filename, pkg, binary_filename=None):
         meta = build_manifest_meta_from_pkg(pkg)
         p = BuildManifest(self.sections, meta, pkg.executables)
         if not op.exists(op.dirname(filename)):
             os.makedirs(op.dirname(filename))
         p.write(filename)
+        if binary_filename is not None:
+            p.write_binary(binary_filename)
 
 
 def jobs_callback(option, opt, value, parser):
@@ -45,11 +53,19 @@ Usage:   bentomaker build [OPTIONS]."""
     common_options = Command.common_options \
                         + [Option("-i", "--inplace",
                                   help="Build extensions in place", action="store_true"),
+                           Option("--link-mode", type="choice", choices=LINK_MODES, default="copy",
+                                  help="How to put built files in place with -i: 'copy', "
+                                       "'hardlink' or 'reflink' (copy if a link cannot be "
+                                       "created) [%default]"),
                            Option("-j", "--jobs",
                                   help="Parallel builds (yaku build only - EXPERIMENTAL)",
                                   dest="jobs", action="callback", callback=jobs_callback),
                            Option("-v", "--verbose",
                                   help="Verbose output (yaku build only)",
+                                  action="store_true"),
+                           Option("--watch",
+                                  help="Build again each time the sources change, until "
+                                       "interrupted",
                                   action="store_true")]
 
     def run(self, ctx):
@@ -65,13 +81,63 @@ Usage:   bentomaker build [OPTIONS]."""
     def finish(self, ctx):
         super(BuildCommand, self).finish(ctx)
         n = ctx.build_node.make_node(BUILD_MANIFEST_PATH)
-        ctx.section_writer.store(n.abspath(), ctx.pkg)
+        ctx.section_writer.store(n.abspath(), ctx.pkg,
+                                 ctx.build_node.make_node(BUILD_MANIFEST_BIN_PATH).abspath())
+
+def _description_files(pkg, top_node):
+    # Files whose changes require the package to be evaluated again
+    files = set()
+    for hook_file in pkg.hook_files:
+        files.add(top_node.make_node(hook_file).abspath())
+    for name, sub_package in pkg.subpackages.items():
+        files.add(top_node.make_node(sub_package.rdir).make_node(BENTO_SCRIPT).abspath())
+        for hook_file in sub_package.hook_files:
+            files.add(top_node.make_node(sub_package.rdir).make_node(hook_file).abspath())
+    files.add(top_node.make_node(BENTO_SCRIPT).abspath())
+    return files
+
+def watch_build(cmd, ctx, watcher=None):
+    """Build again with the given command and context (see
+    BuildContext.rebuild) each time the source tree changes, until
+    interrupted.
+
+    The build manifest is written after each build. Build failures are
+    reported, and the sources watched again. Watching stops when bento.info
+    or a hook file changes, as the package must then be evaluated again."""
+    if watcher is None:
+        watcher = create_watcher(ctx.top_node.abspath(), [ctx.build_node.abspath()])
+    description_files = _description_files(ctx.pkg, ctx.top_node)
+    pprint("BLUE", "Watching %s for changes (Ctrl-C to stop)" % ctx.top_node.abspath())
+    try:
+        while True:
+            # files copied by inplace builds are not sources
+            changes = [(event, path) for event, path in watcher.wait() \
+                       if not path in ctx.inplace_outputs]
+            if not changes:
+                continue
+            for event, path in changes:
+                if path in description_files:
+                    pprint("YELLOW", "%s changed: the build must be started again" % path)
+                    return
+            pprint("BLUE", "%d file(s) changed, building again" % len(changes))
+            try:
+                ctx.rebuild(changes)
+                cmd.finish(ctx)
+                ctx.finish()
+            except Exception:
+                e = extract_exception()
+                pprint("RED", "Build failed: %s" % e)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 def _config_content(paths):
     keys = sorted(paths.keys())
     n = max([len(k) for k in keys]) + 2
     content = []
+    context = SubstitutionContext(paths)
     for name, value in sorted(paths.items()):
-        content.append('%s = %r' % (name.upper().ljust(n), subst_vars(value, paths)))
+        content.append('%s = %r' % (name.upper().ljust(n), context.subst(value)))
     return "\n".join(content)
 
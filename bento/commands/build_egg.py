@@ -1,16 +1,35 @@
 import os
+import struct
+import calendar
+import hashlib
 import warnings
 
+import six
+
+try:
+    from importlib.util \
+        import \
+            MAGIC_NUMBER
+except ImportError:
+    import imp
+    MAGIC_NUMBER = imp.get_magic()
+
 from bento._config \
     import \
-        BUILD_MANIFEST_PATH
+        BUILD_MANIFEST_PATH, BYTECODE_CACHE_DIR
 from bento.commands.core \
     import \
         Command, Option
 from bento.commands.egg_utils \
     import \
         EggInfo, egg_filename
-from bento.utils.utils import pprint, extract_exception
+from bento.utils.utils import pprint, cpu_count
+from bento.utils.io2 \
+    import \
+        safe_write
+from bento.utils.archive \
+    import \
+        ZipArchive, reproducible_date_time
 from bento.core \
     import \
         PackageMetadata
@@ -21,7 +40,6 @@ from bento.installed_package_description \
     import \
         BuildManifest, iter_files
 
-import bento.compat.api as compat
 import bento.utils.path
 
 class BuildEggCommand(Command):
@@ -33,7 +51,13 @@ Usage:   bentomaker build_egg [OPTIONS]"""
                         + [Option("--output-dir",
                                   help="Output directory", default="dist"),
                            Option("--output-file",
-                                  help="Output filename")]
+                                  help="Output filename"),
+                           Option("--reproducible",
+                                  help="Use a fixed timestamp for every egg entry "
+                                       "(SOURCE_DATE_EPOCH if set)",
+                                  action="store_true"),
+                           Option("--compression-level",
+                                  help="zlib compression level (0-9)", type="int")]
 
     def run(self, ctx):
         argv = ctx.command_argv
@@ -47,9 +71,91 @@ Usage:   bentomaker build_egg [OPTIONS]"""
 
         n = ctx.build_node.make_node(BUILD_MANIFEST_PATH)
         build_manifest = BuildManifest.from_file(n.abspath())
-        build_egg(build_manifest, ctx.build_node, ctx.build_node, output_dir, output_file)
+        build_egg(build_manifest, ctx.build_node, ctx.build_node, output_dir, output_file,
+                  reproducible=o.reproducible, compression_level=o.compression_level)
+
+# Below this number of files to compile, starting worker processes costs more
+# than it saves
+_POOL_THRESHOLD = 16
+
+def _set_bytecode_mtime(bytecode, mtime):
+    # The bytecode header holds the source mtime
+    return bytecode[:4] + struct.pack("<I", int(mtime) & 0xFFFFFFFF) + bytecode[8:]
+
+def _bcompile(source):
+    try:
+        return bcompile(source)
+    except PyCompileError:
+        return None
+
+def _map_bcompile(sources, jobs):
+    if jobs > 1 and len(sources) >= _POOL_THRESHOLD:
+        try:
+            import multiprocessing
+            pool = multiprocessing.Pool(jobs)
+        except (ImportError, OSError, NotImplementedError):
+            pass
+        else:
+            try:
+                return pool.map(_bcompile, sources)
+            finally:
+                pool.close()
+                pool.join()
+    return [_bcompile(source) for source in sources]
+
+def bcompile_files(sources, cache_dir, jobs=None):
+    """Byte-compile the given python files, and return a dict source ->
+    bytecode (None if the source could not be compiled).
 
-def build_egg(build_manifest, build_node, source_root, output_dir=None, output_file=None):
+    Bytecode is cached in cache_dir, keyed on the interpreter magic number,
+    the source path and the source content: only new or modified files are
+    compiled, on jobs processes (cpu count by default). Cache entries not used
+    by this call are removed."""
+    if jobs is None:
+        jobs = cpu_count()
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    ret = {}
+    keys = {}
+    missing = []
+    for source in sources:
+        f = open(source, "rb")
+        try:
+            content = f.read()
+        finally:
+            f.close()
+        if isinstance(source, six.text_type):
+            path = source.encode("utf-8")
+        else:
+            path = source
+        key = hashlib.sha1(MAGIC_NUMBER + path + content).hexdigest()
+        keys[key] = source
+
+        cached = os.path.join(cache_dir, key)
+        if os.path.exists(cached):
+            f = open(cached, "rb")
+            try:
+                bytecode = f.read()
+            finally:
+                f.close()
+            # The source mtime is not part of the key
+            ret[source] = _set_bytecode_mtime(bytecode, os.stat(source).st_mtime)
+        else:
+            missing.append((key, source))
+
+    for (key, source), bytecode in zip(missing, _map_bcompile([s for k, s in missing], jobs)):
+        ret[source] = bytecode
+        if bytecode is not None:
+            safe_write(os.path.join(cache_dir, key), lambda fid: fid.write(bytecode))
+
+    for key in os.listdir(cache_dir):
+        if not key in keys:
+            os.remove(os.path.join(cache_dir, key))
+    return ret
+
+def build_egg(build_manifest, build_node, source_root, output_dir=None, output_file=None, jobs=None,
+              reproducible=False, compression_level=None):
     meta = PackageMetadata.from_build_manifest(build_manifest)
     egg_info = EggInfo.from_build_manifest(build_manifest, build_node)
 
@@ -70,22 +176,38 @@ def build_egg(build_manifest, build_node, source_root, output_dir=None, output_f
                   "eprefix": source_root.abspath(),
                   "sitedir": source_root.abspath()}
 
-    zid = compat.ZipFile(egg, "w", compat.ZIP_DEFLATED)
+    built_files = list(build_manifest.iter_built_files(source_root, egg_scheme))
+    bytecodes = bcompile_files([source.abspath() for kind, source, target in built_files
+                                if kind == "pythonfiles"],
+                               build_node.make_node(BYTECODE_CACHE_DIR).abspath(), jobs)
+
+    if reproducible:
+        date_time = reproducible_date_time()
+        # zipimport only uses the .pyc if its mtime matches the .py entry
+        # date. Zip dates have no timezone and zipimport reads them as local
+        # time, so no mtime matches on every host (this is true of any egg).
+        # Read the date as UTC so that the egg does not depend on the
+        # builder timezone.
+        source_mtime = calendar.timegm(date_time)
+    else:
+        date_time = None
+
+    zid = ZipArchive(egg, compression_level, date_time)
     try:
         for filename, cnt in egg_info.iter_meta(build_node):
             zid.writestr(os.path.join("EGG-INFO", filename), cnt)
 
-        for kind, source, target in build_manifest.iter_built_files(source_root, egg_scheme):
+        for kind, source, target in built_files:
             if not kind in ["executables"]:
                 zid.write(source.abspath(), target.path_from(source_root))
             if kind == "pythonfiles":
-                try:
-                    bytecode = bcompile(source.abspath())
-                except PyCompileError:
-                    e = extract_exception()
+                bytecode = bytecodes[source.abspath()]
+                if bytecode is None:
                     warnings.warn("Error byte-compiling %r" % source.abspath())
                 else:
-                    zid.writestr("%sc" % target.path_from(source_root), bcompile(source.abspath()))
+                    if reproducible:
+                        bytecode = _set_bytecode_mtime(bytecode, source_mtime)
+                    zid.writestr("%sc" % target.path_from(source_root), bytecode)
     finally:
         zid.close()
 
@@ -8,7 +8,7 @@ from bento.core.platforms.sysconfig \
         get_scheme
 from bento.utils.utils \
     import \
-        subst_vars
+        SubstitutionContext
 from bento.installed_package_description \
     import \
         BuildManifest, iter_files
@@ -35,8 +35,9 @@ def get_default_scheme(pkg_name, py_version_short=None, prefix=None):
     scheme["pkgname"] = pkg_name
     scheme["py_version_short"] = py_version_short
     ret = {}
+    context = SubstitutionContext(scheme)
     for k in scheme:
-        ret[k] = subst_vars(scheme[k], scheme)
+        ret[k] = context.subst(scheme[k])
     return ret
 
 class BuildMpkgCommand(Command):
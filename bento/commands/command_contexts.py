@@ -4,12 +4,21 @@ import string
 
 import os.path as op
 
+from bento._config \
+    import \
+        FILESYSTEM_SNAPSHOT_PATH
 from bento.errors \
     import \
         InvalidPackage
 from bento.utils.utils \
     import \
-        is_string, subst_vars
+        is_string, SubstitutionContext
+from bento.utils.watch \
+    import \
+        layout_changed
+from bento.core.node \
+    import \
+        FilesystemSnapshot
 from bento.core.node_package \
     import \
         NodeRepresentation
@@ -165,9 +174,26 @@ class ContextWithBuildDirectory(CmdContext):
         n.parent.mkdir()
         return n
 
+    def _update_node_package(self, pkg):
+        # The directory listings of the source tree are kept in the build
+        # directory for the next runs if BENTOMAKER_FS_SNAPSHOT is set
+        if os.environ.get("BENTOMAKER_FS_SNAPSHOT", "0") != "0":
+            snapshot_node = self.make_build_node(FILESYSTEM_SNAPSHOT_PATH)
+            snapshot = FilesystemSnapshot.from_file(snapshot_node.abspath())
+            self._node_pkg.update_package(pkg, snapshot)
+            snapshot.store(snapshot_node.abspath())
+        else:
+            self._node_pkg.update_package(pkg)
+
 class ConfigureContext(ContextWithBuildDirectory):
     pass
 
+# Output categories of the package content, and the corresponding installed
+# categories
+_BUILT_CATEGORIES = (("packages", "pythonfiles"), ("modules", "pythonfiles"),
+                     ("datafiles", "datafiles"), ("scripts", "executables"),
+                     ("extensions", "extensions"), ("compiled_libraries", "compiled_libraries"))
+
 def _generic_iregistrer(category, name, nodes, from_node, target_dir):
     source_dir = os.path.join("$_srcrootdir", from_node.bldpath())
     files = [n.path_from(from_node) for n in nodes]
@@ -223,6 +249,10 @@ class BuildContext(ContextWithBuildDirectory):
             self.inplace = True
         else:
             self.inplace = False
+        self.link_mode = o.link_mode
+        self.watch = o.watch
+        # Files copied in the source tree by inplace builds
+        self.inplace_outputs = set()
         # Builders signature:
         #   - first argument: name, str. Name of the entity to be built
         #   - second argument: object. Value returned by
@@ -259,12 +289,9 @@ class BuildContext(ContextWithBuildDirectory):
         else:
             sub_directory_node = None
         self._node_pkg = NodeRepresentation(run_node, self.top_node, sub_directory_node)
-        self._node_pkg.update_package(pkg)
+        self._update_node_package(pkg)
 
-        categories = (("packages", "pythonfiles"), ("modules", "pythonfiles"), ("datafiles", "datafiles"),
-                      ("scripts", "executables"), ("extensions", "extensions"),
-                      ("compiled_libraries", "compiled_libraries"))
-        self.outputs_registry = OutputRegistry(categories)
+        self.outputs_registry = OutputRegistry(_BUILT_CATEGORIES)
 
         self.isection_registry = ISectionRegistry()
         self.isection_registry.register_category("extensions", _generic_iregistrer)
@@ -374,6 +401,27 @@ class BuildContext(ContextWithBuildDirectory):
                 target_nodes.append(target_node)
             self.outputs_registry.register_outputs("modules", "meta_from_template", target_nodes,
                                                self.build_node, "$sitedir")
+    def _rebuilt_categories(self, changes):
+        # Output categories registered again by compile when rebuilding
+        return [category for category, installed_category in _BUILT_CATEGORIES]
+
+    def rebuild(self, changes):
+        """Build again after the given changes of the source tree, as
+        returned by the bento.utils.watch watchers.
+
+        The package representation is only computed again when files were
+        added or removed, and hooks are not run again."""
+        if layout_changed(changes):
+            self._node_pkg = NodeRepresentation(self.run_node, self.top_node,
+                                                self._node_pkg.sub_directory_node)
+            self._update_node_package(self.pkg)
+        for category in self._rebuilt_categories(changes):
+            self.outputs_registry.clear_category(category)
+        self.section_writer = SectionWriter()
+
+        self.compile()
+        self.post_compile()
+
     def post_compile(self):
         # Do the output_registry -> installed sections registry convertion
         section_writer = self.section_writer
@@ -398,10 +446,12 @@ class BuildContext(ContextWithBuildDirectory):
             else:
                 target_node = None
 
+            context = SubstitutionContext(scheme)
             def _install_node(category, node, from_node, target_dir):
-                installed_path = subst_vars(target_dir, scheme)
+                installed_path = context.subst(target_dir)
                 target = os.path.join(installed_path, node.path_from(from_node))
-                copy_installer(node.path_from(self.run_node), target, category)
+                self.inplace_outputs.add(target)
+                copy_installer(node.path_from(self.run_node), target, category, self.link_mode)
 
             intree = (self.top_node == self.run_node)
             if intree:
@@ -421,7 +471,7 @@ class SdistContext(ContextWithBuildDirectory):
         self._meta = {}
 
         self._node_pkg = NodeRepresentation(run_node, self.top_node)
-        self._node_pkg.update_package(pkg)
+        self._update_node_package(pkg)
 
     def register_metadata(self, name, value):
         self._meta[name] = value
@@ -441,13 +491,27 @@ class SdistContext(ContextWithBuildDirectory):
                 output = write_template(self.top_node, template, self.pkg, self._meta)
                 self.register_source_node(output, output.bldpath())
 
+class _ShortDescriptions(object):
+    """Read-only command name -> short description mapping, only retrieving
+    (and thus importing) the commands which are looked up."""
+    def __init__(self, global_context):
+        self._global_context = global_context
+
+    def __getitem__(self, cmd_name):
+        if not self._global_context.is_command_registered(cmd_name):
+            raise KeyError(cmd_name)
+        return self._global_context.retrieve_command(cmd_name).short_descr
+
+    def __contains__(self, cmd_name):
+        return self._global_context.is_command_registered(cmd_name)
+
+    def keys(self):
+        return self._global_context.command_names(public_only=False)
+
 class HelpContext(CmdContext):
     def __init__(self, *a, **kw):
         super(HelpContext, self).__init__(*a, **kw)
-        self.short_descriptions = {}
-        for cmd_name in self._global_context.command_names(public_only=False):
-            cmd = self._global_context.retrieve_command(cmd_name)
-            self.short_descriptions[cmd_name] = cmd.short_descr
+        self.short_descriptions = _ShortDescriptions(self._global_context)
 
     def retrieve_options_context(self, cmd_name):
         return self._global_context.retrieve_options_context(cmd_name)
@@ -6,7 +6,7 @@ from six import moves
 
 from bento.utils.utils \
     import \
-        subst_vars, virtualenv_prefix
+        SubstitutionContext, virtualenv_prefix
 from bento.core.platforms import \
         get_scheme
 from bento._config \
@@ -61,11 +61,12 @@ def set_scheme_unix(scheme, options, package):
                 py_version = sys.version.split()[0]
                 py_version_short = py_version[0:3]
                 dist_name = package.name
-                v = {"base": base, "py_version_short": py_version_short, "dist_name": dist_name}
+                v = SubstitutionContext({"base": base, "py_version_short": py_version_short,
+                                         "dist_name": dist_name})
 
                 scheme["prefix"] = scheme["eprefix"] = prefix
-                scheme["sitedir"] = subst_vars(dist_scheme["purelib"], v)
-                scheme["includedir"] = subst_vars(dist_scheme["headers"], v)
+                scheme["sitedir"] = v.subst(dist_scheme["purelib"])
+                scheme["includedir"] = v.subst(dist_scheme["headers"])
             else:
                 scheme["prefix"] = scheme["eprefix"] = "/usr/local"
 
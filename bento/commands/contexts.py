@@ -61,6 +61,23 @@ class GlobalContext(object):
         """
         self._commands_registry.register(cmd_name, cmd, public)
 
+    def register_lazy_command(self, cmd_name, import_path, public=True):
+        """Register a command name to a command class given by its import
+        path.
+
+        The command's module is only imported, and the command instantiated,
+        the first time the command is retrieved.
+
+        Parameters
+        ----------
+        cmd_name: str
+            name of the command
+        import_path: str
+            import path of a subclass of Command, e.g.
+            'bento.commands.build:BuildCommand'
+        """
+        self._commands_registry.register_lazy(cmd_name, import_path, public)
+
     def retrieve_command(self, cmd_name):
         """Return the command instance registered for the given command name."""
         return self._commands_registry.retrieve(cmd_name)
@@ -81,6 +98,12 @@ class GlobalContext(object):
     def register_command_context(self, cmd_name, klass):
         self._contexts_registry.register(cmd_name, klass)
 
+    def register_lazy_command_context(self, cmd_name, import_path):
+        """Like register_command_context, but the context class is given by
+        its import path ('package.module:ContextClass') and only imported when
+        retrieved."""
+        self._contexts_registry.register_lazy(cmd_name, import_path)
+
     def retrieve_command_context(self, cmd_name):
         return self._contexts_registry.retrieve(cmd_name)
 
@@ -100,12 +123,23 @@ class GlobalContext(object):
         return self._options_registry.register(name, context)
 
     def register_options_context(self, cmd_name, context):
+        self._register_command_options(cmd_name, context)
+        return self._options_registry.register(cmd_name, context)
+
+    def register_lazy_options_context(self, cmd_name, create_context):
+        """Register the options context for the given command, to be created
+        by calling create_context the first time it is retrieved."""
+        def _create_context():
+            context = create_context()
+            self._register_command_options(cmd_name, context)
+            return context
+        return self._options_registry.register_lazy(cmd_name, _create_context)
+
+    def _register_command_options(self, cmd_name, context):
         cmd = self.retrieve_command(cmd_name)
         if self._package_options is not None and hasattr(cmd, "register_options"):
             cmd.register_options(context, self._package_options)
 
-        return self._options_registry.register(cmd_name, context)
-
     def retrieve_options_context(self, cmd_name):
         return self._options_registry.retrieve(cmd_name)
 
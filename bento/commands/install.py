@@ -1,72 +1,340 @@
 import os
+import sys
 import shutil
 import subprocess
 import errno
 
+import six
+
 from bento._config \
     import \
-        BUILD_MANIFEST_PATH
+        BUILD_MANIFEST_PATH, BUILD_MANIFEST_BIN_PATH, INSTALL_RECORD_PATH
 from bento.installed_package_description import \
-    BuildManifest, iter_files
+    BuildManifest
 
 from bento.commands.core import \
     Command, Option
+from bento.commands.build import \
+    jobs_callback
 from bento.utils.utils import \
-    pprint, extract_exception, MODE_755, MODE_777
+    pprint, extract_exception, file_sha1, MODE_755, MODE_777
+from bento.utils.os2 import \
+    copy_file, rename, LINK_MODES
+
+import bento.compat.api as compat
+import bento.errors
+
+# Number of files copied by TransactionLog.copy_files between two syncs of the
+# journal
+JOURNAL_BATCH_SIZE = 256
+# Size of the blocks in which journals are read backward by rollbacks
+_JOURNAL_BLOCK_SIZE = 64 * 1024
+
+# Number of arguments of each journal record
+_RECORD_ARGS = {"MKDIR": 1, "COPY": 1, "BACKUP": 2, "COMMIT": 0}
+# rmdir errors ignored by rollbacks: the directory was not created, or does
+# not belong to the installed package only
+_RMDIR_ERRORS = [errno.ENOENT, errno.ENOTEMPTY, errno.EEXIST]
+
+if sys.version_info[0] < 3:
+    _fsencode = _fsdecode = lambda path: path
+else:
+    _fsencode = os.fsencode
+    _fsdecode = os.fsdecode
+
+def _parse_record(line):
+    # Return the operation and arguments of the given journal line (without
+    # its newline)
+    record = _fsdecode(line)
+    operation = record.split(" ", 1)[0]
+    if not operation in _RECORD_ARGS:
+        raise ValueError("Unknown operation: %s" % operation)
+    return operation, record.split(" ", _RECORD_ARGS[operation])[1:]
+
+def _reversed_records(fid):
+    # Yield (end offset, line) for each complete line of the given journal,
+    # last first, reading it backward by blocks. The text after the last
+    # newline, if any, is a record interrupted while being written, and is
+    # skipped.
+    fid.seek(0, os.SEEK_END)
+    pos = fid.tell()
+    tail = six.b("")
+    torn = True
+    while True:
+        size = min(_JOURNAL_BLOCK_SIZE, pos)
+        pos -= size
+        fid.seek(pos)
+        data = fid.read(size) + tail
+        lines = data.split(six.b("\n"))
+        if pos > 0:
+            # may be the end of a line starting in the previous block
+            tail = lines.pop(0)
+        end = pos + len(data)
+        for line in reversed(lines):
+            start = end - len(line)
+            if torn:
+                torn = False
+            elif line:
+                yield start + len(line) + 1, line
+            end = start - 1
+        if pos == 0:
+            break
 
-def _rollback_operation(line):
-    operation, arg = line.split()
+def _rollback_operation(operation, args, backup_dir):
     if operation == "MKDIR":
         try:
-            os.rmdir(arg)
+            os.rmdir(args[0])
         except OSError:
             e = extract_exception()
-            # FIXME: hardcoded errno !!
-            if e.errno != 66:
+            if not e.errno in _RMDIR_ERRORS:
                 raise
     elif operation == "COPY":
-        os.remove(arg)
-    else:
-        raise ValueError("Unknown operation: %s" % operation)
+        # Copies are logged before being started, so the file may not exist
+        try:
+            os.remove(args[0])
+        except OSError:
+            e = extract_exception()
+            if e.errno != errno.ENOENT:
+                raise
+    elif operation == "BACKUP":
+        # The backup does not exist if the install was interrupted before
+        # the target was moved, or if it has already been restored
+        backup = os.path.join(backup_dir, args[0])
+        if os.path.exists(backup):
+            rename(backup, args[1])
 
 def rollback_transaction(f):
-    fid = open(f)
+    """Undo the operations recorded in the given journal, last first, and
+    remove it.
+
+    Undoing an operation twice is harmless, so an interrupted rollback may
+    simply be run again. If an operation fails, the journal is truncated
+    after it."""
+    backup_dir = f + ".backup"
+    fid = open(f, "r+b")
     try:
-        lines = fid.readlines()
-        for i in range(len(lines)-1, -1, -1):
-            _rollback_operation(lines[i])
-            lines.pop(i)
+        for end, line in _reversed_records(fid):
+            try:
+                operation, args = _parse_record(line)
+                _rollback_operation(operation, args, backup_dir)
+            except:
+                fid.truncate(end)
+                raise
     finally:
         fid.close()
-        if len(lines) < 1:
-            os.remove(f)
-        else:
-            fid = open(f, "w")
-            try:
-                fid.writelines(lines)
-            finally:
-                fid.close()
+    os.remove(f)
+    if os.path.isdir(backup_dir):
+        shutil.rmtree(backup_dir)
+
+def _fsync_dir(dirname):
+    # Make the creation of a file in dirname durable (not possible on
+    # windows)
+    try:
+        fd = os.open(dirname, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+    finally:
+        os.close(fd)
+
+def _backup_file(target, backup):
+    # Move target to backup. Whenever this is interrupted, either backup does
+    # not exist and target is untouched, or backup is complete.
+    try:
+        compat.rename(target, backup)
+    except OSError:
+        e = extract_exception()
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(target, backup + ".tmp")
+        compat.rename(backup + ".tmp", backup)
+
+def _existing_files(targets):
+    # Return the targets which exist, with one listdir per directory instead
+    # of one stat per target
+    by_dir = {}
+    for target in targets:
+        by_dir.setdefault(os.path.dirname(target), []).append(target)
+    existing = set()
+    for d, d_targets in by_dir.items():
+        try:
+            names = set(os.listdir(d))
+        except OSError:
+            e = extract_exception()
+            if not e.errno in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            continue
+        existing.update([t for t in d_targets if os.path.basename(t) in names])
+    return existing
 
 class TransactionLog(object):
-    """Naive version of a journal to rollback interrupted install."""
-    def __init__(self, journal_filename):
-        if os.path.exists(journal_filename):
-            raise IOError("file %s already exists" % journal_filename)
-        open(journal_filename, "w").close()
-        self.f = open(journal_filename, "w")
+    """Journal to rollback or resume interrupted installs.
+
+    The journal is append-only, with one record per line:
+
+        MKDIR directory
+        COPY target                 (target did not exist)
+        BACKUP name target          (target existed, and was moved to name in
+                                     the backup directory)
+        COMMIT                      (every operation above is done)
+
+    Records are synced to disk before the operations they describe are
+    started, so that an install killed at any point can be rolled back (see
+    rollback_transaction) or resumed. Files are copied by batches of
+    JOURNAL_BATCH_SIZE, with one sync per batch.
+
+    Parameters
+    ----------
+    journal_filename: str
+        journal filename. The backup directory is journal_filename.backup
+    overwrite: bool
+        if True, existing targets are backed up, and restored by rollbacks.
+        Otherwise, they are an error.
+    resume: bool
+        if True, resume the install recorded in the existing journal: the
+        committed copies are skipped by copy_files.
+
+    Once every file is copied, commit removes the journal and the backups.
+    """
+    def __init__(self, journal_filename, overwrite=False, resume=False):
         self.journal_filename = journal_filename
+        self.backup_dir = journal_filename + ".backup"
+        self.overwrite = overwrite
+
+        # Targets recorded in the journal, and the ones known to be copied
+        self._journaled = set()
+        self._committed = set()
+        self._backups = 0
+        # target -> backup of the uncommitted BACKUP records of the resumed
+        # install
+        self._uncommitted_backups = {}
+
+        if resume:
+            if not os.path.exists(journal_filename):
+                raise IOError("file %s does not exist" % journal_filename)
+            size = self._read_journal()
+            self.f = open(journal_filename, "r+b")
+            self.f.truncate(size)
+            self.f.seek(size)
+        else:
+            try:
+                fd = os.open(journal_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except OSError:
+                e = extract_exception()
+                if e.errno == errno.EEXIST:
+                    raise IOError("file %s already exists" % journal_filename)
+                raise
+            self.f = os.fdopen(fd, "wb")
+            _fsync_dir(os.path.dirname(os.path.abspath(journal_filename)))
+            # Left by a commit interrupted after removing its journal
+            if os.path.isdir(self.backup_dir):
+                shutil.rmtree(self.backup_dir)
+
+    def _read_journal(self):
+        # Load the state of the interrupted install, and return the size of
+        # the journal without its last record if incomplete
+        size = 0
+        uncommitted = []
+        fid = open(self.journal_filename, "rb")
+        try:
+            for line in fid:
+                if not line.endswith(six.b("\n")):
+                    break
+                size += len(line)
+                operation, args = _parse_record(line[:-1])
+                if operation == "COMMIT":
+                    self._committed.update(uncommitted)
+                    uncommitted = []
+                    self._uncommitted_backups = {}
+                elif operation != "MKDIR":
+                    if operation == "BACKUP":
+                        self._backups += 1
+                        self._uncommitted_backups[args[-1]] = \
+                                os.path.join(self.backup_dir, args[0])
+                    uncommitted.append(args[-1])
+                    self._journaled.add(args[-1])
+        finally:
+            fid.close()
+        return size
+
+    def _log(self, records, sync=True):
+        self.f.write(six.b("").join([_fsencode(r) + six.b("\n") for r in records]))
+        self.f.flush()
+        if sync:
+            os.fsync(self.f.fileno())
 
     def copy(self, source, target, category):
-        if os.path.exists(target):
+        self.copy_files([(category, source, target)])
+
+    def copy_files(self, files, jobs=1, link_mode="copy"):
+        """Same as copy for each (category, source, target) in files, see
+        install_files. Targets already copied by the resumed install are
+        skipped.
+
+        The whole install is rolled back on failure."""
+        files = [f for f in files if not f[2] in self._committed]
+        existing = _existing_files([target for category, source, target in files
+                                    if not target in self._journaled])
+        if existing and not self.overwrite:
             self.rollback()
-            raise ValueError("File %s already exists, rolled back installation" % target)
-        d = os.path.dirname(target)
-        if not os.path.exists(d):
-            self.makedirs(d)
-        self.f.write("COPY %s\n" % target)
-        shutil.copy(source, target)
-        if category == "executables":
-            os.chmod(target, MODE_755)
+            raise ValueError("File %s already exists, rolled back installation" \
+                             % sorted(existing)[0])
+
+        pool = _thread_pool(jobs)
+        try:
+            try:
+                dirs = _missing_dirs(set([os.path.dirname(target)
+                                          for category, source, target in files]))
+                if dirs:
+                    self._log(["MKDIR %s" % d for d in dirs])
+                    for d in dirs:
+                        os.mkdir(d)
+                for i in range(0, len(files), JOURNAL_BATCH_SIZE):
+                    self._copy_batch(files[i:i+JOURNAL_BATCH_SIZE], existing, pool, link_mode)
+            except:
+                self.rollback()
+                raise
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _copy_batch(self, files, existing, pool, link_mode):
+        records = []
+        backups = []
+        for category, source, target in files:
+            # Copies started by the resumed install are simply done again,
+            # once the backups interrupted before moving their target are done
+            if target in self._journaled:
+                backup = self._uncommitted_backups.pop(target, None)
+                if backup is not None and not os.path.exists(backup) \
+                        and os.path.exists(target):
+                    backups.append((target, backup))
+                continue
+            if target in existing:
+                name = str(self._backups)
+                self._backups += 1
+                records.append("BACKUP %s %s" % (name, target))
+                backups.append((target, os.path.join(self.backup_dir, name)))
+            else:
+                records.append("COPY %s" % target)
+            self._journaled.add(target)
+        if records:
+            self._log(records)
+
+        if backups and not os.path.isdir(self.backup_dir):
+            os.mkdir(self.backup_dir)
+        for target, backup in backups:
+            _backup_file(target, backup)
+        _copy_files(files, pool, link_mode)
+
+        # Synced with the next batch: at worst, the batch is copied again
+        # when resuming
+        self._log(["COMMIT"], sync=False)
+        self._committed.update([target for category, source, target in files])
 
     def makedirs(self, name, mode=MODE_777):
         head, tail = os.path.split(name)
@@ -84,29 +352,94 @@ class TransactionLog(object):
         self.mkdir(name, mode)
 
     def mkdir(self, name, mode=MODE_777):
-        self.f.write("MKDIR %s\n" % name) 
-        self.f.flush()
+        self._log(["MKDIR %s" % name])
         os.mkdir(name, mode)
 
     def close(self):
         if self.f is not None:
             self.f.close()
+            self.f = None
+
+    def commit(self):
+        """Make the install final: the journal and the backups of the
+        overwritten files are removed, and the install cannot be rolled back
+        anymore."""
+        if self.f is not None:
+            # Sync the last COMMIT record: if interrupted, the install may
+            # still be resumed without copying anything again
+            os.fsync(self.f.fileno())
+        self.close()
+        os.remove(self.journal_filename)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.journal_filename)))
+        if os.path.isdir(self.backup_dir):
+            shutil.rmtree(self.backup_dir)
 
     def rollback(self):
-        self.f.close()
-        self.f = open(self.journal_filename, "r")
-        lines = self.f.readlines()
-        for line in lines[::-1]:
-            _rollback_operation(line.strip())
-        self.f = None
-
-def copy_installer(source, target, kind):
+        self.close()
+        rollback_transaction(self.journal_filename)
+
+def _copy_file(source, target, kind, link_mode="copy"):
+    if kind == "executables":
+        mode = MODE_755
+    else:
+        mode = None
+    copy_file(source, target, mode, link_mode)
+
+def _thread_pool(jobs):
+    if jobs > 1:
+        # imported here as this is only needed for parallel installs
+        from multiprocessing.pool \
+            import \
+                ThreadPool
+        return ThreadPool(jobs)
+    else:
+        return None
+
+def _copy_files(files, pool, link_mode):
+    if pool is not None and len(files) > 1:
+        pool.map(lambda f: _copy_file(f[1], f[2], f[0], link_mode), files)
+    else:
+        for kind, source, target in files:
+            _copy_file(source, target, kind, link_mode)
+
+def _missing_dirs(dirs):
+    # Return the directories in dirs, and their ancestors, which do not
+    # exist, parents first
+    existing = set()
+    missing = set()
+    for d in dirs:
+        while not d in existing and not d in missing:
+            if os.path.isdir(d):
+                existing.add(d)
+                break
+            missing.add(d)
+            parent = os.path.dirname(d)
+            if parent == d:
+                break
+            d = parent
+    return sorted(missing, key=lambda d: (d.count(os.sep), d))
+
+def install_files(files, jobs=1, link_mode="copy"):
+    """Install the given (kind, source, target) files.
+
+    The target directories are computed and created first, and the files
+    then copied on jobs threads (see bento.utils.os2.copy_file for
+    link_mode). See TransactionLog.copy_files for journaled installs."""
+    for d in _missing_dirs(set([os.path.dirname(target) for kind, source, target in files])):
+        os.mkdir(d)
+
+    pool = _thread_pool(jobs)
+    try:
+        _copy_files(files, pool, link_mode)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def copy_installer(source, target, kind, link_mode="copy"):
     dtarget = os.path.dirname(target)
     if not os.path.exists(dtarget):
         os.makedirs(dtarget)
-    shutil.copy(source, target)
-    if kind == "executables":
-        os.chmod(target, MODE_755)
+    _copy_file(source, target, kind, link_mode)
 
 def unix_installer(source, target, kind):
     if kind in ["executables"]:
@@ -120,6 +453,109 @@ def unix_installer(source, target, kind):
         os.makedirs(os.path.dirname(target))
     subprocess.check_call(cmd)
 
+class InstallRecord(object):
+    """Record of the files installed by install --incremental, used to only
+    copy the files which changed since the last install.
+
+    Files are recorded for each installation scheme. For each installed file,
+    we keep its kind, source, source size, mtime, mode and sha1, and the size
+    and mtime of the installed copy."""
+    def __init__(self, filename):
+        self.filename = filename
+        if os.path.exists(filename):
+            f = open(filename)
+            try:
+                self._schemes = compat.json.load(f)
+            finally:
+                f.close()
+        else:
+            self._schemes = {}
+        # source -> sha1 computed by changes
+        self._sha1 = {}
+
+    def store(self):
+        f = open(self.filename, "w")
+        try:
+            compat.json.dump(self._schemes, f)
+        finally:
+            f.close()
+
+    def _source_sha1(self, source):
+        try:
+            return self._sha1[source]
+        except KeyError:
+            sha1 = self._sha1[source] = file_sha1(source)
+            return sha1
+
+    def changes(self, scheme_key, files):
+        """Return the (kind, source, target) files which need to be copied,
+        and the targets installed previously which are not in files anymore.
+
+        A file is not copied again if its installed copy was not modified
+        since the last install, and its source has the same size, mtime and
+        mode, or the same content."""
+        installed = self._schemes.get(scheme_key, {})
+        to_copy = []
+        for kind, source, target in files:
+            entry = installed.get(target, None)
+            if entry is not None and entry[0] == kind and entry[1] == source \
+                    and os.path.exists(target):
+                src_st = os.stat(source)
+                tgt_st = os.stat(target)
+                if [tgt_st.st_size, tgt_st.st_mtime] == entry[6:8] \
+                        and [src_st.st_size, src_st.st_mode] == [entry[2], entry[4]]:
+                    if src_st.st_mtime == entry[3] or self._source_sha1(source) == entry[5]:
+                        continue
+            to_copy.append((kind, source, target))
+
+        targets = set([target for kind, source, target in files])
+        to_remove = [target for target in installed if not target in targets]
+        return to_copy, sorted(to_remove)
+
+    def update(self, scheme_key, files):
+        """Record the given (kind, source, target) files as installed."""
+        installed = self._schemes.get(scheme_key, {})
+        entries = {}
+        for kind, source, target in files:
+            src_st = os.stat(source)
+            tgt_st = os.stat(target)
+            entry = installed.get(target, None)
+            if entry is not None and entry[1] == source and entry[2:5] == \
+                    [src_st.st_size, src_st.st_mtime, src_st.st_mode]:
+                sha1 = entry[5]
+            else:
+                sha1 = self._source_sha1(source)
+            entries[target] = [kind, source, src_st.st_size, src_st.st_mtime, src_st.st_mode,
+                               sha1, tgt_st.st_size, tgt_st.st_mtime]
+        self._schemes[scheme_key] = entries
+
+def _scheme_key(scheme):
+    return "\n".join(["%s=%s" % item for item in sorted(scheme.items())])
+
+def incremental_install(record, scheme, files, jobs=1, link_mode="copy"):
+    """Install the given (kind, source, target) files, skipping the ones
+    which did not change since the last install recorded in the given
+    InstallRecord, and removing the previously installed files which are not
+    in files anymore."""
+    scheme_key = _scheme_key(scheme)
+    to_copy, to_remove = record.changes(scheme_key, files)
+    for target in to_remove:
+        if os.path.exists(target):
+            os.remove(target)
+    install_files(to_copy, jobs, link_mode=link_mode)
+    record.update(scheme_key, files)
+    record.store()
+
+def _load_build_manifest(build_node):
+    # The binary manifest is only used if it is not older than the json one,
+    # which other tools may write alone
+    n = build_node.make_node(BUILD_MANIFEST_PATH)
+    binary_n = build_node.make_node(BUILD_MANIFEST_BIN_PATH)
+    if os.path.exists(binary_n.abspath()) and \
+            os.path.getmtime(binary_n.abspath()) >= os.path.getmtime(n.abspath()):
+        return BuildManifest.from_file(binary_n.abspath())
+    return BuildManifest.from_file(n.abspath())
+
 class InstallCommand(Command):
     long_descr = """\
 Purpose: install the project
@@ -128,9 +564,22 @@ Usage:   bentomaker install [OPTIONS]."""
     common_options = Command.common_options + \
                         [Option("-t", "--transaction",
                                 help="Do a transaction-based install", action="store_true"),
+                         Option("--resume",
+                                help="Resume an interrupted transaction-based install",
+                                action="store_true"),
                          Option("-n", "--dry-run", "--list-files",
                                 help="List installed files (do not install anything)",
-                                action="store_true", dest="list_files")]
+                                action="store_true", dest="list_files"),
+                         Option("-j", "--jobs",
+                                help="Copy files on one thread per CPU",
+                                dest="jobs", action="callback", callback=jobs_callback),
+                         Option("--link-mode", type="choice", choices=LINK_MODES, default="copy",
+                                help="How to install built files: 'copy', 'hardlink' or "
+                                     "'reflink' (copy if a link cannot be created) [%default]"),
+                         Option("--incremental",
+                                help="Only copy the files which changed since the last install, "
+                                     "and remove the ones which are not installed anymore",
+                                action="store_true")]
     def run(self, ctx):
         argv = ctx.command_argv
         p = ctx.options_context.parser
@@ -139,27 +588,35 @@ Usage:   bentomaker install [OPTIONS]."""
             p.print_help()
             return
 
-        n = ctx.build_node.make_node(BUILD_MANIFEST_PATH)
-        build_manifest = BuildManifest.from_file(n.abspath())
+        build_manifest = _load_build_manifest(ctx.build_node)
         scheme = ctx.retrieve_configured_scheme()
         build_manifest.update_paths(scheme)
-        node_sections = build_manifest.resolve_paths_with_destdir(ctx.build_node)
+        files = build_manifest.iter_file_paths(ctx.build_node, use_destdir=True)
 
         if o.list_files:
             # XXX: this won't take into account action in post install scripts.
             # A better way would be to log install steps and display those, but
             # this will do for now.
-            for kind, source, target in iter_files(node_sections):
-                print(target.abspath())
+            for kind, source, target in files:
+                print(target)
             return
 
-        if o.transaction:
-            trans = TransactionLog("transaction.log")
+        files = list(files)
+        if o.resume:
+            o.transaction = True
+        if o.incremental:
+            if o.transaction:
+                raise bento.errors.UsageException("--incremental and --transaction cannot be used together")
+            record_node = ctx.build_node.make_node(INSTALL_RECORD_PATH)
+            record_node.parent.mkdir()
+            incremental_install(InstallRecord(record_node.abspath()), scheme, files, o.jobs or 1,
+                                o.link_mode)
+        elif o.transaction:
+            trans = TransactionLog("transaction.log", overwrite=True, resume=o.resume)
             try:
-                for kind, source, target in iter_files(node_sections):
-                    trans.copy(source.abspath(), target.abspath(), kind)
+                trans.copy_files(files, o.jobs or 1, o.link_mode)
+                trans.commit()
             finally:
                 trans.close()
         else:
-            for kind, source, target in iter_files(node_sections):
-                copy_installer(source.abspath(), target.abspath(), kind)
+            install_files(files, o.jobs or 1, link_mode=o.link_mode)
@@ -1,4 +1,5 @@
 import os
+import time
 
 from pprint import \
         pprint
@@ -11,6 +12,9 @@ from bento.commands.core import \
 from bento.parser.misc \
     import \
         build_ast_from_data
+from bento.parser.parser \
+    import \
+        Parser
 from bento.utils.utils \
     import \
         extract_exception
@@ -26,7 +30,9 @@ Usage:   bentomaker parse [OPTIONS]"""
         Option("-p", "--path", action="store_true",
                help="print paths variables"),
         Option("-m", "--meta-field", dest="meta_field",
-               help="print given meta field")]
+               help="print given meta field"),
+        Option("-t", "--timing", action="store_true",
+               help="print the time spent creating the parser and parsing the file")]
 
     def run(self, ctx):
         argv = ctx.command_argv
@@ -47,6 +53,9 @@ Usage:   bentomaker parse [OPTIONS]"""
         f = open(filename, "r")
         try:
             data = f.read()
+            if o.timing:
+                _print_timing(data)
+                return
             try:
                 parsed = build_ast_from_data(data)
             except ParseError:
@@ -78,3 +87,12 @@ Usage:   bentomaker parse [OPTIONS]"""
         finally:
             f.close()
 
+
+def _print_timing(data):
+    t0 = time.time()
+    parser = Parser()
+    t1 = time.time()
+    parser.parse(data)
+    t2 = time.time()
+    print("parser creation: %.2f ms" % ((t1 - t0) * 1e3))
+    print("parsing: %.2f ms" % ((t2 - t1) * 1e3))
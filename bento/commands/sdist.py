@@ -1,3 +1,4 @@
+import os
 import tarfile
 
 import os.path as op
@@ -5,12 +6,25 @@ import os.path as op
 import bento.compat.api as compat
 import bento.errors
 
+from bento._config \
+    import \
+        SDIST_MANIFEST_PATH
 from bento.commands.core \
     import \
         Command, Option
 from bento.conv \
     import \
         write_pkg_info
+from bento.commands.build \
+    import \
+        jobs_callback
+from bento.utils.utils \
+    import \
+        file_sha1
+from bento.utils.archive \
+    import \
+        ZipArchive, GzipWriter, normalize_tarinfo, reproducible_date_time, \
+        reproducible_timestamp
 
 from six.moves \
     import \
@@ -22,33 +36,179 @@ def archive_basename(pkg):
     else:
         return pkg.name
 
-def create_tarball(node_pkg, archive_root, archive_node):
-    tf = tarfile.open(archive_node.abspath(), "w:gz")
+def create_tarball(node_pkg, archive_root, archive_node, reproducible=False, compression_level=None,
+                   jobs=1, reuse=None):
+    if compression_level is None:
+        compression_level = 9
+    files = list(node_pkg.iter_source_files())
+    if reproducible:
+        files.sort(key=lambda f: f[1])
+        mtime = reproducible_timestamp()
+        kw = {"format": tarfile.GNU_FORMAT}
+    else:
+        kw = {}
+
+    fid = open(archive_node.abspath(), "wb")
     try:
-        for filename, alias in node_pkg.iter_source_files():
-            tf.add(filename, op.join(archive_root, alias))
+        gz = GzipWriter(fid, compression_level, jobs)
+        try:
+            tf = tarfile.open(mode="w|", fileobj=gz, **kw)
+            try:
+                for filename, alias in files:
+                    arcname = op.join(archive_root, alias)
+                    if reproducible:
+                        # TarFile.add has no filter argument before python 2.7
+                        tarinfo = normalize_tarinfo(tf.gettarinfo(filename, arcname), mtime)
+                        if tarinfo.isreg():
+                            f = open(filename, "rb")
+                            try:
+                                tf.addfile(tarinfo, f)
+                            finally:
+                                f.close()
+                        else:
+                            tf.addfile(tarinfo)
+                    else:
+                        tf.add(filename, arcname)
+            finally:
+                tf.close()
+        finally:
+            gz.close()
     finally:
-        tf.close()
+        fid.close()
 
-def create_zarchive(node_pkg, archive_root, archive_node):
-    zid = compat.ZipFile(archive_node.abspath(), "w", compat.ZIP_DEFLATED)
+def create_zarchive(node_pkg, archive_root, archive_node, reproducible=False, compression_level=None,
+                    jobs=1, reuse=None):
+    if reproducible:
+        date_time = reproducible_date_time()
+    else:
+        date_time = None
+    if reuse is None:
+        reuse = set()
+    zid = ZipArchive(archive_node.abspath(), compression_level, date_time)
     try:
         for filename, alias in node_pkg.iter_source_files():
-            zid.write(filename, op.join(archive_root, alias))
+            arcname = op.join(archive_root, alias)
+            if arcname in reuse:
+                zid.copy(archive_node.abspath(), arcname)
+            else:
+                zid.write(filename, arcname)
     finally:
         zid.close()
 
-_FORMATS = {"gztar": {"ext": ".tar.gz", "func": create_tarball},
-            "zip": {"ext": ".zip", "func": create_zarchive}}
+_FORMATS = {"gztar": {"ext": ".tar.gz", "func": create_tarball, "reuse": False},
+            "zip": {"ext": ".zip", "func": create_zarchive, "reuse": True}}
+
+class SdistManifest(object):
+    """Record of the members of the archives created by sdist, used to only
+    rewrite the members which changed since the last run.
+
+    For each archive, we keep its size and mtime, the options it was created
+    with, and the (source, size, mtime, mode, sha1) of each member."""
+    def __init__(self, filename):
+        self.filename = filename
+        if op.exists(filename):
+            f = open(filename)
+            try:
+                self._archives = compat.json.load(f)
+            finally:
+                f.close()
+        else:
+            self._archives = {}
+
+    def store(self):
+        f = open(self.filename, "w")
+        try:
+            compat.json.dump(self._archives, f)
+        finally:
+            f.close()
+
+    def update(self, archive, options, files, reproducible):
+        """Compare the given (filename, archive name) members with the ones
+        recorded for archive, and record them as its new members.
 
-def create_archive(archive_name, archive_root, node_pkg, top_node, run_node, format="tgz", output_directory="dist"):
+        Return the set of unchanged members archive names, or None if the
+        archive cannot be reused (missing, modified, or created with other
+        options), and whether the archive is up to date, i.e. no member was
+        added, removed or changed.
+
+        A member is unchanged if its source size, mtime and mode did not
+        change. For reproducible archives, where mtimes are not stored, a
+        member whose content did not change is also unchanged."""
+        previous = self._archives.get(archive, None)
+        if previous is None or not op.exists(archive) or previous["options"] != options:
+            old_members = None
+        else:
+            st = os.stat(archive)
+            if previous["archive"] != [st.st_size, st.st_mtime]:
+                old_members = None
+            else:
+                old_members = previous["members"]
+
+        unchanged = set()
+        members = {}
+        for filename, arcname in files:
+            st = os.stat(filename)
+            member = [filename, st.st_size, st.st_mtime, st.st_mode, None]
+            if old_members is None:
+                old = None
+            else:
+                old = old_members.get(arcname, None)
+            if old is not None and old[0] == filename and old[1] == st.st_size \
+                    and old[3] == st.st_mode:
+                if old[2] == st.st_mtime:
+                    member[4] = old[4]
+                    unchanged.add(arcname)
+                elif reproducible:
+                    member[4] = file_sha1(filename)
+                    if member[4] == old[4]:
+                        unchanged.add(arcname)
+            if member[4] is None:
+                member[4] = file_sha1(filename)
+            members[arcname] = member
+
+        self._archives[archive] = {"options": options, "members": members, "archive": None}
+        if old_members is None:
+            return None, False
+        return unchanged, len(unchanged) == len(old_members) == len(members)
+
+    def set_archive_stat(self, archive):
+        st = os.stat(archive)
+        self._archives[archive]["archive"] = [st.st_size, st.st_mtime]
+
+def create_archive(archive_name, archive_root, node_pkg, top_node, run_node, format="tgz", output_directory="dist",
+                   reproducible=False, compression_level=None, jobs=1, manifest=None):
+    """Create the archive, and return its root directory and node.
+
+    If a SdistManifest is given, the archive is only created if one of its
+    members changed since the last call, and the unchanged members are copied
+    from the existing archive for formats which support it."""
     if not format in _FORMATS:
         raise ValueError("Unknown format: %r" % (format,))
 
     archive_node = top_node.make_node(op.join(output_directory, archive_name))
     archive_node.parent.mkdir()
 
-    _FORMATS[format]["func"](node_pkg, archive_root, archive_node) 
+    reuse = None
+    if manifest is not None:
+        if reproducible:
+            timestamp = reproducible_timestamp()
+        else:
+            timestamp = None
+        options = [format, archive_root, timestamp, compression_level]
+        files = [(filename, op.join(archive_root, alias))
+                 for filename, alias in node_pkg.iter_source_files()]
+        unchanged, up_to_date = manifest.update(archive_node.abspath(), options, files, reproducible)
+        if _FORMATS[format]["reuse"]:
+            reuse = unchanged
+    else:
+        up_to_date = False
+
+    if not up_to_date:
+        _FORMATS[format]["func"](node_pkg, archive_root, archive_node, reproducible, compression_level,
+                                 jobs, reuse)
+    if manifest is not None:
+        manifest.set_archive_stat(archive_node.abspath())
+        manifest.store()
     return archive_root, archive_node
 
 class SdistCommand(Command):
@@ -62,7 +222,20 @@ Usage:   bentomaker sdist [OPTIONS]."""
                            Option("--format",
                                   help="Archive format (supported: 'gztar', 'zip')", default="gztar"),
                            Option("--output-file",
-                                  help="Archive filename (default: $pkgname-$version.$archive_extension)")]
+                                  help="Archive filename (default: $pkgname-$version.$archive_extension)"),
+                           Option("--reproducible",
+                                  help="Use a fixed timestamp and owner for every archive "
+                                       "entry (SOURCE_DATE_EPOCH if set)",
+                                  action="store_true"),
+                           Option("--compression-level",
+                                  help="zlib compression level (0-9)", type="int"),
+                           Option("-j", "--jobs",
+                                  help="Compress gztar archives on one thread per CPU",
+                                  dest="jobs", action="callback", callback=jobs_callback),
+                           Option("--incremental",
+                                  help="Only update the archive members which changed since "
+                                       "the last sdist run",
+                                  action="store_true")]
 
     def run(self, ctx):
         argv = ctx.command_argv
@@ -88,10 +261,20 @@ Usage:   bentomaker sdist [OPTIONS]."""
         write_pkg_info(ctx.pkg, s)
         n = ctx.build_node.make_node("PKG_INFO")
         n.parent.mkdir()
-        n.write(s.getvalue())
+        # Keep PKG_INFO mtime unless its content changes, for --incremental
+        if not op.exists(n.abspath()) or n.read() != s.getvalue():
+            n.write(s.getvalue())
         ctx.register_source_node(n, "PKG_INFO")
 
+        if o.incremental:
+            manifest_node = ctx.build_node.make_node(SDIST_MANIFEST_PATH)
+            manifest_node.parent.mkdir()
+            manifest = SdistManifest(manifest_node.abspath())
+        else:
+            manifest = None
+
         # XXX: find a better way to pass archive name from other commands (used
         # by distcheck ATM)
         self.archive_root, self.archive_node = create_archive(archive_name, archive_root, ctx._node_pkg,
-                ctx.top_node, ctx.run_node, o.format, o.output_dir)
+                ctx.top_node, ctx.run_node, o.format, o.output_dir, o.reproducible, o.compression_level,
+                o.jobs or 1, manifest)
@@ -25,6 +25,9 @@ from bento.core.testing\
 from bento.core.node \
     import \
         create_base_nodes
+from bento._config \
+    import \
+        BUILD_MANIFEST_PATH
 from bento.utils.utils \
     import \
         subst_vars
@@ -45,7 +48,7 @@ from bento.commands.options \
         OptionsContext
 from bento.commands.build \
     import \
-        BuildCommand
+        BuildCommand, watch_build
 from bento.core.testing \
     import \
         create_fake_package_from_bento_infos, create_fake_package_from_bento_info, \
@@ -305,6 +308,57 @@ class TestBuildYaku(_TestBuildSimpleExtension, unittest.TestCase):
     def test_disable_nonexisting_extension(self):
         super(TestBuildYaku, self).test_disable_nonexisting_extension()
 
+    @require_c_compiler("yaku")
+    def test_rebuild(self):
+        conf, configure, bld, build = self._run_configure_and_build({"bento.info": BENTO_INFO_WITH_EXT})
+        source = self.top_node.find_node("foo.c").abspath()
+
+        # compilation and link of the extension
+        bld.rebuild([("modified", source)])
+        self.assertEqual(len(bld._invalidated_tasks), 2)
+        self.assertTrue("foo" in bld.section_writer.sections["extensions"])
+
+        bld.rebuild([("modified", op.join(self.d, "bar.c"))])
+        self.assertEqual(bld._invalidated_tasks, [])
+        self.assertTrue("foo" in bld.section_writer.sections["extensions"])
+
+    def test_rebuild_new_file(self):
+        conf, configure, bld, build = self._run_configure_and_build({"bento.info": BENTO_INFO})
+        new_node = self.top_node.make_node(op.join("foo", "new.py"))
+        new_node.write("")
+
+        bld.rebuild([("created", new_node.abspath())])
+        files = bld.section_writer.sections["pythonfiles"]["foo"].files
+        self.assertTrue(op.join("foo", "new.py") in [source for source, target in files])
+
+    def test_watch_build(self):
+        conf, configure, bld, build = self._run_configure_and_build({"bento.info": BENTO_INFO})
+        manifest = op.join(self.build_node.abspath(), BUILD_MANIFEST_PATH)
+        os.remove(manifest)
+
+        class _Watcher(object):
+            def __init__(self, changes):
+                self.changes = changes
+                self.closed = False
+            def wait(self, timeout=None):
+                if not self.changes:
+                    raise KeyboardInterrupt()
+                return self.changes.pop(0)
+            def close(self):
+                self.closed = True
+
+        fubar = self.top_node.find_node("fubar.py").abspath()
+        watcher = _Watcher([[("modified", fubar)]])
+        watch_build(build, bld, watcher)
+        self.assertTrue(watcher.closed)
+        self.assertTrue(op.exists(manifest))
+
+        # Stopped when bento.info changes
+        bento_info = self.top_node.find_node("bento.info").abspath()
+        watcher = _Watcher([[("modified", bento_info)], [("modified", fubar)]])
+        watch_build(build, bld, watcher)
+        self.assertEqual(watcher.changes, [[("modified", fubar)]])
+
 def _not_has_waf():
     try:
         import bento.backends.waf_backend
@@ -82,6 +82,24 @@ Flag: floupi
         conf, configure = prepare_configure(run_node, bento_info, ConfigureYakuContext, ["--floupi=false"])
         run_command_in_context(conf, configure)
 
+    def test_conftest_cache(self):
+        run_node = self.root.find_node(self.d)
+
+        cache_dir = os.path.join(self.d, "conftests")
+        with mock.patch.dict(os.environ, {"BENTOMAKER_CONFTEST_CACHE": "1",
+                                          "BENTOMAKER_CONFTEST_CACHE_SIZE": "10"}):
+            with mock.patch("bento.backends.yaku_backend.CONFTEST_CACHE_DIR", cache_dir):
+                conf, configure = prepare_configure(run_node, BENTO_INFO, ConfigureYakuContext)
+        self.assertEqual(conf.yaku_context.conftest_cache.directory, cache_dir)
+        self.assertEqual(conf.yaku_context.conftest_cache.size, 10)
+
+    def test_conftest_cache_disabled(self):
+        run_node = self.root.find_node(self.d)
+
+        with mock.patch.dict(os.environ, {"BENTOMAKER_CONFTEST_CACHE": "0"}):
+            conf, configure = prepare_configure(run_node, BENTO_INFO, ConfigureYakuContext)
+        self.assertTrue(conf.yaku_context.conftest_cache is None)
+
 UNIX_REFERENCE = {
         'destdir': "/",
         'prefix': None,
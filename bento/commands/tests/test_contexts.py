@@ -1,8 +1,24 @@
 import sys
+import shutil
+import tempfile
+import subprocess
 
+import os.path as op
+
+import bento
+
+from bento.commands.command_contexts \
+    import \
+        HelpContext
 from bento.commands.contexts \
     import \
         GlobalContext
+from bento.commands.core \
+    import \
+        HelpCommand
+from bento.commands.options \
+    import \
+        OptionsContext
 from bento.compat.api.moves \
     import \
         unittest
@@ -44,3 +60,64 @@ Path: floupi
     Default: /yeah
 """)
         self._test(package_options, {"floupi": "/yeah"})
+
+class TestGlobalContextLazyRegistration(unittest.TestCase):
+    def setUp(self):
+        self.context = GlobalContext(None)
+
+    def test_lazy_command(self):
+        self.context.register_lazy_command("foo", "bento.commands.core:HelpCommand", public=False)
+        self.assertTrue(self.context.is_command_registered("foo"))
+        self.assertEqual(self.context.command_names(), [])
+        self.assertEqual(self.context.command_names(public_only=False), ["foo"])
+
+        cmd = self.context.retrieve_command("foo")
+        self.assertTrue(isinstance(cmd, HelpCommand))
+        # The command is only instantiated once
+        self.assertTrue(self.context.retrieve_command("foo") is cmd)
+
+    def test_lazy_command_already_registered(self):
+        self.context.register_command("foo", HelpCommand())
+        self.assertRaises(ValueError, lambda: \
+                self.context.register_lazy_command("foo", "bento.commands.core:HelpCommand"))
+
+    def test_lazy_options_context(self):
+        self.context.register_lazy_command("foo", "bento.commands.core:HelpCommand")
+        created = []
+        def create_context():
+            created.append(OptionsContext())
+            return created[-1]
+        self.context.register_lazy_options_context("foo", create_context)
+        self.assertTrue(self.context.is_options_context_registered("foo"))
+        self.assertEqual(created, [])
+
+        options_context = self.context.retrieve_options_context("foo")
+        self.assertEqual(created, [options_context])
+        self.assertTrue(self.context.retrieve_options_context("foo") is options_context)
+
+    def test_lazy_command_context(self):
+        self.context.register_lazy_command_context("foo",
+                "bento.commands.command_contexts:HelpContext")
+        self.assertTrue(self.context.retrieve_command_context("foo") is HelpContext)
+
+    def test_lazy_import_after_chdir(self):
+        # bento imported from a relative sys.path entry (e.g. from the
+        # checkout), then lazy imports after a chdir
+        script = """\
+import os
+import sys
+sys.path.insert(0, %(root)r)
+from bento.commands.registries import import_object
+os.chdir(%(d)r)
+import_object("bento.convert:ConvertCommand")
+import_object("bento.backends.yaku_backend:BuildYakuContext")
+"""
+        root = op.dirname(op.dirname(op.abspath(bento.__file__)))
+        d = tempfile.mkdtemp()
+        try:
+            p = subprocess.Popen([sys.executable, "-c", script % {"root": ".", "d": d}],
+                                 cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = p.communicate()
+            self.assertEqual(p.returncode, 0, err.decode())
+        finally:
+            shutil.rmtree(d)
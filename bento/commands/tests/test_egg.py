@@ -25,6 +25,10 @@ from bento.core.pkg_objects \
 from bento.commands.egg_utils \
     import \
         EggInfo
+from bento.commands.build_egg \
+    import \
+        bcompile_files
+import bento.commands.build_egg
 
 DESCR = """\
 Name: Sphinx
@@ -161,3 +165,56 @@ Platform: UNKNOWN
         egg_info = self._prepare_egg_info()
         for name, content in egg_info.iter_meta(self.build_node):
             pass
+
+class TestBcompileFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+
+        self.foo = self._write("foo.py", "a = 1\n")
+        self.bar = self._write("bar.py", "b = 1\n")
+        self.invalid = self._write("invalid.py", "a = \n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        filename = os.path.join(self.tmpdir, name)
+        f = open(filename, "w")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return filename
+
+    def _compiled(self, sources):
+        # Return the list of sources compiled by bcompile_files
+        compiled = []
+        old = bento.commands.build_egg.bcompile
+        def _bcompile(source):
+            compiled.append(source)
+            return old(source)
+        bento.commands.build_egg.bcompile = _bcompile
+        try:
+            bytecodes = bcompile_files(sources, self.cache_dir, 1)
+        finally:
+            bento.commands.build_egg.bcompile = old
+        return bytecodes, compiled
+
+    def test_cache(self):
+        sources = [self.foo, self.bar, self.invalid]
+        bytecodes, compiled = self._compiled(sources)
+        self.assertEqual(compiled, sources)
+        self.assertTrue(bytecodes[self.invalid] is None)
+
+        self._write("bar.py", "b = 2\n")
+        cached_bytecodes, compiled = self._compiled(sources)
+        self.assertEqual(compiled, [self.bar, self.invalid])
+        self.assertEqual(cached_bytecodes[self.foo], bytecodes[self.foo])
+        self.assertNotEqual(cached_bytecodes[self.bar], bytecodes[self.bar])
+
+    def test_prune(self):
+        self._compiled([self.foo, self.bar])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self._compiled([self.foo])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
@@ -28,7 +28,9 @@ from bento.commands.tests.utils \
         prepare_configure, prepare_build
 from bento.commands.install \
     import \
-        InstallCommand, TransactionLog, rollback_transaction
+        InstallCommand, TransactionLog, rollback_transaction, install_files, \
+        InstallRecord, incremental_install
+import bento.commands.install
 from bento.commands.options \
     import \
         OptionsContext
@@ -116,6 +118,30 @@ Library:
 """
         self._test_run(bento_info)
 
+    def test_transaction(self):
+        bento_info = """\
+Name: foo
+
+Library:
+    Packages: foo, foo.bar
+    Modules: fubar
+"""
+        install_prefix = tempfile.mkdtemp()
+        try:
+            context, conf, configure, bld, build = self._run_configure_and_build(bento_info, install_prefix)
+
+            install = InstallCommand()
+            opts = OptionsContext.from_command(install)
+
+            # The second install overwrites every file of the first one
+            for i in range(2):
+                inst = ContextWithBuildDirectory(context, ["-t"], opts, conf.pkg, self.top_node)
+                run_command_in_context(inst, install)
+                self.assertFalse(op.exists("transaction.log"))
+                self.assertFalse(op.exists("transaction.log.backup"))
+        finally:
+            shutil.rmtree(install_prefix)
+
     def test_simple_list_only(self):
         """Test whether install runs at all for a trivial package."""
         bento_info = """\
@@ -158,6 +184,303 @@ def write_simple_tree(base_dir):
         files.append(filename)
     return files
 
+def _read(filename):
+    fid = open(filename, "rb")
+    try:
+        return fid.read()
+    finally:
+        fid.close()
+
+class _InstallFilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.files = write_simple_tree(op.join(self.base_dir, "src"))
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _files(self, target_prefix):
+        src_dir = op.join(self.base_dir, "src")
+        kinds = ["pythonfiles", "executables"]
+        return [(kinds[i % 2], source, op.join(target_prefix, op.relpath(source, src_dir)))
+                for i, source in enumerate(self.files)]
+
+class TestInstallFiles(_InstallFilesTestCase):
+    def _test_install(self, jobs):
+        files = self._files(op.join(self.base_dir, "foo", "bar"))
+        install_files(files, jobs)
+        for kind, source, target in files:
+            self.assertEqual(_read(target), _read(source))
+            if kind == "executables":
+                self.assertEqual(os.stat(target).st_mode & int("777", 8), int("755", 8))
+            else:
+                self.assertEqual(os.stat(target).st_mode, os.stat(source).st_mode)
+
+    def test_serial(self):
+        self._test_install(1)
+
+    def test_parallel(self):
+        self._test_install(4)
+
+    def test_transaction(self):
+        target_prefix = op.join(self.base_dir, "foo")
+        trans_file = op.join(self.base_dir, "trans.log")
+
+        log = TransactionLog(trans_file)
+        try:
+            log.copy_files(self._files(target_prefix), 4)
+        finally:
+            log.close()
+        for kind, source, target in self._files(target_prefix):
+            self.assertTrue(op.exists(target))
+
+        rollback_transaction(trans_file)
+        self.assertFalse(op.exists(target_prefix))
+
+    def test_transaction_existing_target(self):
+        target_prefix = op.join(self.base_dir, "foo")
+        files = self._files(target_prefix)
+        os.makedirs(op.dirname(files[-1][2]))
+        open(files[-1][2], "w").close()
+
+        log = TransactionLog(op.join(self.base_dir, "trans.log"))
+        try:
+            self.assertRaises(ValueError, lambda: log.copy_files(files, 4))
+        finally:
+            log.close()
+        for kind, source, target in files[:-1]:
+            self.assertFalse(op.exists(target))
+
+    def test_transaction_overwrite(self):
+        target_prefix = op.join(self.base_dir, "foo")
+        trans_file = op.join(self.base_dir, "trans.log")
+        files = self._files(target_prefix)
+        os.makedirs(op.dirname(files[-1][2]))
+        fid = open(files[-1][2], "w")
+        try:
+            fid.write("old content")
+        finally:
+            fid.close()
+
+        log = TransactionLog(trans_file, overwrite=True)
+        try:
+            log.copy_files(files, 4)
+        finally:
+            log.close()
+        for kind, source, target in files:
+            self.assertEqual(_read(target), _read(source))
+
+        rollback_transaction(trans_file)
+        self.assertEqual(_read(files[-1][2]), "old content".encode())
+        for kind, source, target in files[:-1]:
+            self.assertFalse(op.exists(target))
+        self.assertFalse(op.exists(trans_file + ".backup"))
+
+    def test_transaction_commit(self):
+        target_prefix = op.join(self.base_dir, "foo")
+        trans_file = op.join(self.base_dir, "trans.log")
+        files = self._files(target_prefix)
+        os.makedirs(op.dirname(files[-1][2]))
+        open(files[-1][2], "w").close()
+
+        for i in range(2):
+            log = TransactionLog(trans_file, overwrite=True)
+            try:
+                log.copy_files(files, 4)
+                log.commit()
+            finally:
+                log.close()
+            for kind, source, target in files:
+                self.assertEqual(_read(target), _read(source))
+            self.assertFalse(op.exists(trans_file))
+            self.assertFalse(op.exists(trans_file + ".backup"))
+
+        # backups left by a commit interrupted after removing the journal
+        os.mkdir(trans_file + ".backup")
+        open(op.join(trans_file + ".backup", "0"), "w").close()
+        log = TransactionLog(trans_file, overwrite=True)
+        log.close()
+        self.assertFalse(op.exists(trans_file + ".backup"))
+
+    def test_transaction_resume(self):
+        class _KilledException(Exception):
+            pass
+
+        target_prefix = op.join(self.base_dir, "foo")
+        trans_file = op.join(self.base_dir, "trans.log")
+        files = self._files(target_prefix)
+
+        copied = []
+        old_copy_file = bento.commands.install._copy_file
+        def _copy_file(source, target, kind, link_mode):
+            if len(copied) == 15:
+                raise _KilledException()
+            copied.append(target)
+            old_copy_file(source, target, kind, link_mode)
+
+        old_values = (bento.commands.install.JOURNAL_BATCH_SIZE,
+                      bento.commands.install._JOURNAL_BLOCK_SIZE)
+        bento.commands.install._copy_file = _copy_file
+        bento.commands.install.JOURNAL_BATCH_SIZE = 10
+        bento.commands.install._JOURNAL_BLOCK_SIZE = 16
+        try:
+            # Interrupted in the second batch, without rollback
+            log = TransactionLog(trans_file)
+            log.rollback = lambda: None
+            try:
+                self.assertRaises(_KilledException, lambda: log.copy_files(files))
+            finally:
+                log.close()
+            # ... and while writing a record
+            fid = open(trans_file, "ab")
+            try:
+                fid.write(("COPY %s" % op.join(target_prefix, "foo")).encode())
+            finally:
+                fid.close()
+
+            copied = []
+            log = TransactionLog(trans_file, resume=True)
+            try:
+                log.copy_files(files)
+            finally:
+                log.close()
+            # The uncommitted batch is copied again
+            self.assertEqual(copied, [target for kind, source, target in files[10:]])
+            for kind, source, target in files:
+                self.assertEqual(_read(target), _read(source))
+
+            rollback_transaction(trans_file)
+            self.assertFalse(op.exists(target_prefix))
+            self.assertFalse(op.exists(trans_file))
+        finally:
+            bento.commands.install._copy_file = old_copy_file
+            (bento.commands.install.JOURNAL_BATCH_SIZE,
+             bento.commands.install._JOURNAL_BLOCK_SIZE) = old_values
+
+    def test_transaction_resume_backups(self):
+        # Killed after the BACKUP records were synced, but before every
+        # target was moved to the backup directory
+        class _KilledException(Exception):
+            pass
+
+        target_prefix = op.join(self.base_dir, "foo")
+        trans_file = op.join(self.base_dir, "trans.log")
+        files = self._files(target_prefix)[:3]
+        for i, (kind, source, target) in enumerate(files):
+            if not op.exists(op.dirname(target)):
+                os.makedirs(op.dirname(target))
+            fid = open(target, "w")
+            try:
+                fid.write("old%d" % i)
+            finally:
+                fid.close()
+
+        backed_up = []
+        old_backup_file = bento.commands.install._backup_file
+        def _backup_file(target, backup):
+            if len(backed_up) == 1:
+                raise _KilledException()
+            backed_up.append(target)
+            old_backup_file(target, backup)
+
+        bento.commands.install._backup_file = _backup_file
+        try:
+            log = TransactionLog(trans_file, overwrite=True)
+            log.rollback = lambda: None
+            try:
+                self.assertRaises(_KilledException, lambda: log.copy_files(files))
+            finally:
+                log.close()
+        finally:
+            bento.commands.install._backup_file = old_backup_file
+
+        log = TransactionLog(trans_file, overwrite=True, resume=True)
+        try:
+            log.copy_files(files)
+        finally:
+            log.close()
+        for kind, source, target in files:
+            self.assertEqual(_read(target), _read(source))
+
+        rollback_transaction(trans_file)
+        self.assertEqual([_read(target) for kind, source, target in files],
+                         [("old%d" % i).encode() for i in range(3)])
+
+class TestLinkInstall(_InstallFilesTestCase):
+    def test_hardlink(self):
+        files = self._files(op.join(self.base_dir, "foo"))
+        install_files(files, link_mode="hardlink")
+        for kind, source, target in files:
+            self.assertEqual(_read(target), _read(source))
+            # executables are copied as their mode differs from the source one
+            self.assertEqual(op.samefile(source, target), kind != "executables")
+
+        # Installing again (e.g. after a rebuild) does not write through the
+        # existing links
+        install_files(files, link_mode="copy")
+        for kind, source, target in files:
+            self.assertFalse(op.samefile(source, target))
+            self.assertEqual(_read(target), _read(source))
+
+    def test_reflink(self):
+        # Falls back on copy where reflinks are not supported
+        files = self._files(op.join(self.base_dir, "foo"))
+        install_files(files, link_mode="reflink")
+        for kind, source, target in files:
+            self.assertEqual(_read(target), _read(source))
+            self.assertFalse(op.samefile(source, target))
+
+class TestIncrementalInstall(_InstallFilesTestCase):
+    def _install(self, files):
+        # Return the list of targets copied by incremental_install
+        copied = []
+        old_copy_file = bento.commands.install._copy_file
+        def _copy_file(source, target, kind, link_mode):
+            copied.append(target)
+            old_copy_file(source, target, kind, link_mode)
+        bento.commands.install._copy_file = _copy_file
+        try:
+            record = InstallRecord(op.join(self.base_dir, "record.json"))
+            incremental_install(record, {"prefix": self.base_dir}, files)
+        finally:
+            bento.commands.install._copy_file = old_copy_file
+        return copied
+
+    def _write(self, filename, content, mtime=None):
+        fid = open(filename, "w")
+        try:
+            fid.write(content)
+        finally:
+            fid.close()
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+
+    def test_unchanged(self):
+        files = self._files(op.join(self.base_dir, "foo"))
+        self.assertEqual(len(self._install(files)), len(files))
+        self.assertEqual(self._install(files), [])
+
+        # Only touched: same content
+        os.utime(files[0][1], (1000000000, 1000000000))
+        self.assertEqual(self._install(files), [])
+
+    def test_changed(self):
+        files = self._files(op.join(self.base_dir, "foo"))
+        self._install(files)
+
+        self._write(files[0][1], "modified source", 1000000000)
+        self._write(files[1][2], "modified target", 1000000000)
+        self.assertEqual(self._install(files), [files[0][2], files[1][2]])
+        self.assertEqual(_read(files[0][2]), _read(files[0][1]))
+        self.assertEqual(_read(files[1][2]), _read(files[1][1]))
+
+    def test_removed(self):
+        files = self._files(op.join(self.base_dir, "foo"))
+        self._install(files)
+
+        self.assertEqual(self._install(files[1:]), [])
+        self.assertFalse(op.exists(files[0][2]))
+
 class TestTransactionLog(unittest.TestCase):
     def setUp(self):
         self.base_dir = tempfile.mkdtemp()
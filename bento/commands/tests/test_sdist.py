@@ -2,8 +2,11 @@ import os
 import os.path as op
 import tempfile
 import shutil
+import tarfile
 import zipfile
 
+import mock
+
 from bento.compat.api.moves \
     import \
         unittest
@@ -22,6 +25,9 @@ from bento.commands.command_contexts \
 from bento.commands.sdist \
     import \
         SdistCommand
+from bento.utils.archive \
+    import \
+        ZipArchive
 from bento.commands.wrapper_utils \
     import \
         run_command_in_context
@@ -170,3 +176,85 @@ VERSION = $VERSION
         run_command_in_context(context, sdist)
 
         self._assert_archive_equality(op.join("dist", "foo.zip"), archive_list)
+
+    def test_reproducible_tarball(self):
+        bento_info = """\
+Name: foo
+Version: 1.0
+
+Library:
+    Packages: foo, foo.bar
+    Modules: fubar
+"""
+        create_fake_package_from_bento_info(self.top_node, bento_info)
+        package = PackageDescription.from_string(bento_info)
+
+        def _sdist(output):
+            sdist = SdistCommand()
+            opts = OptionsContext.from_command(sdist)
+            cmd_argv = ["--output-file=%s" % output, "--reproducible", "-j"]
+
+            context = SdistContext(None, cmd_argv, opts, package, self.run_node)
+            run_command_in_context(context, sdist)
+            return self.run_node.find_node(op.join("dist", output)).abspath()
+
+        first = _sdist("first.tar.gz")
+        os.utime(self.top_node.find_node("fubar.py").abspath(), (1000000000, 1000000000))
+        second = _sdist("second.tar.gz")
+
+        f1, f2 = open(first, "rb"), open(second, "rb")
+        try:
+            self.assertEqual(f1.read(), f2.read())
+        finally:
+            f1.close()
+            f2.close()
+
+        tf = tarfile.open(first, "r:gz")
+        try:
+            self.assertEqual(tf.getnames(), sorted(tf.getnames()))
+            for tarinfo in tf.getmembers():
+                self.assertEqual((tarinfo.uid, tarinfo.gid), (0, 0))
+        finally:
+            tf.close()
+
+    def test_incremental_zip(self):
+        bento_info = """\
+Name: foo
+Version: 1.0
+
+Library:
+    Packages: foo, foo.bar
+    Modules: fubar
+"""
+        create_fake_package_from_bento_info(self.top_node, bento_info)
+        package = PackageDescription.from_string(bento_info)
+
+        def _sdist():
+            # Return the list of files written (i.e. not copied) in the archive
+            sdist = SdistCommand()
+            opts = OptionsContext.from_command(sdist)
+            cmd_argv = ["--output-file=foo.zip", "--format=zip", "--incremental"]
+
+            context = SdistContext(None, cmd_argv, opts, package, self.run_node)
+            written = []
+            old_write_file = ZipArchive._write_file
+            def _write_file(self, zid, filename, arcname):
+                written.append(arcname)
+                return old_write_file(self, zid, filename, arcname)
+            with mock.patch.object(ZipArchive, "_write_file", _write_file):
+                run_command_in_context(context, sdist)
+            return sorted(written)
+
+        self.assertEqual(len(_sdist()), 4)
+        self.assertEqual(_sdist(), [])
+
+        fubar = self.top_node.find_node("fubar.py")
+        fubar.write("print('fubar')\n")
+        self.assertEqual(_sdist(), ["foo-1.0/fubar.py"])
+
+        z = zipfile.ZipFile(self.run_node.find_node(op.join("dist", "foo.zip")).abspath())
+        try:
+            self.assertEqual(z.read("foo-1.0/fubar.py"), "print('fubar')\n".encode("ascii"))
+            self.assertEqual(len(z.namelist()), 4)
+        finally:
+            z.close()
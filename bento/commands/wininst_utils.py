@@ -2,13 +2,6 @@ import sys
 import os
 import time
 
-from distutils.util \
-    import \
-        get_platform
-from distutils.sysconfig \
-    import \
-        get_python_version
-
 from bento._config \
     import \
         WININST_DIR
@@ -33,9 +26,12 @@ def wininst_filename(meta, pyver=None):
 def get_exe_bytes (target_version=None, plat_name=None):
     if target_version is None:
         target_version = ""
+    # distutils is only imported here as it is slow to import
+    from distutils.util import get_platform
+    from distutils.sysconfig import get_python_version
+    from distutils.msvccompiler import get_build_version
     if plat_name is None:
         plat_name = get_platform()
-    from distutils.msvccompiler import get_build_version
     # If a target-version other than the current version has been
     # specified, then using the MSVC version from *this* build is no good.
     # Without actually finding and executing the target version and parsing
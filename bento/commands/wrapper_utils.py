@@ -10,12 +10,14 @@ from bento.commands.hooks \
 
 def run_with_dependencies(global_context, cmd_name, cmd_argv, run_node, top_node, package):
     """Run the given command, including its dependencies as defined in the
-    global_context."""
+    global_context.
+
+    Returns the (command, context) of the given command."""
     deps = global_context.retrieve_dependencies(cmd_name)
     for dep_cmd_name in deps:
         dep_cmd_argv = global_context.retrieve_command_argv(dep_cmd_name)
         resolve_and_run_command(global_context, dep_cmd_name, dep_cmd_argv, run_node, package)
-    resolve_and_run_command(global_context, cmd_name, cmd_argv, run_node, package)
+    return resolve_and_run_command(global_context, cmd_name, cmd_argv, run_node, package)
 
 def resolve_and_run_command(global_context, cmd_name, cmd_argv, run_node, package):
     """Run the given Command instance inside its context, including any hook
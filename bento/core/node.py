@@ -8,16 +8,21 @@ efficient.
 Ripped off from waf (v 1.6), by Thomas Nagy. The cool design is his, bugs most
 certainly mine :) We removed a few things which are not useful for bento.
 """
-import os, shutil, re, sys, errno
+import os, shutil, re, sys, errno, time
 
 import os.path as op
 
+from six.moves import cPickle
+
 from bento.compat.api \
     import \
         rename, NamedTemporaryFile
 from bento.utils.utils \
     import \
         is_string, extract_exception
+from bento.utils.io2 \
+    import \
+        safe_write
 
 def to_list(sth):
     if isinstance(sth, str):
@@ -60,6 +65,174 @@ Ant patterns for files and folders to exclude while doing the
 recursive traversal in :py:meth:`waflib.Node.Node.ant_glob`
 """
 
+# ant pattern -> list of its components, compiled (or '**')
+_ANT_PATTERNS = {}
+# ant patterns string -> list of compiled patterns
+_ANT_PATTERN_LISTS = {}
+
+def _ant_pattern(x):
+    try:
+        return _ANT_PATTERNS[x]
+    except KeyError:
+        pass
+    pat = x.replace('\\', '/').replace('//', '/')
+    if pat.endswith('/'):
+        pat += '**'
+    accu = []
+    for k in pat.split('/'):
+        if k == '**':
+            accu.append(k)
+        else:
+            k = k.replace('.', '[.]').replace('*','.*').replace('?', '.').replace('+', '\\+')
+            k = '^%s$' % k
+            accu.append(re.compile(k))
+    _ANT_PATTERNS[x] = accu
+    return accu
+
+def _ant_patterns(s):
+    # Compiled patterns of the given ant patterns string or list, cached as
+    # patterns (the default exclusion ones in particular) are given again and
+    # again
+    if isinstance(s, str):
+        try:
+            return _ANT_PATTERN_LISTS[s]
+        except KeyError:
+            ret = _ANT_PATTERN_LISTS[s] = [_ant_pattern(x) for x in to_list(s)]
+            return ret
+    return [_ant_pattern(x) for x in to_list(s)]
+
+def _ant_filter(name, nn):
+    # Return the patterns (compiled components lists) to match the children
+    # of name against, an empty list meaning a pattern matches name itself
+    ret = []
+    for lst in nn:
+        if not lst:
+            pass
+        elif lst[0] == '**':
+            ret.append(lst)
+            if len(lst) > 1:
+                if lst[1].match(name):
+                    ret.append(lst[2:])
+            else:
+                ret.append([])
+        elif lst[0].match(name):
+            ret.append(lst[1:])
+    return ret
+
+if hasattr(os, "scandir"):
+    def _listdir_types(path):
+        # d_type is used when available, instead of a stat per entry
+        return [(entry.name, entry.is_dir()) for entry in os.scandir(path)]
+else:
+    def _listdir_types(path):
+        return [(name, op.isdir(op.join(path, name))) for name in os.listdir(path)]
+
+class DirectoryCache(object):
+    """Directory listings shared by ant_glob calls, so that a tree is only
+    listed once when resolving many patterns (e.g. every glob of a package).
+
+    Listings are never invalidated: a new cache must be used once files may
+    have been added or removed."""
+    def __init__(self):
+        self._listings = {}
+        self._names = {}
+
+    def listdir(self, path):
+        """Return the sorted list of (name, is directory) of the entries of
+        the given directory."""
+        try:
+            return self._listings[path]
+        except KeyError:
+            ret = self._listings[path] = sorted(_listdir_types(path))
+            return ret
+
+    def names(self, path):
+        """Return the set of the entry names of the given directory."""
+        try:
+            return self._names[path]
+        except KeyError:
+            ret = self._names[path] = frozenset(name for name, isdir in self.listdir(path))
+            return ret
+
+# Bumped whenever the format of the pickled snapshot changes
+_SNAPSHOT_VERSION = 1
+# Directories modified less than this number of seconds before being listed
+# are not kept in a stored snapshot: a change within the same mtime tick
+# (one or two seconds on some filesystems) would not be detected
+_SNAPSHOT_MTIME_MARGIN = 2
+
+class FilesystemSnapshot(DirectoryCache):
+    """DirectoryCache whose listings may be stored, and reused by later runs
+    as long as the directory is unchanged.
+
+    A stored listing is only reused if the directory mtime did not change
+    since it was taken, so that a listing costs one stat instead of a full
+    directory read (which matters on network filesystems). Adding, removing
+    or renaming an entry updates the mtime of its directory, modifying a file
+    does not, but file contents are never part of a listing.
+
+    Listings are not invalidated during a run, as for DirectoryCache."""
+    @classmethod
+    def from_file(cls, filename):
+        """Create a new instance from a stored snapshot.
+
+        If the file does not exist or cannot be read, creates an empty
+        snapshot."""
+        try:
+            fid = open(filename, "rb")
+        except IOError:
+            return cls()
+        try:
+            try:
+                data = cPickle.load(fid)
+            except Exception:
+                return cls()
+        finally:
+            fid.close()
+        if not isinstance(data, dict) or data.get("version") != _SNAPSHOT_VERSION:
+            return cls()
+        return cls(data["listings"])
+
+    def __init__(self, listings=None):
+        super(FilesystemSnapshot, self).__init__()
+        # path -> (directory mtime, sorted list of (name, is directory))
+        self._stored = listings or {}
+        # path -> (directory mtime, time of the listing) of listings taken in
+        # this run
+        self._taken = {}
+
+    def listdir(self, path):
+        try:
+            return self._listings[path]
+        except KeyError:
+            pass
+        mtime = os.stat(path).st_mtime
+        stored = self._stored.get(path, None)
+        if stored is not None and stored[0] == mtime:
+            ret = stored[1]
+        else:
+            self._taken[path] = (mtime, time.time())
+            ret = sorted(_listdir_types(path))
+        self._listings[path] = ret
+        return ret
+
+    def store(self, filename):
+        """Store the listings used during this run, together with the stored
+        listings still valid, in the given file."""
+        listings = {}
+        for path, listing in self._listings.items():
+            if path in self._taken:
+                mtime, listed = self._taken[path]
+                if mtime >= listed - _SNAPSHOT_MTIME_MARGIN:
+                    continue
+            else:
+                mtime = self._stored[path][0]
+            listings[path] = (mtime, listing)
+        if listings == self._stored and os.path.exists(filename):
+            return
+        data = {"version": _SNAPSHOT_VERSION, "listings": listings}
+        safe_write(filename, lambda fid: cPickle.dump(data, fid, 2))
+
 def split_path(path):
     return path.split('/')
 
@@ -340,56 +513,52 @@ class Node(object):
             p = p.parent
         return id(p) == id(node)
 
-    def _ant_iter(self, accept=None, maxdepth=25, pats=[], dir=False, src=True, remove=True):
+    def _ant_walk(self, incl, excl, results, maxdepth, dir, src, remove, cache):
         """
-        Semi-private and recursive method used by ant_glob.
-
-        :param accept: function used for accepting/rejecting a node, returns the patterns that can be still accepted in recursion
-        :type accept: function
-        :param maxdepth: maximum depth in the filesystem (25)
-        :type maxdepth: int
-        :param pats: list of patterns to accept and list of patterns to exclude
-        :type pats: tuple
-        :param dir: return folders too (False by default)
-        :type dir: bool
-        :param src: return files (True by default)
-        :type src: bool
-        :param remove: remove files/folders that do not exist (True by default)
-        :type remove: bool
+        Semi-private and recursive method used by ant_glob_many.
+
+        :param incl: (index, compiled patterns which can still be accepted) of
+                     each pattern which can still match
+        :type incl: list
+        :param excl: the compiled patterns which can still be excluded
+        :type excl: list
+        :param results: for each pattern, list of accepted nodes
+        :type results: list
+        :param cache: directory listings
+        :type cache: DirectoryCache
         """
-        dircont = self.listdir()
-        dircont.sort()
+        dircont = cache.listdir(self.abspath())
 
         try:
             lst = set(self.children.keys())
             if remove:
-                for x in lst - set(dircont):
+                for x in lst - set([name for name, isdir in dircont]):
                     del self.children[x]
         except:
             self.children = {}
 
-        for name in dircont:
-            npats = accept(name, pats)
-            if npats and npats[0]:
-                accepted = [] in npats[0]
-
-                node = self.make_node([name])
-
-                isdir = os.path.isdir(node.abspath())
-                if accepted:
-                    if isdir:
-                        if dir:
-                            yield node
-                    else:
-                        if src:
-                            yield node
-
-                if getattr(node, 'cache_isdir', None) or isdir:
-                    node.cache_isdir = True
-                    if maxdepth:
-                        for k in node._ant_iter(accept=accept, maxdepth=maxdepth - 1, pats=npats, dir=dir, src=src):
-                            yield k
-        raise StopIteration
+        for name, isdir in dircont:
+            nrej = _ant_filter(name, excl)
+            if [] in nrej:
+                continue
+            naccs = []
+            for i, pats in incl:
+                nacc = _ant_filter(name, pats)
+                if nacc:
+                    naccs.append((i, nacc))
+            if not naccs:
+                continue
+
+            node = self.make_node([name])
+            if (isdir and dir) or (not isdir and src):
+                for i, nacc in naccs:
+                    if [] in nacc:
+                        results[i].append(node)
+
+            if isdir:
+                node.cache_isdir = True
+                if maxdepth:
+                    node._ant_walk(naccs, nrej, results, maxdepth - 1, dir, src, remove, cache)
 
     def ant_glob(self, *k, **kw):
         """
@@ -420,64 +589,41 @@ class Node(object):
         :type src: bool
         :param remove: remove files/folders that do not exist (True by default)
         :type remove: bool
-        :param maxdepth: maximum depth of recursion
-        :type maxdepth: int
+        :param cache: directory listings to reuse (see DirectoryCache)
+        :type cache: DirectoryCache
         """
-
-        src = kw.get('src', True)
-        dir = kw.get('dir', False)
-
-        excl = kw.get('excl', exclude_regs)
         incl = k and k[0] or kw.get('incl', '**')
-
-        def to_pat(s):
-            lst = to_list(s)
-            ret = []
-            for x in lst:
-                x = x.replace('\\', '/').replace('//', '/')
-                if x.endswith('/'):
-                    x += '**'
-                lst2 = x.split('/')
-                accu = []
-                for k in lst2:
-                    if k == '**':
-                        accu.append(k)
-                    else:
-                        k = k.replace('.', '[.]').replace('*','.*').replace('?', '.').replace('+', '\\+')
-                        k = '^%s$' % k
-                        accu.append(re.compile(k))
-                ret.append(accu)
-            return ret
-
-        def filtre(name, nn):
-            ret = []
-            for lst in nn:
-                if not lst:
-                    pass
-                elif lst[0] == '**':
-                    ret.append(lst)
-                    if len(lst) > 1:
-                        if lst[1].match(name):
-                            ret.append(lst[2:])
-                    else:
-                        ret.append([])
-                elif lst[0].match(name):
-                    ret.append(lst[1:])
-            return ret
-
-        def accept(name, pats):
-            nacc = filtre(name, pats[0])
-            nrej = filtre(name, pats[1])
-            if [] in nrej:
-                nacc = []
-            return [nacc, nrej]
-
-        ret = [x for x in self._ant_iter(accept=accept, pats=[to_pat(incl), to_pat(excl)], maxdepth=25, dir=dir, src=src, remove=kw.get('remove', True))]
+        ret = self.ant_glob_many([incl], **kw)[0]
         if kw.get('flat', False):
             return ' '.join([x.path_from(self) for x in ret])
 
         return ret
 
+    def ant_glob_many(self, patterns, **kw):
+        """
+        Same as ant_glob for each item of patterns (ant pattern or list of ant
+        patterns), in a single walk of the tree. Return the list of nodes of
+        each item.
+
+        :param patterns: list of ant patterns, or of lists of patterns
+        :type patterns: list
+        :param excl: ant patterns or list of patterns to exclude, common to every item
+        :type excl: string or list of strings
+
+        See ant_glob for the other arguments.
+        """
+        src = kw.get('src', True)
+        dir = kw.get('dir', False)
+        excl = kw.get('excl', exclude_regs)
+        cache = kw.get('cache', None)
+        if cache is None:
+            cache = DirectoryCache()
+
+        incl = [(i, _ant_patterns(p)) for i, p in enumerate(patterns)]
+        results = [[] for p in patterns]
+        self._ant_walk(incl, _ant_patterns(excl), results, 25, dir, src, kw.get('remove', True), cache)
+        return results
+
     def find_dir(self, lst):
         """
         search a folder in the filesystem
@@ -7,7 +7,7 @@ from bento.core.pkg_objects \
         Extension
 from bento.core.node \
     import \
-        split_path
+        split_path, DirectoryCache
 
 def translate_name(name, ref_node, from_node):
     if from_node != ref_node:
@@ -111,10 +111,13 @@ class NodeRepresentation(object):
         self._extra_source_nodes = []
         self._aliased_source_nodes = {}
 
+        # Directory listings shared by the globs of update_package
+        self._dir_cache = None
+
     def to_node_extension(self, extension, source_node, ref_node):
         nodes = []
-        for s in extension.sources:
-            _nodes = source_node.ant_glob(s)
+        globbed = source_node.ant_glob_many(extension.sources, cache=self._dir_cache)
+        for s, _nodes in zip(extension.sources, globbed):
             if len(_nodes) < 1:
                 #name = translate_name(extension.name, ref_node, self.top_or_sub_directory_node)
                 raise IOError("Sources glob entry %r for extension %r did not return any result" \
@@ -171,13 +174,14 @@ class NodeRepresentation(object):
     def _update_py_packages(self, pkg):
         def _resolve_package(package_name, ref_node):
             init = os.path.join(*(package_name.split(".") + ["__init__.py"]))
-            n = ref_node.find_node(init)
+            n = self._find_node(ref_node, init)
             if n is None:
                 raise IOError("init file for package %s not found (looked for %r)!" \
                               % (package_name, init))
             else:
                 p = n.parent
-                nodes = [p.find_node(f) for f in p.listdir() if f.endswith(".py")]
+                nodes = [p.make_node([f]) for f, isdir in self._dir_cache.listdir(p.abspath()) \
+                         if f.endswith(".py") and not isdir]
                 node_package = NodePythonPackage(package_name, nodes, self.top_node,
                                                  ref_node, self.sub_directory_node)
                 self._registry["packages"][node_package.full_name] = node_package
@@ -194,8 +198,8 @@ class NodeRepresentation(object):
         for name, data_section in pkg.data_files.items():
             ref_node = self.top_node.find_node(data_section.source_dir)
             nodes = []
-            for f in data_section.files:
-                ns = ref_node.ant_glob(f)
+            globbed = ref_node.ant_glob_many(data_section.files, cache=self._dir_cache)
+            for f, ns in zip(data_section.files, globbed):
                 if len(ns) < 1:
                     raise IOError("File/glob %s could not be resolved (data file section %s)" % (f, name))
                 else:
@@ -204,28 +208,54 @@ class NodeRepresentation(object):
 
     def _update_py_modules(self, pkg):
         for m in pkg.py_modules:
-            n = self.top_or_sub_directory_node.find_node("%s.py" % m)
+            n = self._find_node(self.top_or_sub_directory_node, "%s.py" % m)
             if n is None:
                 raise IOError("file for module %s not found" % m)
             else:
                 self._registry["modules"][m] = n
 
     def _update_extra_sources(self, pkg):
-        for s in pkg.extra_source_files:
-            nodes = self.top_node.ant_glob(s)
+        globbed = self.top_node.ant_glob_many(pkg.extra_source_files, cache=self._dir_cache)
+        for s, nodes in zip(pkg.extra_source_files, globbed):
             if len(nodes) < 1:
                 warnings.warn("extra source files glob entry %r did not return any result" % (s,))
             self._extra_source_nodes.extend(nodes)
 
-    def update_package(self, pkg):
-        self._update_py_packages(pkg)
-        self._update_py_modules(pkg)
-
-        self._update_extensions(pkg)
-        self._update_libraries(pkg)
-
-        self._update_data_files(pkg)
-        self._update_extra_sources(pkg)
+    def _find_node(self, ref_node, path):
+        # Same as ref_node.find_node(path), existence being checked on the
+        # directory listings instead of a stat per component
+        names = [name for name in split_path(path.replace(os.sep, "/")) if name and name != "."]
+        if self._dir_cache is None or ".." in names:
+            return ref_node.find_node(path)
+        node = ref_node
+        for name in names:
+            try:
+                if not name in self._dir_cache.names(node.abspath()):
+                    return None
+            except OSError:
+                return None
+            node = node.make_node([name])
+        return node
+
+    def update_package(self, pkg, dir_cache=None):
+        """Resolve the sources of the given package.
+
+        dir_cache is the DirectoryCache used to list the source tree, e.g. a
+        FilesystemSnapshot kept across runs. A new cache is used if None."""
+        if dir_cache is None:
+            dir_cache = DirectoryCache()
+        self._dir_cache = dir_cache
+        try:
+            self._update_py_packages(pkg)
+            self._update_py_modules(pkg)
+
+            self._update_extensions(pkg)
+            self._update_libraries(pkg)
+
+            self._update_data_files(pkg)
+            self._update_extra_sources(pkg)
+        finally:
+            self._dir_cache = None
 
     def iter_category(self, category):
         if category in self._registry:
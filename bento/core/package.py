@@ -1,9 +1,5 @@
 import os
 
-from copy \
-    import \
-        deepcopy
-
 from bento.core.pkg_objects \
     import \
         Extension, DataFiles, Executable, CompiledLibrary
@@ -98,7 +94,7 @@ def build_data_files_from_dict(data_files_d):
 def raw_to_subpkg_kw(raw_dict):
     d = build_ast_from_raw_dict(raw_dict)
 
-    libraries_d, misc_d = extract_top_dicts_subento(deepcopy(d))
+    libraries_d, misc_d = extract_top_dicts_subento(d)
 
     kw = {}
     libraries = build_libs_from_dict(libraries_d)
@@ -130,7 +126,7 @@ def raw_to_pkg_kw(raw_dict, user_flags, bento_info=None):
 
     d = build_ast_from_raw_dict(raw_dict, user_flags)
 
-    meta_d, libraries_d, options_d, misc_d = extract_top_dicts(deepcopy(d))
+    meta_d, libraries_d, options_d, misc_d = extract_top_dicts(d)
     libraries = build_libs_from_dict(libraries_d)
     executables = build_executables_from_dict(misc_d.pop("executables"))
     data_files = build_data_files_from_dict(misc_d.pop("data_files"))
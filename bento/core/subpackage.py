@@ -124,8 +124,7 @@ def flatten_subpackage_compiled_libraries(spkg, top_node):
     ret = {}
     for name, clib in spkg.compiled_libraries.items():
         nodes = []
-        for source in clib.sources:
-            _nodes = local_node.ant_glob(source)
+        for source, _nodes in zip(clib.sources, local_node.ant_glob_many(clib.sources)):
             if len(_nodes) < 1:
                 raise IOError("Pattern %r did not resolve to anything !" % source)
             else:
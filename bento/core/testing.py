@@ -26,6 +26,20 @@ def skip_if(condition, msg=""):
 def expected_failure(f):
     return unittest.expectedFailure(f)
 
+def disable_conftest_cache():
+    """Keep the yaku configure checks of the tests out of the conftest cache
+    of the user (see bento._config.CONFTEST_CACHE_DIR), so that their results
+    do not depend on earlier runs. Return a function restoring the previous
+    setting."""
+    old = os.environ.get("BENTOMAKER_CONFTEST_CACHE", None)
+    os.environ["BENTOMAKER_CONFTEST_CACHE"] = "0"
+    def _restore():
+        if old is None:
+            del os.environ["BENTOMAKER_CONFTEST_CACHE"]
+        else:
+            os.environ["BENTOMAKER_CONFTEST_CACHE"] = old
+    return _restore
+
 def require_c_compiler(builder="yaku"):
     if builder == "yaku":
         return _require_c_compiler_yaku()
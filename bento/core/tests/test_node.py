@@ -12,7 +12,8 @@ from bento.compat.api.moves \
         unittest
 from bento.core.node \
     import \
-        Node, create_root_with_source_tree, find_root, split_path_win32, split_path_cygwin
+        Node, DirectoryCache, FilesystemSnapshot, create_root_with_source_tree, find_root, split_path_win32, \
+        split_path_cygwin
 
 class TestNode(unittest.TestCase):
     def setUp(self):
@@ -126,6 +127,65 @@ class TestNodeInsideTemp(unittest.TestCase):
         foobar = self.d_node.find_node("foo.bar")
         self.assertEqual(set(node.abspath() for node in nodes), set([foobar.abspath()]))
 
+    def test_ant_glob_many(self):
+        for filename in ["bar.txt", "foo.bar", "sub/fubar.txt", "sub/.git/foo.txt"]:
+            n = self.d_node.make_node(filename)
+            n.parent.mkdir()
+            n.write("")
+        patterns = ["*.txt", "**/*.txt", "sub/*", "*.bar sub/*.txt", "nothing"]
+        res = self.d_node.ant_glob_many(patterns)
+        self.assertEqual(res, [self.d_node.ant_glob(p) for p in patterns])
+        self.assertEqual([[n.path_from(self.d_node) for n in nodes] for nodes in res],
+                         [["bar.txt"], ["bar.txt", op.join("sub", "fubar.txt")],
+                          [op.join("sub", "fubar.txt")],
+                          ["foo.bar", op.join("sub", "fubar.txt")], []])
+
+    def test_directory_cache(self):
+        cache = DirectoryCache()
+        self.d_node.make_node("bar.txt").write("")
+        self.assertEqual(len(self.d_node.ant_glob("*.txt", cache=cache)), 1)
+
+        # Files created since the directory was listed are not seen
+        self.d_node.make_node("foo.txt").write("")
+        self.assertEqual(len(self.d_node.ant_glob("*.txt", cache=cache)), 1)
+        self.assertEqual(len(self.d_node.ant_glob("*.txt")), 2)
+
+    def test_filesystem_snapshot(self):
+        filename = op.join(self.d_node.abspath(), "snapshot.bin")
+        sub = self.d_node.make_node("sub")
+        sub.make_node("bar.txt").parent.mkdir()
+        sub.make_node("bar.txt").write("")
+        # Directories modified recently are not stored
+        FilesystemSnapshot().listdir(sub.abspath())
+        snapshot = FilesystemSnapshot()
+        snapshot.listdir(sub.abspath())
+        snapshot.store(filename)
+        self.assertEqual(FilesystemSnapshot.from_file(filename)._stored, {})
+
+        old = os.stat(sub.abspath()).st_mtime - 60
+        os.utime(sub.abspath(), (old, old))
+        snapshot = FilesystemSnapshot()
+        snapshot.listdir(sub.abspath())
+        snapshot.store(filename)
+
+        # The stored listing is used as long as the directory mtime is
+        # unchanged
+        snapshot = FilesystemSnapshot.from_file(filename)
+        snapshot._stored[sub.abspath()][1].append(("fake.txt", False))
+        self.assertEqual(len(sub.ant_glob("*.txt", cache=snapshot)), 2)
+
+        sub.make_node("foo.txt").write("")
+        os.utime(sub.abspath(), (old + 1, old + 1))
+        snapshot = FilesystemSnapshot.from_file(filename)
+        self.assertEqual([n.name for n in sub.ant_glob("*.txt", cache=snapshot)],
+                         ["bar.txt", "foo.txt"])
+
+    def test_filesystem_snapshot_invalid(self):
+        filename = op.join(self.d_node.abspath(), "snapshot.bin")
+        self.assertEqual(FilesystemSnapshot.from_file(filename)._stored, {})
+        self.d_node.make_node("snapshot.bin").write("garbage")
+        self.assertEqual(FilesystemSnapshot.from_file(filename)._stored, {})
+
 class TestNodeWithBuild(unittest.TestCase):
     def setUp(self):
         top = os.getcwd()
@@ -1,8 +1,11 @@
 import os
 import sys
 import copy
+import struct
 import warnings
 
+import six
+
 from bento.compat.api import json
 import bento.compat.api as compat
 
@@ -12,7 +15,7 @@ from bento.core.node \
 from bento.core.platforms \
     import \
         get_scheme
-from bento.utils.utils import subst_vars, same_content, fix_kw, explode_path
+from bento.utils.utils import SubstitutionContext, same_content, fix_kw, explode_path
 from bento.core.pkg_objects \
     import \
         Executable
@@ -65,6 +68,95 @@ InstalledSection(%(category)s,
                 self.target_dir == other.target_dir and \
                 self.files == other.files
 
+class _LazyInstalledSection(InstalledSection):
+    """InstalledSection of a binary build manifest, whose files are only read
+    when first needed."""
+    def __init__(self, category, name, srcdir, target, filename, offset, size):
+        InstalledSection.__init__(self, category, name, srcdir, target, [])
+        self._location = (filename, offset, size)
+        self._files = None
+
+    def _get_files(self):
+        if self._files is None:
+            files = _read_binary_section(*self._location)
+            if os.sep != "/":
+                files = [(bento.utils.path.normalize_path(f), bento.utils.path.normalize_path(g))
+                         for f, g in files]
+            self._files = files
+        return self._files
+
+    def _set_files(self, files):
+        self._files = files
+
+    files = property(_get_files, _set_files)
+
+# Binary build manifest layout: magic and version, the files of each section
+# as length-prefixed (source, target) records, the json index of the sections
+# and other manifest data, and the offset of the index followed by the magic
+# again. An empty target means the target is the same as the source.
+_BINARY_MAGIC = six.b("BENTOBM")
+BINARY_MANIFEST_VERSION = 1
+_BINARY_HEADER = struct.Struct("<7sB")
+_BINARY_RECORD = struct.Struct("<II")
+_BINARY_TRAILER = struct.Struct("<Q7s")
+
+def _encode_path(path):
+    if isinstance(path, six.text_type):
+        return path.encode("utf-8")
+    return path
+
+def _write_binary_section(fid, files):
+    data = []
+    for f, g in files:
+        f = _encode_path(f)
+        g = _encode_path(g)
+        if g == f:
+            g = six.b("")
+        data.extend([_BINARY_RECORD.pack(len(f), len(g)), f, g])
+    fid.write(six.b("").join(data))
+
+def _read_binary_section(filename, offset, size):
+    fid = open(filename, "rb")
+    try:
+        fid.seek(offset)
+        data = fid.read(size)
+    finally:
+        fid.close()
+    if len(data) != size:
+        raise IOError("Truncated build manifest %r" % filename)
+
+    files = []
+    i = 0
+    while i < size:
+        f_size, g_size = _BINARY_RECORD.unpack(data[i:i+_BINARY_RECORD.size])
+        i += _BINARY_RECORD.size
+        f = data[i:i+f_size].decode("utf-8")
+        i += f_size
+        if g_size:
+            g = data[i:i+g_size].decode("utf-8")
+            i += g_size
+        else:
+            g = f
+        files.append((f, g))
+    return files
+
+def is_binary_manifest(filename):
+    """Return True if the given file is a binary build manifest."""
+    fid = open(filename, "rb")
+    try:
+        return fid.read(len(_BINARY_MAGIC)) == _BINARY_MAGIC
+    finally:
+        fid.close()
+
+def _join_normalized(directory, path):
+    # Same as os.path.normpath(os.path.join(directory, path)) for a normalized
+    # directory, normpath being only called if path is not normalized
+    padded = os.sep + path + os.sep
+    if os.sep * 2 in padded or os.sep + "." + os.sep in padded \
+            or os.sep + ".." + os.sep in padded or (os.altsep and os.altsep in path):
+        return os.path.normpath(os.path.join(directory, path))
+    return os.path.join(directory, path)
+
 def iter_source_files(file_sections):
     for kind in file_sections:
         if not kind in ["executables"]:
@@ -129,12 +221,49 @@ class BuildManifest(object):
 
     @classmethod
     def from_file(cls, filename):
+        """Load the given build manifest, in json or binary format (see
+        write_binary)."""
+        if is_binary_manifest(filename):
+            return cls.__from_binary(filename)
         fid = open(filename)
         try:
             return cls.__from_data(json.load(fid))
         finally:
             fid.close()
 
+    @classmethod
+    def __from_binary(cls, filename):
+        # Only the index is read here, the files being read with their
+        # sections
+        fid = open(filename, "rb")
+        try:
+            magic, version = _BINARY_HEADER.unpack(fid.read(_BINARY_HEADER.size))
+            if version != BINARY_MANIFEST_VERSION:
+                raise ValueError("Unsupported build manifest version %d in %r" % (version, filename))
+            fid.seek(-_BINARY_TRAILER.size, os.SEEK_END)
+            end = fid.tell()
+            offset, magic = _BINARY_TRAILER.unpack(fid.read(_BINARY_TRAILER.size))
+            if magic != _BINARY_MAGIC:
+                raise IOError("Truncated build manifest %r" % filename)
+            fid.seek(offset)
+            data = json.loads(fid.read(end - offset).decode("utf-8"))
+        finally:
+            fid.close()
+
+        file_sections = data["file_sections"]
+        data["file_sections"] = []
+        ret = cls.__from_data(data)
+        for section in file_sections:
+            category = section["category"]
+            name = section["name"]
+            if name in ret.file_sections.get(category, {}):
+                raise ValueError("section %s of type %s already exists !" % (name, category))
+            ret.file_sections.setdefault(category, {})[name] = \
+                    _LazyInstalledSection(category, name, section["source_dir"],
+                                          section["target_dir"], filename,
+                                          section["offset"], section["size"])
+        return ret
+
     @classmethod
     def __from_data(cls, data):
         meta_vars = fix_kw(data["meta"])
@@ -175,6 +304,9 @@ class BuildManifest(object):
 
         self._variables = {"pkgname": self.meta["name"],
                            "py_version_short": ".".join([str(i) for i in sys.version_info[:2]])}
+        # source root path (or None) -> SubstitutionContext of the path
+        # variables, reset when they are updated
+        self._subst_contexts = {}
 
     def write(self, filename):
         fid = open(filename, "w")
@@ -183,7 +315,31 @@ class BuildManifest(object):
         finally:
             fid.close()
 
+    def write_binary(self, filename):
+        """Write the manifest in binary format, whose sections may be loaded
+        on demand. The content is the same as the json format one."""
+        fid = open(filename, "wb")
+        try:
+            fid.write(_BINARY_HEADER.pack(_BINARY_MAGIC, BINARY_MANIFEST_VERSION))
+            data = self._to_json_dict()
+            for section in data["file_sections"]:
+                section["offset"] = fid.tell()
+                _write_binary_section(fid, section.pop("files"))
+                section["size"] = fid.tell() - section["offset"]
+            offset = fid.tell()
+            fid.write(json.dumps(data, separators=(',', ':')).encode("utf-8"))
+            fid.write(_BINARY_TRAILER.pack(offset, _BINARY_MAGIC))
+        finally:
+            fid.close()
+
     def _write(self, fid):
+        data = self._to_json_dict()
+        if "BENTOMAKER_PRETTY" in os.environ:
+            json.dump(data, fid, sort_keys=True, indent=4)
+        else:
+            json.dump(data, fid, separators=(',', ':'))
+
+    def _to_json_dict(self):
         def executable_to_json(executable):
             return {"name": executable.name,
                     "module": executable.module,
@@ -219,14 +375,12 @@ class BuildManifest(object):
                 for i in value.values():
                     file_sections.append(section_to_json(i))
         data["file_sections"] = file_sections
-        if "BENTOMAKER_PRETTY" in os.environ:
-            json.dump(data, fid, sort_keys=True, indent=4)
-        else:
-            json.dump(data, fid, separators=(',', ':'))
+        return data
 
     def update_paths(self, paths):
         for k, v in paths.items():
             self._path_variables[k] = v
+        self._subst_contexts = {}
 
     def iter_built_files(self, src_root_node, scheme=None):
         if scheme is None:
@@ -234,27 +388,101 @@ class BuildManifest(object):
         self.update_paths(scheme)
         return iter_files(self.resolve_paths(src_root_node))
 
+    def _subst_context(self, src_root_node=None):
+        if src_root_node is None:
+            key = None
+        else:
+            key = src_root_node.abspath()
+        try:
+            return self._subst_contexts[key]
+        except KeyError:
+            variables = copy.copy(self._path_variables)
+            variables.update(self._variables)
+            if key is not None:
+                variables['_srcrootdir'] = key
+            context = self._subst_contexts[key] = SubstitutionContext(variables)
+            return context
+
     def resolve_path(self, path):
-        variables = copy.copy(self._path_variables)
-        variables.update(self._variables)
-        return subst_vars(path, variables)
+        return self._subst_context().subst(path)
 
-    def resolve_paths_with_destdir(self, src_root_node):
+    def resolve_paths_with_destdir(self, src_root_node, categories=None):
         """Same as resolve_paths, but prefix every path with $destdir."""
-        return self._resolve_paths(src_root_node, use_destdir=True)
+        return self._resolve_paths(src_root_node, categories, use_destdir=True)
+
+    def resolve_paths(self, src_root_node, categories=None):
+        """Return the file sections as {category: {name: [(source node,
+        target node)]}}, restricted to the given categories if not None."""
+        return self._resolve_paths(src_root_node, categories, use_destdir=False)
 
-    def resolve_paths(self, src_root_node):
-        return self._resolve_paths(src_root_node, use_destdir=False)
+    def _resolve_paths(self, src_root_node, categories, use_destdir):
+        root = find_root(src_root_node)
+
+        node_sections = dict([(category, {}) for category in self.file_sections
+                              if categories is None or category in categories])
+        for category, name, srcdir, target, section in \
+                self._iter_sections(src_root_node, categories, use_destdir):
+            srcdir_node = root.find_node(srcdir)
+            if srcdir_node is None:
+                raise IOError("directory %r not found !" % (srcdir,))
+            target_node = root.make_node(target)
+            node_sections[category][name] = \
+                    [(srcdir_node.find_node(f), target_node.make_node(g))
+                     for f, g in section.files]
 
-    def _resolve_paths(self, src_root_node, use_destdir):
-        variables = copy.copy(self._path_variables)
-        variables.update(self._variables)
-        variables['_srcrootdir'] = src_root_node.abspath()
+        return node_sections
 
+    def iter_file_paths(self, src_root_node, categories=None, use_destdir=False):
+        """Yield the (category, source path, target path) of the installed
+        files, as iter_files does from resolve_paths (or
+        resolve_paths_with_destdir if use_destdir is True), but without
+        creating any node. With a binary manifest, only the sections of the
+        given categories are read."""
         root = find_root(src_root_node)
+        # target path -> source path
+        installed_files = {}
+        # directory -> normalized directory, as many sections usually share
+        # the same directories
+        normalized = {}
+
+        for category, name, srcdir, target, section in \
+                self._iter_sections(src_root_node, categories, use_destdir):
+            if not srcdir in normalized:
+                if not os.path.isdir(srcdir):
+                    raise IOError("directory %r not found !" % (srcdir,))
+                normalized[srcdir] = os.path.normpath(srcdir)
+            srcdir = normalized[srcdir]
+            if not target in normalized:
+                normalized[target] = os.path.normpath(target)
+            target = normalized[target]
+            for f, g in section.files:
+                source = _join_normalized(srcdir, f)
+                target_path = _join_normalized(target, g)
+                previous = installed_files.get(target_path, None)
+                if previous is None:
+                    installed_files[target_path] = source
+                elif same_content(source, previous):
+                    continue
+                else:
+                    # Same rules as iter_files, nodes are only needed here
+                    source_node = root.find_node(source)
+                    previous_node = root.find_node(previous)
+                    if source_node.is_bld() and previous_node.is_src():
+                        continue
+                    if not (source_node.is_src() and previous_node.is_bld()):
+                        raise IOError("Multiple source_path for same target_path %r ! %s and %s" % \
+                                      (target_path, source, previous))
+                yield category, source, target_path
+
+    def _iter_sections(self, src_root_node, categories, use_destdir):
+        # Yield (category, name, source directory, target directory, section)
+        # for each section, with every variable substituted
+        context = self._subst_context(src_root_node)
+        # target directory -> same prefixed with $destdir
+        prefixed = {}
 
         def _prefix_destdir(path):
-            destdir = subst_vars("$destdir", variables)
+            destdir = context.subst("$destdir")
             if path:
                 tail = explode_path(path)[1:]
                 if not tail:
@@ -265,22 +493,15 @@ class BuildManifest(object):
                 raise ValueError("Invalid target directory in section "
                                  "%r: %r" % (name, path))
 
-        node_sections = {}
         for category in self.file_sections:
-            node_sections[category] = {}
+            if categories is not None and not category in categories:
+                continue
             for name, section in self.file_sections[category].items():
-                srcdir = subst_vars(section.source_dir, variables)
-                target = subst_vars(section.target_dir, variables)
+                srcdir = context.subst(section.source_dir)
+                target = context.subst(section.target_dir)
 
                 if use_destdir:
-                    target = _prefix_destdir(target)
-
-                srcdir_node = root.find_node(srcdir)
-                if srcdir_node is None:
-                    raise IOError("directory %r not found !" % (srcdir,))
-                target_node = root.make_node(target)
-                node_sections[category][name] = \
-                        [(srcdir_node.find_node(f), target_node.make_node(g))
-                         for f, g in section.files]
-
-        return node_sections
+                    if not target in prefixed:
+                        prefixed[target] = _prefix_destdir(target)
+                    target = prefixed[target]
+                yield category, name, srcdir, target, section
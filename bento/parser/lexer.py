@@ -2,14 +2,14 @@ import re
 
 from ply.lex \
     import \
-        lex, LexToken
+        lex, Lexer
 
 from bento.errors \
     import \
         ParseError, InternalBentoError
 from bento.parser.utils \
     import \
-        Peeker, BackwardGenerator, count_lines
+        count_lines
 
 import six
 
@@ -106,6 +106,8 @@ states = [
 
 ESCAPING_CHAR = {"BACKSLASH": True}
 
+REFLAGS = re.UNICODE | re.MULTILINE
+
 def t_NEWLINE(t):
     r"(\n|\r\n)"
     t.lexer.lineno += len(t.value)
@@ -471,80 +473,6 @@ def t_insidescommalistfirstline_error(t):
 #--------
 # Filters
 #--------
-def detect_escaped(stream):
-    """Post process the given stream (token iterator) to generate escaped
-    character for characters preceded by the escaping token."""
-    for t in stream:
-        is_escaping_char = ESCAPING_CHAR.get(t.type, False)
-        if is_escaping_char:
-            try:
-                t = six.advance_iterator(stream)
-            except StopIteration:
-                raise SyntaxError("EOF while escaping token %r (line %d)" %
-                                  (t.value, t.lineno-1))
-            t.escaped = True
-        else:
-            t.escaped = False
-        yield t
-
-def merge_escaped(stream):
-    """Merge tokens whose escaped attribute is True together.
-
-    Must be run after detect_escaped.
-
-    Parameters
-    ----------
-    stream: iterator
-    """
-    stream = Peeker(stream, EOF)
-    queue = []
-
-    t = six.advance_iterator(stream)
-    while t:
-        if t.escaped:
-            queue.append(t)
-        else:
-            if t.type == "WORD":
-                if queue:
-                    queue.append(t)
-                    n = stream.peek()
-                    if not n.escaped:
-                        t.value = "".join([c.value for c in queue])
-                        yield t
-                        queue = []
-                else:
-                    n = stream.peek()
-                    if n.escaped:
-                        queue.append(t)
-                    else:
-                        yield t
-            else:
-                if queue:
-                    queue[-1].value = "".join([c.value for c in queue])
-                    queue[-1].type = "WORD"
-                    yield queue[-1]
-                    queue = []
-                yield t
-        try:
-            t = six.advance_iterator(stream)
-        except StopIteration:
-            if queue:
-                t.value = "".join([c.value for c in queue])
-                t.type = "WORD"
-                yield t
-            return
-
-def filter_ws_and_newline(stream):
-    """Remove NEWLINE and WS tokens from the stream.
-
-    Parameters
-    ----------
-    stream: iterator
-        iterator of tokens."""
-    for item in stream:
-        if item.type not in ["NEWLINE", "WS"]:
-            yield item
-
 def remove_lines_indent(s, indent=None):
     lines = s.splitlines()
     if len(lines) > 1:
@@ -559,130 +487,159 @@ def remove_lines_indent(s, indent=None):
     else:
         return s
 
-def post_process_string(it):
-    """Remove spurious spacing from *MULTILINE_STRING tokens."""
-    it = BackwardGenerator(it)
-    for token in it:
-        if token.type == "BLOCK_MULTILINES_STRING":
-            previous = it.previous()
-            if not previous.type == "INDENT":
-                raise InternalBentoError(
-                        "Error while post processing block line: %s -> %s" \
-                        % (previous, token))
-            else:
-                indent = previous.value
-                token.value = remove_lines_indent(token.value, indent)
-                token.type = "MULTILINES_STRING"
-        elif token.type == "MULTILINES_STRING":
-            token.value = remove_lines_indent(token.value)
-        yield token
-
-def indent_generator(toks):
-    """Post process the given stream of tokens to generate INDENT/DEDENT
-    tokens.
-    
-    Note
-    ----
-    Each generated token's value is the total amount of spaces from the
-    beginning of the line.
-    
-    The way indentation tokens are generated is similar to how it works in
-    python."""
+class Token(object):
+    """Token generated by the post processing stage (INDENT/DEDENT).
+
+    Same interface as ply LexToken."""
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer")
+
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __str__(self):
+        return "LexToken(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+
+    def __repr__(self):
+        return str(self)
+
+def post_process(next_token):
+    """Post process the raw tokens returned by next_token (a callable
+    returning None once the input is exhausted).
+
+    This is done in one pass:
+
+        - tokens preceded by the escaping token are merged with the
+          surrounding WORD tokens into a single WORD token
+        - INDENT/DEDENT tokens are generated from the leading WS of each
+          line. Each generated token's value is the total amount of spaces
+          from the beginning of the line, and the way they are generated is
+          similar to how it works in python.
+        - NEWLINE and WS tokens are removed
+        - spurious spacing is removed from *MULTILINES_STRING tokens
+    """
+    def read():
+        t = next_token()
+        if t is not None and ESCAPING_CHAR.get(t.type, False):
+            escaped = next_token()
+            if escaped is None:
+                raise SyntaxError("EOF while escaping token %r (line %d)" %
+                                  (t.value, t.lineno-1))
+            return escaped, True
+        return t, False
+
+    def merge(queue):
+        t = queue[-1]
+        t.value = "".join([c.value for c in queue])
+        t.type = "WORD"
+        return t
+
+    # Escaped tokens not merged yet
+    queue = []
+    # Token read ahead to know whether a WORD is followed by an escaped token
+    ahead = None
+    # Indentation levels, innermost first
     stack = [0]
+    at_line_start = True
+    previous = None
+    t = None
+
+    done = False
+    while not done:
+        if ahead is None:
+            raw, escaped = read()
+        else:
+            raw, escaped = ahead
+            ahead = None
 
-    # Dummy token to track the token just before the current one
-    former = LexToken()
-    former.type = "NEWLINE"
-    former.value = "dummy"
-    former.lineno = 0
-    former.lexpos = -1
-
-    def generate_dedent(stck, tok):
-        amount = stck.pop(0)
-        return new_dedent(amount, tok)
-
-    for token in toks:
-        if former.type == "NEWLINE":
-            if token.type == "WS":
-                indent = len(token.value)
+        if raw is None:
+            done = True
+            if queue:
+                merged = [merge(queue)]
+            else:
+                merged = []
+        elif escaped:
+            queue.append(raw)
+            continue
+        elif raw.type == "WORD":
+            ahead = read()
+            if queue or ahead[1]:
+                queue.append(raw)
+                if ahead[1]:
+                    continue
+                merged = [merge(queue)]
+                queue = []
             else:
-                indent = 0
+                merged = [raw]
+        elif queue:
+            merged = [merge(queue), raw]
+            queue = []
+        else:
+            merged = [raw]
 
-            if indent == stack[0]:
-                former = token
-                if indent > 0:
-                    token = six.advance_iterator(toks)
-                    former = token
-                    yield token
+        for t in merged:
+            if at_line_start:
+                if t.type == "WS":
+                    indent = len(t.value)
                 else:
-                    yield former
-            elif indent > stack[0]:
-                stack.insert(0, indent)
-                ind = new_indent(indent, token)
-                former = ind
-                yield ind
-            elif indent < stack[0]:
-                if not indent in stack:
-                    raise ValueError("Wrong indent at line %d" % token.lineno)
-                while stack[0] > indent:
-                    former = generate_dedent(stack, token)
-                    yield former
-                if stack[0] > 0:
-                    former = six.advance_iterator(toks)
-                    yield former
+                    indent = 0
+
+                if indent > stack[0]:
+                    stack.insert(0, indent)
+                    previous = Token("INDENT", indent, t.lineno, t.lexpos)
+                    at_line_start = False
+                    yield previous
+                    continue
+                elif indent < stack[0]:
+                    if not indent in stack:
+                        raise ValueError("Wrong indent at line %d" % t.lineno)
+                    while stack[0] > indent:
+                        previous = Token("DEDENT", stack.pop(0), t.lineno, t.lexpos)
+                        yield previous
+                if indent > 0:
+                    # Leading WS of an indented line: the next token is never
+                    # the first one of a line
+                    at_line_start = False
+                    continue
+
+            tp = t.type
+            at_line_start = tp == "NEWLINE"
+            if tp == "NEWLINE" or tp == "WS":
+                continue
+            elif tp == "BLOCK_MULTILINES_STRING":
+                if previous is None or not previous.type == "INDENT":
+                    raise InternalBentoError(
+                            "Error while post processing block line: %s -> %s" \
+                            % (previous, t))
                 else:
-                    former = token
-                    yield token
-        else:
-            former = token
-            yield token
+                    t.value = remove_lines_indent(t.value, previous.value)
+                    t.type = "MULTILINES_STRING"
+            elif tp == "MULTILINES_STRING":
+                t.value = remove_lines_indent(t.value)
+            previous = t
+            yield t
 
     # Generate additional DEDENT so that the number of INDENT/DEDENT always
     # match
     while len(stack) > 1:
-        former = generate_dedent(stack, token)
-        yield former
-
-def new_indent(amount, token):
-    tok = LexToken()
-    tok.type = "INDENT"
-    tok.value = amount
-    tok.lineno = token.lineno
-    tok.lexpos = token.lexpos
-    return tok
-
-def new_dedent(amount, token):
-    tok = LexToken()
-    tok.type = "DEDENT"
-    tok.value = amount
-    tok.lineno = token.lineno
-    tok.lexpos = token.lexpos
-    return tok
-
-class _Dummy(object):
-    def __init__(self):
-        self.type = "EOF"
-        self.escaped = False
-        self.value = None
-
-    def __repr__(self):
-        return "DummyToken(EOF)"
-
-EOF = _Dummy()
+        yield Token("DEDENT", stack.pop(0), t.lineno, t.lexpos)
 
 class BentoLexer(object):
-    def __init__(self, optimize=False):
-        self.lexer = lex(reflags=re.UNICODE|re.MULTILINE, debug=0, optimize=optimize, nowarn=0, lextab='lextab')
+    def __init__(self, optimize=False, lextab=None):
+        if lextab is None:
+            self.lexer = lex(reflags=REFLAGS, debug=0, optimize=optimize, nowarn=0, lextab='lextab')
+        else:
+            # Same as ply.lex.lex in optimize mode, without reflecting over
+            # this module
+            self.lexer = Lexer()
+            self.lexer.lexoptimize = 1
+            self.lexer.readtab(lextab, globals())
 
     def input(self, data):
         self.lexer.input(data)
-        stream = iter(self.lexer.token, None)
-        stream = detect_escaped(stream)
-        stream = merge_escaped(stream)
-        stream = indent_generator(stream)
-        stream = filter_ws_and_newline(stream)
-        stream = post_process_string(stream)
-        self.stream = stream
+        self.stream = post_process(self.lexer.token)
 
     def __iter__(self):
         return iter(self.token, None)
@@ -1,11 +1,5 @@
 import sys
 
-from six.moves import cPickle
-
-def __copy(d):
-    # Faster than deepcopy - ideally remove the need for deepcopy altogether
-    return cPickle.loads(cPickle.dumps(d, protocol=2))
-
 class Node(object):
     def __init__(self, tp, children=None, value=None):
         self.type = tp
@@ -55,6 +49,10 @@ def ast_walk(root, dispatcher, debug=False):
     
     If one node type does not have any function defined for it, it simply
     returns the node unchanged.
+
+    The given tree is never modified: each dispatcher function receives a new
+    node whose children are the already walked children, so the same tree
+    may be walked several times (e.g. with different user flags).
     
     Parameters
     ----------
@@ -63,21 +61,22 @@ def ast_walk(root, dispatcher, debug=False):
     dispatcher : Dispatcher
         defines the action for each node type.
     """
+    action_dict = dispatcher.action_dict
+
     def _walker(par):
         children = []
         for c in par.children:
-            children.append(_walker(c))
+            res = _walker(c)
+            if res is not None:
+                children.append(res)
 
-        par.children = [c for c in children if c is not None]
+        node = Node(par.type, children, par.value)
         try:
-            func = dispatcher.action_dict[par.type]
-            return func(par)
+            func = action_dict[node.type]
+            return func(node)
         except KeyError:
             if debug:
-                print("no action for type %s" % par.type)
-            return par
+                print("no action for type %s" % node.type)
+            return node
 
-    # FIXME: we need to copy the dict because the dispatcher modify the dict in
-    # place ATM, and we call this often. This is very expensive, and should be
-    # removed as it has a huge cost in starting time (~30 % in hot case)
-    return _walker(__copy(root))
+    return _walker(root)
@@ -3,8 +3,10 @@ import errno
 
 import os.path as op
 
+import ply.lex
 import ply.yacc
 
+import bento.parser.lexer
 import bento.parser.rules
 
 from bento._config \
@@ -20,6 +22,11 @@ from bento.parser.lexer \
     import \
         BentoLexer, tokens as _tokens
 
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
 # XXX: is there a less ugly way to do this ?
 __GLOBALS = globals()
 for k in dir(bento.parser.rules):
@@ -57,13 +64,105 @@ def _has_parser_changed(picklefile):
     except Exception:
         return True
 
+# Names of the modules generated by write_tables, inside the bento.parser
+# package
+_PARSETAB_MODULE = "_parsetab"
+_LEXTAB_MODULE = "_lextab"
+
+def _grammar_checksum():
+    """Checksum of the grammar sources, or None if the sources are not
+    available (e.g. bento is installed as a zip without .py files)."""
+    m = md5()
+    for mod in (bento.parser.lexer, bento.parser.rules, sys.modules[__name__]):
+        source = op.splitext(mod.__file__)[0] + ".py"
+        try:
+            fid = open(source, "rb")
+        except IOError:
+            return None
+        try:
+            m.update(fid.read())
+        finally:
+            fid.close()
+    return m.hexdigest()
+
+def write_tables(outputdir):
+    """Generate the lexer and LR parser tables as python modules in the given
+    directory.
+
+    Those modules are meant to be installed in the bento.parser package, so
+    that creating a parser does not need to reflect over the grammar.
+
+    Returns
+    -------
+    filenames: list
+        the generated files
+    """
+    checksum = _grammar_checksum()
+    # Use a tab module which cannot be imported so that ply does not reuse
+    # existing tables instead of writing them
+    ply.yacc.yacc(module=sys.modules[__name__], start="stmt_list",
+                  tabmodule="bento.parser._no_such_package." + _PARSETAB_MODULE,
+                  outputdir=outputdir, debug=0, write_tables=1)
+    lexer = ply.lex.lex(module=bento.parser.lexer, reflags=bento.parser.lexer.REFLAGS)
+    lexer.writetab(_LEXTAB_MODULE, outputdir)
+
+    filenames = []
+    for name in (_PARSETAB_MODULE, _LEXTAB_MODULE):
+        filename = op.join(outputdir, name + ".py")
+        fid = open(filename, "a")
+        try:
+            fid.write("_grammar_checksum = %r\n" % checksum)
+        finally:
+            fid.close()
+        filenames.append(filename)
+    return filenames
+
+def _load_tables():
+    """Return the (parsetab, lextab) modules generated by write_tables, or
+    None if they are not available or do not match the grammar."""
+    try:
+        parsetab = __import__("bento.parser." + _PARSETAB_MODULE, fromlist=[_PARSETAB_MODULE])
+        lextab = __import__("bento.parser." + _LEXTAB_MODULE, fromlist=[_LEXTAB_MODULE])
+    except ImportError:
+        return None
+
+    if parsetab._tabversion != ply.yacc.__tabversion__ or lextab._tabversion != ply.lex.__version__:
+        return None
+    if parsetab._grammar_checksum != lextab._grammar_checksum:
+        return None
+    checksum = _grammar_checksum()
+    if checksum is not None and checksum != parsetab._grammar_checksum:
+        return None
+    return parsetab, lextab
+
 class Parser(object):
     def __init__(self, lexer=None):
+        tables = _load_tables()
+        if tables is None:
+            self._lextab = None
+            self.parser = self._create_parser_from_grammar()
+        else:
+            parsetab, self._lextab = tables
+            self.parser = self._create_parser_from_tables(parsetab)
+
         if lexer is None:
-            self.lexer = BentoLexer(optimize=_OPTIMIZE_LEX)
+            self.lexer = self._create_lexer()
         else:
             self.lexer = lexer
 
+    def _create_lexer(self):
+        if self._lextab is None:
+            return BentoLexer(optimize=_OPTIMIZE_LEX)
+        else:
+            return BentoLexer(lextab=self._lextab)
+
+    def _create_parser_from_tables(self, parsetab):
+        lr = ply.yacc.LRTable()
+        lr.read_table(parsetab)
+        lr.bind_callables(globals())
+        return ply.yacc.LRParser(lr, p_error)
+
+    def _create_parser_from_grammar(self):
         picklefile = _PICKLED_PARSETAB
         if not op.exists(picklefile):
             try:
@@ -85,9 +184,9 @@ class Parser(object):
                         raise BentoError("Cannot write new updated grammar to file %r" % _PICKLED_PARSETAB)
                 else:
                     raise
-        self.parser = ply.yacc.yacc(start="stmt_list",
-                                picklefile=picklefile,
-                                debug=_DEBUG_YACC)
+        return ply.yacc.yacc(start="stmt_list",
+                             picklefile=picklefile,
+                             debug=_DEBUG_YACC)
 
     def parse(self, data):
         res = self.parser.parse(data, lexer=self.lexer)
@@ -98,7 +197,7 @@ class Parser(object):
 
     def reset(self):
         # XXX: implements reset for lexer
-        self.lexer = BentoLexer(optimize=_OPTIMIZE_LEX)
+        self.lexer = self._create_lexer()
         # XXX: ply parser.reset method expects those attributes to
         # exist
         self.parser.statestack = []
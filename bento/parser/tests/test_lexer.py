@@ -853,6 +853,12 @@ tool""")
         ref_str = "NAME_ID COLON WORD"
         self._test(data, split(ref_str))
 
+    def test_trailing_indented_whitespace(self):
+        data = "Library:\n    Packages: foo\n    "
+
+        ref_str = "LIBRARY_ID COLON INDENT PACKAGES_ID COLON WORD DEDENT"
+        self._test(data, split(ref_str))
+
 class TestComment(TestLexer):
     def setUp(self):
         self.lexer = BentoLexer()
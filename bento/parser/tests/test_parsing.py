@@ -1,9 +1,16 @@
 import os
+import sys
+import imp
+import shutil
 import tempfile
 import stat
 
 import os.path as op
 
+import mock
+
+from six.moves import StringIO
+
 from bento.compat.api.moves \
     import \
         unittest
@@ -27,6 +34,9 @@ from bento.errors \
         BentoError, ParseError
 
 from bento.parser import parser as parser_module
+from bento.parser.nodes \
+    import \
+        ast_pprint
 
 #old = sys.path[:]
 #try:
@@ -181,3 +191,58 @@ class TestParserCaching(unittest.TestCase):
                              "Ply created another cached parsetab file !")
         finally:
             parser_module._PICKLED_PARSETAB = old_parsetab
+
+class TestParserTables(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.modules = {}
+        for f in parser_module.write_tables(self.d):
+            name = "bento.parser." + op.splitext(op.basename(f))[0]
+            self.modules[name] = imp.load_source(name, f)
+        self.old_modules = dict((k, sys.modules.get(k)) for k in self.modules)
+
+    def tearDown(self):
+        for k, v in self.old_modules.items():
+            if v is None:
+                sys.modules.pop(k, None)
+            else:
+                sys.modules[k] = v
+        shutil.rmtree(self.d)
+
+    def test_generated_files(self):
+        self.assertEqual(sorted(os.listdir(self.d)), ["_lextab.py", "_parsetab.py"])
+
+    def test_parser_from_tables(self):
+        data = """\
+Name: foo
+Description: some
+    description
+
+Library:
+    if not flag(debug):
+        Packages: foo, foo.bar
+"""
+        ref = parser_module.Parser().parse(data)
+
+        sys.modules.update(self.modules)
+        with mock.patch("ply.yacc.ParserReflect") as reflect:
+            p = parser_module.Parser()
+            self.assertFalse(reflect.called)
+        self.assertTrue(p._lextab is not None)
+        # Check that the parser may be reused (the lexer is recreated from
+        # the tables)
+        for i in range(2):
+            p.reset()
+            res = p.parse(data)
+            self.assertEqual(_dump(res), _dump(ref))
+
+    def test_stale_tables(self):
+        self.modules["bento.parser._parsetab"]._grammar_checksum = "invalid"
+        sys.modules.update(self.modules)
+        p = parser_module.Parser()
+        self.assertTrue(p._lextab is None)
+
+def _dump(node):
+    s = StringIO()
+    ast_pprint(node, string=s)
+    return s.getvalue()
@@ -1,6 +1,8 @@
 import sys
 import warnings
 
+from six.moves import StringIO
+
 from bento.compat.api.moves \
     import \
         unittest
@@ -9,7 +11,7 @@ from bento.parser.parser \
         parse
 from bento.parser.nodes \
     import \
-        ast_walk
+        ast_walk, ast_pprint
 from bento.parser.visitor \
     import \
         Dispatcher
@@ -520,3 +522,37 @@ Executable: foo
                                            "function": "main",
                                            "name": "foo"}}
         self.assertEqual(parse_and_analyse(data), self.ref)
+
+class TestNoMutation(unittest.TestCase):
+    def test_walk_twice(self):
+        data = """\
+Name: foo
+Classifiers: foo, bar
+
+Flag: debug
+    Default: false
+
+Library:
+    if flag(debug):
+        Extension: _foo
+            Sources: foo_debug.c
+    else:
+        Extension: _foo
+            Sources: foo.c
+"""
+        def _dump(node):
+            s = StringIO()
+            ast_pprint(node, string=s)
+            return s.getvalue()
+
+        p = parse(data)
+        ref = _dump(p)
+
+        res = ast_walk(p, Dispatcher({"debug": "true"}))
+        self.assertEqual(res["libraries"]["default"]["extensions"]["_foo"]["sources"], ["foo_debug.c"])
+        res["classifiers"].append("fubar")
+        self.assertEqual(_dump(p), ref)
+
+        res = ast_walk(p, Dispatcher({"debug": "false"}))
+        self.assertEqual(res["libraries"]["default"]["extensions"]["_foo"]["sources"], ["foo.c"])
+        self.assertEqual(res["classifiers"], ["foo", "bar"])
@@ -8,6 +8,16 @@ from bento.parser.nodes \
 # XXX: fix the str vs bool issue with flag variables
 _LIT_BOOL = {"true": True, "false": False, True: True, False: False}
 
+def _copy_value(value):
+    # The Dispatcher never modifies the tree it walks, and its output should
+    # not share mutable values with it either: the same tree may be evaluated
+    # several times, and the results may be modified by the caller. Node
+    # values are strings or lists of strings, so a shallow copy is enough.
+    if isinstance(value, list):
+        return list(value)
+    else:
+        return value
+
 class Dispatcher(object):
     def __init__(self, user_values=None):
         self._d = {
@@ -89,7 +99,7 @@ class Dispatcher(object):
                           "platforms", "classifiers", "hook_files",
                           "config_py", "description_from_file",
                           "meta_template_files", "keywords", "use_backends"]:
-                self._d[c.type] = c.value
+                self._d[c.type] = _copy_value(c.value)
             elif c.type == "path":
                 self._d["path_options"].update({c.value["name"]: c.value})
             elif c.type == "flag":
@@ -196,10 +206,10 @@ class Dispatcher(object):
                 ret["name"] = c.value
             elif c.type == "sources":
                 _ensure_unique("sources")
-                ret["sources"] = c.value
+                ret["sources"] = _copy_value(c.value)
             elif c.type == "include_dirs":
                 _ensure_unique("include_dirs")
-                ret["include_dirs"] = c.value
+                ret["include_dirs"] = _copy_value(c.value)
             else:
                 raise ValueError("Gne ?")
         for c in [node.children[0]] + node.children[1]:
@@ -227,10 +237,10 @@ class Dispatcher(object):
                 ret["name"] = c.value
             elif c.type == "sources":
                 _ensure_unique("sources")
-                ret["sources"] = c.value
+                ret["sources"] = _copy_value(c.value)
             elif c.type == "include_dirs":
                 _ensure_unique("include_dirs")
-                ret["include_dirs"] = c.value
+                ret["include_dirs"] = _copy_value(c.value)
             else:
                 raise ValueError("Unknown node %s" % c)
         for c in [node.children[0]] + node.children[1]:
@@ -366,7 +376,7 @@ class Dispatcher(object):
         if "subento" in self._d:
             self._d["subento"].extend(node.value)
         else:
-            self._d["subento"] = node.value
+            self._d["subento"] = _copy_value(node.value)
 
     # Data handling
     def data_files(self, node):
@@ -383,7 +393,7 @@ class Dispatcher(object):
             elif c.type == "target_dir":
                 d["target_dir"] = c.value
             elif c.type == "files":
-                d["files"] = c.value
+                d["files"] = _copy_value(c.value)
             else:
                 raise ValueError("Unhandled node type: %s" % c)
 
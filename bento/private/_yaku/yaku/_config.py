@@ -18,4 +18,7 @@ HOOK_DUMP = ".hooks.pck"
 CONFIG_CACHE = ".config.pck"
 BUILD_CACHE = ".build.pck"
 
+# Default maximum number of results kept in a ConftestCache
+CONFTEST_CACHE_SIZE = 4096
+
 _OUTPUT = sys.stdout
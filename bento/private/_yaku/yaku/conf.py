@@ -1,6 +1,7 @@
 import os
 import sys
 import re
+import subprocess
 
 try:
     from hashlib import md5
@@ -16,12 +17,15 @@ else:
         import \
             StringIO
 
+from yaku._config \
+    import \
+        CONFTEST_CACHE_SIZE
 from yaku.errors \
     import \
         UnknownTask
 from yaku.utils \
     import \
-        ensure_dir
+        ensure_dir, find_program, is_string
 
 def create_file(conf, code, prefix="", suffix=""):
     filename = "%s%s%s" % (prefix, md5(code.encode()).hexdigest(), suffix)
@@ -73,6 +77,11 @@ def write_log(conf, log, tasks, code, succeed, explanation):
     log.write(s.getvalue())
     log.write("\n")
 
+def write_cached_log(conf, log, code, cache):
+    for line in code.splitlines():
+        log.write("  |%s\n" % line)
+    log.write("---> Succeeded ! (result from the conftest cache %s)\n\n" % cache.directory)
+
 def create_conf_blddir(conf, name, body):
     dirname = ".conf-%s-%s" % (name, hash(name+body))
     bld_root = os.path.join(conf.bld_root.abspath(), dirname)
@@ -81,3 +90,157 @@ def create_conf_blddir(conf, name, body):
     bld_root = conf.bld_root.make_node(dirname)
     old_root = conf.bld_root
     return old_root, bld_root
+
+# Changed when the key of the ConftestCache entries changes
+_CONFTEST_CACHE_VERSION = 1
+
+# Environment variables changing the headers and libraries found by
+# compilers and linkers
+_COMPILER_ENVIRON = ["CPATH", "C_INCLUDE_PATH", "CPLUS_INCLUDE_PATH",
+                     "LIBRARY_PATH", "GCC_EXEC_PREFIX", "COMPILER_PATH",
+                     "INCLUDE", "LIB", "LIBPATH", "SDKROOT",
+                     "MACOSX_DEPLOYMENT_TARGET"]
+
+# (path, size, mtime) -> identity, see program_identity
+_PROGRAM_IDENTITIES = {}
+
+def program_identity(program):
+    """Return a string identifying the given program: its full path and
+    the output of program --version, or None if it cannot be run."""
+    if os.path.isabs(program):
+        path = program
+    else:
+        path = find_program(program)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_size, st.st_mtime)
+    try:
+        return _PROGRAM_IDENTITIES[key]
+    except KeyError:
+        pass
+
+    try:
+        p = subprocess.Popen([path, "--version"], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = p.communicate()[0]
+    except OSError:
+        identity = None
+    else:
+        identity = "%s\n%s" % (path, output.decode("utf-8", "replace"))
+    _PROGRAM_IDENTITIES[key] = identity
+    return identity
+
+def _to_list(value):
+    if is_string(value):
+        return [value]
+    return list(value)
+
+class ConftestCache(object):
+    """Successful configuration tests shared between build directories, and
+    between projects.
+
+    A test is identified by its code, the programs its tasks run (see
+    program_identity), the values of the variables of their commands, and
+    the compiler-related environment variables. One empty file named after
+    that key is kept per successful test in directory; failed tests are not
+    kept, so that e.g. a header installed since the last run is found. At
+    most size results are kept, the least recently used ones are removed
+    first."""
+    def __init__(self, directory, size=CONFTEST_CACHE_SIZE):
+        if size < 1:
+            raise ValueError("Invalid cache size %r (should be >= 1)" % (size,))
+        self.directory = directory
+        self.size = size
+        self._modified = False
+
+    def key(self, conf, tasks, code):
+        """Return the key of the test of the given code run by tasks in the
+        conf test directory conf.bld_root (see with_conf_blddir), or None if
+        the test may not be shared."""
+        conf_dir = conf.bld_root
+        # the test directory only contains the test files, and its name
+        # depends on the process (hash randomization)
+        replacements = [(conf_dir.abspath(), "${CONFDIR}"), (conf_dir.srcpath(), "${CONFDIR}")]
+        build_dir = conf_dir.parent.abspath()
+
+        m = md5()
+        m.update(("%d\n%s\n" % (_CONFTEST_CACHE_VERSION, code)).encode("utf-8"))
+        for t in tasks:
+            # the first variable of a command is the program it runs
+            program = _to_list(t.env.get(t.env_vars[0], []))
+            if not program:
+                return None
+            identity = program_identity(program[0])
+            if identity is None:
+                return None
+            m.update(("%s\n%s\n" % (t.__class__.__name__, identity)).encode("utf-8"))
+            for var in t.env_vars:
+                values = []
+                for value in _to_list(t.env.get(var, [])):
+                    if is_string(value):
+                        for old, new in replacements:
+                            value = value.replace(old, new)
+                        if build_dir in value:
+                            # result depends on files built by the project
+                            return None
+                    values.append(value)
+                m.update(("%s=%r\n" % (var, values)).encode("utf-8"))
+
+        # relative paths are relative to the project
+        for var in ["CPPPATH", "LIBDIR"]:
+            for path in _to_list(conf.env.get(var, [])):
+                if not os.path.isabs(path):
+                    m.update(("%s\n" % conf.src_root.abspath()).encode("utf-8"))
+                    break
+        for var in _COMPILER_ENVIRON:
+            m.update(("%s=%r\n" % (var, os.environ.get(var))).encode("utf-8"))
+        return m.hexdigest()
+
+    def get(self, key):
+        """Return True if the test of the given key succeeded before."""
+        try:
+            # mark the result as recently used
+            os.utime(os.path.join(self.directory, key), None)
+            return True
+        except OSError:
+            return False
+
+    def set(self, key):
+        """Record the test of the given key as successful."""
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            open(os.path.join(self.directory, key), "wb").close()
+            self._modified = True
+        except (OSError, IOError):
+            # the cache is only an optimization
+            pass
+
+    def prune(self):
+        """Remove the least recently used results above the cache size."""
+        if not self._modified:
+            return
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        if len(names) <= self.size:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        entries.sort()
+        for mtime, path in entries[:len(entries) - self.size]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._modified = False
@@ -74,6 +74,9 @@ class ConfigureContext(object):
         self._configured = {}
         self._stdout_cache = {}
         self._cmd_cache = {}
+        # results shared with other build directories, see
+        # yaku.conf.ConftestCache
+        self.conftest_cache = None
 
         self.src_root = None
         self.bld_root = None
@@ -126,6 +129,9 @@ class ConfigureContext(object):
                    "files": _hook_id_to_hook_path(yaku.task_manager.FILES_REGISTRY)})
         hook_dump.write(s, flags="wb")
 
+        if self.conftest_cache is not None:
+            self.conftest_cache.prune()
+
     def start_message(self, msg):
         _OUTPUT.write(msg + "... ")
         self.log.write("=" * 79 + "\n")
@@ -180,6 +186,12 @@ class BuildContext(object):
         self.cache = {}
         self.builders = {}
         self.tasks = []
+        # content hash -> includes, see yaku.scanner
+        self.scan_cache = {}
+        self.scan_cache_used = set()
+        # file path -> (size, mtime, md5, racy), see yaku.task.node_signature
+        self.node_sigs = {}
+        self.node_sigs_used = set()
 
     def load(self, src_path=None, build_path="build"):
         if src_path is None:
@@ -217,6 +229,12 @@ class BuildContext(object):
             fid = open(build_cache.abspath(), "rb")
             try:
                 self.cache = load(fid)
+                try:
+                    self.scan_cache = load(fid)
+                    self.node_sigs = load(fid)
+                except EOFError:
+                    # build cache from an older yaku
+                    pass
             finally:
                 fid.close()
         else:
@@ -233,9 +251,17 @@ class BuildContext(object):
 
     def store(self):
         build_cache = self.bld_root.make_node(BUILD_CACHE)
+        # Only keep the scan results of files seen during this build, so that
+        # the cache does not grow with every edit
+        scan_cache = dict([(k, v) for k, v in self.scan_cache.items() \
+                           if k in self.scan_cache_used])
+        node_sigs = dict([(k, v) for k, v in self.node_sigs.items() \
+                          if k in self.node_sigs_used and not v[3]])
         tmp_fid = open(build_cache.abspath() + ".tmp", "wb")
         try:
             dump(self.cache, tmp_fid)
+            dump(scan_cache, tmp_fid)
+            dump(node_sigs, tmp_fid)
         finally:
             tmp_fid.close()
         rename(build_cache.abspath() + ".tmp", build_cache.abspath())
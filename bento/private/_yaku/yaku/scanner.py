@@ -0,0 +1,131 @@
+"""Header dependencies scanner for C/C++ tasks.
+
+Includes are found with a simple regex-based parser (comments and line
+continuations are handled, but not conditional compilation nor macro
+includes), and resolved against the task generator include directories.
+Only headers inside the source or build tree are tracked: system headers
+are assumed not to change.
+
+The includes found in a file only depend on its content, so they are cached
+by content hash (see yaku.task.node_signature) in the context scan_cache,
+stored in the build cache.
+"""
+import os
+import sys
+import re
+import threading
+
+from yaku.utils \
+    import \
+        re_inc, re_nl, re_cpp, repl, extract_include
+from yaku.task \
+    import \
+        node_signature
+
+# Node lookups create nodes optimistically, which is not safe when tasks are
+# scanned from several worker threads
+_NODES_LOCK = threading.Lock()
+
+if sys.version_info[0] < 3:
+    def _to_str(data):
+        return data
+else:
+    def _to_str(data):
+        return data.decode("latin-1")
+
+def parse_includes(code):
+    """Return the list of (kind, name) included in the given C code, where
+    kind is '<' or '"'."""
+    code = re_nl.sub('', code)
+    code = re_cpp.sub(repl, code)
+    ret = []
+    for m in re.finditer(re_inc, code):
+        kind, name = extract_include(m.group(3), None)
+        if kind is not None:
+            ret.append((kind, name))
+    return ret
+
+def node_includes(ctx, node):
+    """Return the includes of the given node, using the content hash cache of
+    the context if any."""
+    cache = getattr(ctx, "scan_cache", None)
+    if cache is None:
+        return parse_includes(_to_str(node.read(flags="rb")))
+
+    key = node_signature(ctx, node)
+    try:
+        includes = cache[key]
+    except KeyError:
+        includes = cache[key] = parse_includes(_to_str(node.read(flags="rb")))
+    ctx.scan_cache_used.add(key)
+    return includes
+
+def include_dirs(srcnode, sources, cpppaths):
+    """Return the include directories nodes to scan sources with.
+
+    The directory of each source comes first, then the given cpppaths
+    (relative to srcnode). Directories outside the source and build trees are
+    ignored."""
+    root = srcnode
+    while root.parent:
+        root = root.parent
+
+    nodes = []
+    _NODES_LOCK.acquire()
+    try:
+        for s in sources:
+            if not s.parent in nodes:
+                nodes.append(s.parent)
+        for p in cpppaths:
+            if os.path.isabs(p):
+                node = root.find_node(p)
+                if node is None or not (node.is_src() or node.is_bld()):
+                    continue
+            else:
+                node = srcnode.find_node(p)
+            if node is not None and os.path.isdir(node.abspath()) and not node in nodes:
+                nodes.append(node)
+    finally:
+        _NODES_LOCK.release()
+    return nodes
+
+def scan_deps(ctx, node, incdirs):
+    """Return the list of header nodes node depends on, recursively.
+
+    Parameters
+    ----------
+    ctx: object
+        context (configure or build)
+    node: Node
+        source node to scan
+    incdirs: list
+        include directories nodes, as returned by include_dirs
+    """
+    deps = []
+    seen = set([node])
+
+    def _resolve(kind, name, parent):
+        if kind == '"':
+            candidates = [parent] + incdirs
+        else:
+            candidates = incdirs
+        _NODES_LOCK.acquire()
+        try:
+            for d in candidates:
+                found = d.find_node(name)
+                if found is not None and os.path.isfile(found.abspath()):
+                    return found
+        finally:
+            _NODES_LOCK.release()
+        return None
+
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        for kind, name in node_includes(ctx, cur):
+            found = _resolve(kind, name, cur.parent)
+            if found is not None and not found in seen:
+                seen.add(found)
+                deps.append(found)
+                stack.append(found)
+    return deps
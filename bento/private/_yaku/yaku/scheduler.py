@@ -6,9 +6,12 @@ else:
     import queue
 import threading
 
+from collections \
+    import \
+        deque
 from yaku.task_manager \
     import \
-        run_task, order_tasks, TaskManager
+        run_task, order_tasks, TaskManager, task_dependencies
 from yaku.utils \
     import \
         get_exception
@@ -25,8 +28,7 @@ def run_tasks(ctx, tasks=None):
 def run_tasks_parallel(ctx, tasks=None, maxjobs=1):
     if tasks is None:
         tasks = ctx.tasks
-    task_manager = TaskManager(tasks)
-    r = ParallelRunner(ctx, task_manager, maxjobs)
+    r = ParallelRunner(ctx, tasks, maxjobs)
     r.start()
     r.run()
 
@@ -47,43 +49,39 @@ class SerialRunner(object):
             grp = self.task_manager.next_set()
 
 class ParallelRunner(object):
-    def __init__(self, ctx, task_manager, maxjobs=1):
+    """Run tasks on maxjobs worker threads.
+
+    Each task is started as soon as the tasks it depends on (see
+    yaku.task_manager.task_dependencies) are done, independently of any other
+    task. After the first failure, no new task is started, and the failure is
+    raised once the running tasks are done."""
+    def __init__(self, ctx, tasks, maxjobs=1):
+        if isinstance(tasks, TaskManager):
+            tasks = tasks.tasks
         self.njobs = maxjobs
-        self.task_manager = task_manager
+        self.tasks = tasks
         self.ctx = ctx
 
         self.worker_queue = queue.Queue()
-        self.error_out = queue.Queue()
-        self.failure_lock = threading.Lock()
-        self.stop = False
+        self.done_queue = queue.Queue()
 
     def start(self):
         def _worker():
-            # XXX: this whole thing is an hack - find a better way to
-            # notify task execution failure to all worker threads
-            while not self.stop:
+            while True:
                 task = self.worker_queue.get()
+                if task is None:
+                    break
+                error = None
                 try:
                     run_task(self.ctx, task)
                 except yaku.errors.TaskRunFailure:
                     e = get_exception()
-                    self.failure_lock.acquire()
-                    self.stop = True
-                    self.failure_lock.release()
-                    task.error_msg = e.explain
-                    task.error_cmd = e.cmd
-                    self.error_out.put(task)
+                    error = (e.cmd, e.explain)
                 except Exception:
-                    e = get_exception()
                     exc_type, exc_value, tb = sys.exc_info()
                     lines = traceback.format_exception(exc_type, exc_value, tb)
-                    self.failure_lock.acquire()
-                    self.stop = True
-                    self.failure_lock.release()
-                    task.error_msg = "".join(lines)
-                    task.error_cmd = []
-                    self.error_out.put(task)
-                self.worker_queue.task_done()
+                    error = ([], "".join(lines))
+                self.done_queue.put((task, error))
 
         for i in range(self.njobs):
             t = threading.Thread(target=_worker)
@@ -91,21 +89,46 @@ class ParallelRunner(object):
             t.start()
 
     def run(self):
-        grp = self.task_manager.next_set()
-        while grp:
-            for task in grp:
-                self.worker_queue.put(task)
-            # XXX: we only join once we detect the worker queue to be empty, to
-            # avoid blocking for a long time. This is naive, and will break if
-            # the worker_queue is filled after this point
-            while not self.stop:
-                if self.worker_queue.empty():
-                    self.worker_queue.join()
+        dependencies = task_dependencies(self.tasks)
+        # task -> number of dependencies not done yet
+        pending = {}
+        # task -> tasks depending on it
+        dependents = {}
+        ready = deque()
+        for task in self.tasks:
+            pending[task] = len(dependencies[task])
+            for dep in dependencies[task]:
+                dependents.setdefault(dep, []).append(task)
+            if pending[task] == 0:
+                ready.append(task)
+
+        running = 0
+        failure = None
+        try:
+            while True:
+                while ready and failure is None:
+                    self.worker_queue.put(ready.popleft())
+                    running += 1
+                if running == 0:
                     break
-            if not self.error_out.empty():
-                task = self.error_out.get()
-                msg = task.error_msg
-                cmd = task.error_cmd
-                raise yaku.errors.TaskRunFailure(cmd, msg)
 
-            grp = self.task_manager.next_set()
+                task, error = self.done_queue.get()
+                running -= 1
+                del pending[task]
+                if error is not None:
+                    if failure is None:
+                        failure = error
+                    continue
+                for dependent in dependents.get(task, []):
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        ready.append(dependent)
+        finally:
+            for i in range(self.njobs):
+                self.worker_queue.put(None)
+
+        if failure is not None:
+            cmd, msg = failure
+            raise yaku.errors.TaskRunFailure(cmd, msg)
+        if pending:
+            raise Exception("circular order constraint detected %r" % list(pending.keys()))
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 try:
     from hashlib import md5
 except ImportError:
@@ -41,13 +42,45 @@ def task_factory(name):
     try:
         klass = _CLASSES[name]
     except KeyError:
-        klass = _TaskFakeMetaclass('%sTask' % name, (_Task,), {})
+        # each task class needs its own precedence lists
+        klass = _TaskFakeMetaclass('%sTask' % name, (_Task,), {"before": [], "after": []})
         klass.name = name
         _CLASSES[name] = klass
     return klass
 
 base = _TaskFakeMetaclass('__task_base', (object,), {})
 
+# Files modified less than this many seconds before being hashed may be
+# modified again without their (size, mtime) changing: their signature is
+# not kept across builds
+RACY_DELAY = 2
+
+def node_signature(ctx, node):
+    """Return the md5 digest of the node content.
+
+    If ctx has a node signature cache (see BuildContext.node_sigs), the digest
+    is only computed again when the (size, mtime) of the file changed, so that
+    each file is read at most once whatever the number of tasks using it."""
+    sigs = getattr(ctx, "node_sigs", None)
+    if sigs is None:
+        return md5(node.read(flags="rb")).digest()
+
+    path = node.abspath()
+    st = os.stat(path)
+    mtime = getattr(st, "st_mtime_ns", None)
+    if mtime is None:
+        mtime = int(st.st_mtime * 1e9)
+
+    entry = sigs.get(path, None)
+    if entry is not None and entry[0] == st.st_size and entry[1] == mtime:
+        sig = entry[2]
+    else:
+        sig = md5(node.read(flags="rb")).digest()
+        racy = mtime >= (time.time() - RACY_DELAY) * 1e9
+        sigs[path] = (st.st_size, mtime, sig, racy)
+    ctx.node_sigs_used.add(path)
+    return sig
+
 class _Task(object):
     before = []
     after = []
@@ -96,6 +129,10 @@ class _Task(object):
     def _signature(self):
         m = md5()
 
+        if self.scan is not None:
+            for dep in self.scan():
+                if not dep in self.deps:
+                    self.deps.append(dep)
         self._sig_explicit_deps(m)
         for k in self.env_vars:
             m.update(dumps(self.env[k]))
@@ -104,10 +141,9 @@ class _Task(object):
         return m.digest()
 
     def _sig_explicit_deps(self, m):
+        ctx = getattr(getattr(self, "gen", None), "bld", None)
         for s in self.inputs + self.deps:
-            #if os.path.exists(s):
-            #    m.update(open(s).read())
-            m.update(s.read(flags="rb"))
+            m.update(node_signature(ctx, s))
         return m.digest()
         
     # execution
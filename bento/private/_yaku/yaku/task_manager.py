@@ -38,19 +38,31 @@ def set_file_hook(ctx, source, hook):
 class NoHookException(Exception):
     pass
 
+def _exts(nodes):
+    return [os.path.splitext(s.name)[1] for s in nodes]
+
 def hash_task(t):
     # FIXME: ext_in and ext_out should not be computed from the files
-    ext_in = [os.path.splitext(s.name)[1] for s in t.inputs]
-    ext_out = [os.path.splitext(s.name)[1] for s in t.outputs]
-    tup = tuple(ext_in + ext_out + t.before + t.after)
+    tup = tuple(_exts(t.inputs) + _exts(t.outputs) + t.before + t.after)
     return hash((t.__class__.__name__, tup))
 
 class TaskManager(object):
+    """Split tasks in groups of tasks with the same class and input/output
+    extensions, and return the groups in dependency order with next_set.
+
+    A group depends on another one if the class of the latter is in its
+    before list, or if it consumes an extension produced by the latter. The
+    groups are indexed by class name and output extension, so that only
+    related groups are compared, and next_set keeps a count of the
+    dependencies left for each group."""
     def __init__(self, tasks):
         self.tasks = tasks
 
         self.groups = {}
         self.order = {}
+        # key -> (class name, input extensions, output extensions) of the
+        # group
+        self._group_info = {}
         self.make_groups()
         self.make_order()
 
@@ -59,83 +71,116 @@ class TaskManager(object):
             self.order[a] = set()
         self.order[a].add(b)
 
+    def _related_pairs(self, keys):
+        # Return the (i, j), i < j, indexes in keys of the groups which may
+        # need to be ordered, i.e. when one group class is in the other group
+        # before list, or when one group consumes an extension the other one
+        # produces.
+        by_class = {}
+        by_ext_out = {}
+        for i, key in enumerate(keys):
+            name, ext_in, ext_out = self._group_info[key]
+            by_class.setdefault(name, []).append(i)
+            for ext in ext_out:
+                by_ext_out.setdefault(ext, []).append(i)
+
+        pairs = set()
+        for i, key in enumerate(keys):
+            name, ext_in, ext_out = self._group_info[key]
+            t = self.groups[key][0]
+            related = []
+            for klass_name in t.before:
+                related.extend(by_class.get(klass_name, []))
+            for ext in ext_in:
+                related.extend(by_ext_out.get(ext, []))
+            for j in related:
+                if i < j:
+                    pairs.add((i, j))
+                elif j < i:
+                    pairs.add((j, i))
+        return sorted(pairs)
+
     def make_order(self):
         keys = list(self.groups.keys())
-        max = len(keys)
-        for i in range(max):
+        for i, j in self._related_pairs(keys):
             t1 = self.groups[keys[i]][0]
-            for j in range(i + 1, max):
-                t2 = self.groups[keys[j]][0]
+            t2 = self.groups[keys[j]][0]
 
-                if t2.__class__.__name__ in t1.before:
-                    self.set_order(keys[j], keys[i])
-                elif t1.__class__.__name__ in t2.before:
+            if t2.__class__.__name__ in t1.before:
+                self.set_order(keys[j], keys[i])
+            elif t1.__class__.__name__ in t2.before:
+                self.set_order(keys[i], keys[j])
+            else:
+                # add the constraints based on the comparisons
+                val = self._compare_groups(keys[i], keys[j])
+                if val > 0:
                     self.set_order(keys[i], keys[j])
-                else:
-                    # add the constraints based on the comparisons
-                    val = self.compare_exts(t1, t2)
-                    if val > 0:
-                        self.set_order(keys[i], keys[j])
-                    elif val < 0:
-                        self.set_order(keys[j], keys[i])
+                elif val < 0:
+                    self.set_order(keys[j], keys[i])
+
+        self._missing = dict([(k, 0) for k in keys])
+        for successors in self.order.values():
+            for k in successors:
+                self._missing[k] += 1
+        self._position = dict([(k, i) for i, k in enumerate(keys)])
+        self._ready = [k for k in keys if self._missing[k] == 0]
 
     def make_groups(self):
         # XXX: we assume tasks with same input/output suffix can run
         # in // (naive emulation of csr-like scheduler in waf)
         groups = self.groups
         for t in self.tasks:
-            h = hash_task(t)
+            ext_in = _exts(t.inputs)
+            ext_out = _exts(t.outputs)
+            name = t.__class__.__name__
+            h = hash((name, tuple(ext_in + ext_out + t.before + t.after)))
             if h in groups:
                 groups[h].append(t)
             else:
                 groups[h] = [t]
+                self._group_info[h] = (name, ext_in, ext_out)
 
     def next_set(self):
-        keys = self.groups.keys()
-
-        unconnected = []
-        remainder = []
-
-        for u in keys:
-            for k in self.order.values():
-                if u in k:
-                    remainder.append(u)
-                    break
-            else:
-                unconnected.append(u)
+        ready = sorted(self._ready, key=lambda k: self._position[k])
+        self._ready = []
 
         toreturn = []
-        for y in unconnected:
+        for y in ready:
             toreturn.extend(self.groups[y])
 
         # remove stuff only after
-        for y in unconnected:
-                try:
-                    self.order.__delitem__(y)
-                except KeyError:
-                    pass
-                self.groups.__delitem__(y)
+        for y in ready:
+            for k in self.order.pop(y, ()):
+                self._missing[k] -= 1
+                if self._missing[k] == 0:
+                    self._ready.append(k)
+            del self.groups[y]
 
-        if not toreturn and remainder:
-            raise Exception("circular order constraint detected %r" % remainder)
+        if not toreturn and self.groups:
+            raise Exception("circular order constraint detected %r" % list(self.groups.keys()))
 
         return toreturn
 
+    def _compare_groups(self, k1, k2):
+        in_, out_ = self._group_info[k1][1], self._group_info[k2][2]
+        for k in in_:
+            if k in out_:
+                return -1
+        in_, out_ = self._group_info[k2][1], self._group_info[k1][2]
+        for k in in_:
+            if k in out_:
+                return 1
+        return 0
 
     def compare_exts(self, t1, t2):
         "extension production"
-        def _get_in(t):
-            return [os.path.splitext(s.name)[1] for s in t.inputs]
-        def _get_out(t):
-            return [os.path.splitext(s.name)[1] for s in t.outputs]
-
-        in_ = _get_in(t1)
-        out_ = _get_out(t2)
+        in_ = _exts(t1.inputs)
+        out_ = _exts(t2.outputs)
         for k in in_:
             if k in out_:
                 return -1
-        in_ = _get_in(t2)
-        out_ = _get_out(t1)
+        in_ = _exts(t2.inputs)
+        out_ = _exts(t1.outputs)
         for k in in_:
             if k in out_:
                 return 1
@@ -177,6 +222,36 @@ def build_dag(tasks):
             output_to_tuid[o] = t.get_uid()
     return task_deps, output_to_tuid
 
+def task_dependencies(tasks):
+    """Return a dict task -> list of the tasks which must be done before it:
+    the tasks producing its inputs or dependencies, and the tasks whose class
+    is in its before list."""
+    task_deps, output_to_tuid = build_dag(tasks)
+    tuid_to_task = dict([(t.get_uid(), t) for t in tasks])
+
+    tasks_by_class = {}
+    for t in tasks:
+        tasks_by_class.setdefault(t.__class__.__name__, []).append(t)
+
+    ret = {}
+    for t in tasks:
+        producers = []
+        for n in t.inputs + t.deps:
+            tuid = output_to_tuid.get(n, None)
+            if tuid is not None:
+                producers.append(tuid_to_task[tuid])
+        for klass_name in t.before:
+            if klass_name != t.__class__.__name__:
+                producers.extend(tasks_by_class.get(klass_name, []))
+
+        seen = set([t])
+        ret[t] = []
+        for p in producers:
+            if not p in seen:
+                seen.add(p)
+                ret[t].append(p)
+    return ret
+
 def topo_sort(task_deps):
     # Topological sort (depth-first search)
     # XXX: cycle detection is missing
@@ -217,6 +292,8 @@ class TaskGen(object):
         self.name = name
         self.sources = sources
         self.target = target
+        # include directories nodes used to scan sources for headers
+        self.scan_dirs = []
 
         self.env = Environment()
 
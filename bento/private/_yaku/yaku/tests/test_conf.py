@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import shutil
+
+import yaku.tools
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        get_cfg
+from yaku.conf \
+    import \
+        ConftestCache
+from yaku.conftests \
+    import \
+        check_header
+from yaku.utils \
+    import \
+        find_program
+
+class ConftestCacheTest(TmpContextBase):
+    def setUp(self):
+        super(ConftestCacheTest, self).setUp()
+        self.directory = os.path.join(self.d, "cache")
+
+    def test_simple(self):
+        cache = ConftestCache(self.directory)
+        self.assertFalse(cache.get("foo"))
+        cache.set("foo")
+        self.assertTrue(cache.get("foo"))
+        self.assertTrue(ConftestCache(self.directory).get("foo"))
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, lambda: ConftestCache(self.directory, 0))
+
+    def test_prune(self):
+        cache = ConftestCache(self.directory, 2)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.set(key)
+            t = time.time() - 100 + i
+            os.utime(os.path.join(self.directory, key), (t, t))
+        # a is used last, b is the least recently used
+        self.assertTrue(cache.get("a"))
+        cache.prune()
+        self.assertEqual(sorted(os.listdir(self.directory)), ["a", "c"])
+
+class ConftestCacheCheckTest(TmpContextBase):
+    def setUp(self):
+        super(ConftestCacheCheckTest, self).setUp()
+        self.directory = os.path.join(self.d, "cache")
+
+    def _configure(self):
+        ctx = get_cfg()
+        ctx.conftest_cache = ConftestCache(self.directory)
+        ctx.use_tools(["ctasks"])
+        ret = check_header(ctx, "stdio.h"), check_header(ctx, "yaku_nonexistent_header.h")
+        ctx.store()
+        return ret
+
+    def _run_count(self, func):
+        # Return the result of func, and the number of times it ran tasks
+        count = []
+        old = yaku.tools.run_tasks
+        def _run_tasks(ctx, tasks):
+            count.append(tasks)
+            return old(ctx, tasks)
+        yaku.tools.run_tasks = _run_tasks
+        try:
+            return func(), len(count)
+        finally:
+            yaku.tools.run_tasks = old
+
+    def test_fresh_build_directory(self):
+        # unittest.skipIf is not available on python 2.6
+        if sys.platform == "win32" or find_program("gcc") is None:
+            return
+        ret, count = self._run_count(self._configure)
+        self.assertEqual(ret, (True, False))
+        shutil.rmtree("build")
+
+        ret, cached_count = self._run_count(self._configure)
+        self.assertEqual(ret, (True, False))
+        # the failed check is never cached
+        self.assertTrue(0 < cached_count < count)
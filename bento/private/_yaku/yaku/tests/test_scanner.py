@@ -0,0 +1,88 @@
+import os
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        create_top_nodes, BuildContext
+from yaku.task \
+    import \
+        task_factory
+import yaku.scanner
+
+from yaku.scanner \
+    import \
+        parse_includes, include_dirs, scan_deps
+
+class ParseIncludesTest(TmpContextBase):
+    def test_simple(self):
+        code = """\
+#include <stdio.h>
+  #  include "foo.h"
+/* #include "commented.h" */
+// #include "commented2.h"
+#include FOO_H
+"""
+        self.assertEqual(parse_includes(code), [("<", "stdio.h"), ('"', "foo.h")])
+
+class ScanDepsTest(TmpContextBase):
+    def setUp(self):
+        super(ScanDepsTest, self).setUp()
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+        self.ctx = BuildContext()
+        self.ctx.src_root = self.src_root
+        self.ctx.bld_root = self.bld_root
+
+        for d in ["src", "include"]:
+            os.makedirs(os.path.join(self.d, d))
+        self._write("src/foo.c", '#include <stdio.h>\n#include "foo.h"\n#include "bar.h"\n')
+        self._write("src/foo.h", '#include "missing.h"\n')
+        self._write("include/bar.h", '#include <foo.h>\n#include "baz.h"\n')
+        self._write("include/baz.h", '#include "bar.h"\n')
+
+        self.source = self.src_root.find_node("src/foo.c")
+        self.incdirs = include_dirs(self.src_root, [self.source], ["include", "/usr/include"])
+
+    def _write(self, filename, content):
+        f = open(os.path.join(self.d, filename), "w")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+
+    def test_include_dirs(self):
+        self.assertEqual(self.incdirs, [self.src_root.find_node("src"),
+                                        self.src_root.find_node("include")])
+
+    def test_scan_deps(self):
+        deps = scan_deps(self.ctx, self.source, self.incdirs)
+        self.assertEqual(sorted([d.srcpath() for d in deps]),
+                         [os.path.join("include", "bar.h"), os.path.join("include", "baz.h"),
+                          os.path.join("src", "foo.h")])
+
+    def test_cache(self):
+        scan_deps(self.ctx, self.source, self.incdirs)
+        self.assertEqual(len(self.ctx.scan_cache), 4)
+
+        old = yaku.scanner.parse_includes
+        def _parse_includes(code):
+            raise AssertionError("Unexpected parsing of %r" % code)
+        yaku.scanner.parse_includes = _parse_includes
+        try:
+            scan_deps(self.ctx, self.source, self.incdirs)
+        finally:
+            yaku.scanner.parse_includes = old
+
+    def test_signature(self):
+        def _task():
+            task = task_factory("cc")(inputs=[self.source], outputs=[], env={})
+            task.env_vars = []
+            task.scan = lambda: scan_deps(self.ctx, self.source, self.incdirs)
+            return task
+
+        sig = _task().signature()
+        self.assertEqual(_task().signature(), sig)
+
+        self._write("include/baz.h", '#include "bar.h"\n#define BAZ\n')
+        self.assertNotEqual(_task().signature(), sig)
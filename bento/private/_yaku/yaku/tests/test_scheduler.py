@@ -0,0 +1,112 @@
+import os
+import threading
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        create_top_nodes
+from yaku.task \
+    import \
+        task_factory
+from yaku.scheduler \
+    import \
+        ParallelRunner
+from yaku.errors \
+    import \
+        TaskRunFailure
+
+class _FakeContext(object):
+    def __init__(self):
+        self.cache = {}
+
+def _concat(task):
+    task.outputs[0].write("".join([i.read() for i in task.inputs]))
+
+class ParallelRunnerTest(TmpContextBase):
+    def setUp(self):
+        super(ParallelRunnerTest, self).setUp()
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+        self.ctx = _FakeContext()
+
+    def _source(self, name, content=""):
+        node = self.src_root.make_node(name)
+        node.write(content)
+        return node
+
+    def _task(self, name, inputs, output, func=_concat):
+        task = task_factory(name)(inputs=inputs, outputs=[self.bld_root.declare(output)],
+                                  func=func, env={})
+        task.env_vars = []
+        return task
+
+    def _run(self, tasks, maxjobs=4):
+        runner = ParallelRunner(self.ctx, tasks, maxjobs)
+        runner.start()
+        runner.run()
+
+    def test_simple(self):
+        a = self._task("cc", [self._source("a.c", "a")], "a.o")
+        b = self._task("cc", [self._source("b.c", "b")], "b.o")
+        link = self._task("link", a.outputs + b.outputs, "ab.so")
+        self._run([link, b, a])
+        self.assertEqual(link.outputs[0].read(), "ab")
+
+    def test_no_barrier(self):
+        # The link task only depends on fast.o, so it should not wait for the
+        # unrelated slow compilation to finish
+        linked = threading.Event()
+        def _slow(task):
+            linked.wait(5)
+            if not linked.isSet():
+                raise ValueError("link task not run before slow task finished")
+            _concat(task)
+        def _link(task):
+            linked.set()
+            _concat(task)
+
+        slow = self._task("cc", [self._source("slow.c", "s")], "slow.o", _slow)
+        fast = self._task("cc", [self._source("fast.c", "f")], "fast.o")
+        link = self._task("link", fast.outputs, "fast.so", _link)
+        self._run([slow, fast, link])
+        self.assertEqual(link.outputs[0].read(), "f")
+
+    def test_failure(self):
+        def _fail(task):
+            raise TaskRunFailure(["cc", "a.c"], "failed")
+        a = self._task("cc", [self._source("a.c", "a")], "a.o", _fail)
+        link = self._task("link", a.outputs, "a.so")
+        try:
+            self._run([a, link])
+            self.fail("Expected TaskRunFailure")
+        except TaskRunFailure:
+            pass
+        self.assertFalse(os.path.exists(link.outputs[0].abspath()))
+
+    def test_before(self):
+        copy_tf = task_factory("copy_before")
+        convert_tf = task_factory("convert_before")
+        convert_tf.before.append(copy_tf.__name__)
+
+        done = []
+        def _copy(task):
+            done.append("copy")
+            _concat(task)
+        def _convert(task):
+            # every copy is done before any convert
+            self.assertEqual(done, ["copy"] * 3)
+            _concat(task)
+
+        tasks = []
+        for i in range(3):
+            source = self._source("%d.py" % i)
+            tasks.append(self._task("copy_before", [source], "%d.copy" % i, _copy))
+            tasks.append(self._task("convert_before", [source], "%d.convert" % i, _convert))
+        self._run(tasks)
+
+    def test_cycle(self):
+        a = self._task("cc", [], "a.o")
+        b = self._task("cc", a.outputs, "b.o")
+        a.inputs.extend(b.outputs)
+        self.assertRaises(Exception, lambda: self._run([a, b]))
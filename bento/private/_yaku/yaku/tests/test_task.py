@@ -0,0 +1,75 @@
+import os
+import time
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        get_cfg, get_bld
+
+from yaku.task \
+    import \
+        node_signature
+
+class NodeSignatureTest(TmpContextBase):
+    def setUp(self):
+        super(NodeSignatureTest, self).setUp()
+        get_cfg().store()
+        self.ctx = get_bld()
+
+        self._write("foo.c", "int foo;\n")
+        self.node = self.ctx.src_root.find_node("foo.c")
+
+    def _write(self, filename, content, age=10):
+        filename = os.path.join(self.d, filename)
+        f = open(filename, "w")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        t = time.time() - age
+        os.utime(filename, (t, t))
+
+    def _read_count(self, func):
+        # Return the number of times func read the node content
+        count = []
+        klass = self.node.__class__
+        old = klass.read
+        def _read(node, *a, **kw):
+            count.append(node)
+            return old(node, *a, **kw)
+        klass.read = _read
+        try:
+            func()
+        finally:
+            klass.read = old
+        return len(count)
+
+    def test_no_cache(self):
+        self.assertEqual(node_signature(None, self.node),
+                         node_signature(self.ctx, self.node))
+
+    def test_unchanged_stat(self):
+        sig = node_signature(self.ctx, self.node)
+        self.assertEqual(self._read_count(lambda: node_signature(self.ctx, self.node)), 0)
+        self.assertEqual(node_signature(self.ctx, self.node), sig)
+
+    def test_changed_stat(self):
+        sig = node_signature(self.ctx, self.node)
+        self._write("foo.c", "int bar;\n", age=5)
+        self.assertEqual(self._read_count(lambda: node_signature(self.ctx, self.node)), 1)
+        self.assertNotEqual(node_signature(self.ctx, self.node), sig)
+
+    def test_store(self):
+        self._write("bar.c", "int bar;\n", age=0)
+        bar = self.ctx.src_root.find_node("bar.c")
+
+        sig = node_signature(self.ctx, self.node)
+        node_signature(self.ctx, bar)
+        self.ctx.store()
+
+        ctx = get_bld()
+        # bar.c was modified too recently for its signature to be kept
+        self.assertEqual(list(ctx.node_sigs.keys()), [self.node.abspath()])
+        self.assertEqual(ctx.node_sigs[self.node.abspath()][2], sig)
@@ -0,0 +1,50 @@
+import unittest
+
+from yaku.task \
+    import \
+        task_factory
+from yaku.task_manager \
+    import \
+        TaskManager
+
+class _Node(object):
+    def __init__(self, name):
+        self.name = name
+
+def _task(klass, source, target):
+    return task_factory(klass)(inputs=[_Node(source)], outputs=[_Node(target)], env={})
+
+def _sets(task_manager):
+    ret = []
+    grp = task_manager.next_set()
+    while grp:
+        ret.append(grp)
+        grp = task_manager.next_set()
+    return ret
+
+class TaskManagerTest(unittest.TestCase):
+    def test_extensions(self):
+        link = _task("link", "foo.o", "foo.so")
+        cc1 = _task("cc", "foo.c", "foo.o")
+        cc2 = _task("cc", "bar.c", "bar.o")
+        unrelated = _task("copy", "foo.txt", "bar.txt")
+
+        sets = _sets(TaskManager([link, cc1, cc2, unrelated]))
+        self.assertEqual(len(sets), 2)
+        self.assertEqual(set(sets[0]), set([cc1, cc2, unrelated]))
+        self.assertEqual(sets[1], [link])
+
+    def test_before(self):
+        copy_tf = task_factory("copy_tm")
+        convert_tf = task_factory("convert_tm")
+        convert_tf.before.append(copy_tf.__name__)
+
+        convert = convert_tf(inputs=[_Node("foo.py")], outputs=[_Node("foo.py")], env={})
+        copy = copy_tf(inputs=[_Node("foo.py")], outputs=[_Node("foo.py")], env={})
+        self.assertEqual(_sets(TaskManager([convert, copy])), [[copy], [convert]])
+
+    def test_cycle(self):
+        task_manager = TaskManager([_task("cc", "foo.c", "foo.o"),
+                                    _task("as", "foo.o", "foo.s"),
+                                    _task("uncc", "foo.s", "foo.c")])
+        self.assertRaises(Exception, task_manager.next_set)
@@ -16,7 +16,7 @@ from yaku.scheduler \
         run_tasks
 from yaku.conf \
     import \
-        with_conf_blddir, create_file, write_log
+        with_conf_blddir, create_file, write_log, write_cached_log
 from yaku.utils \
     import \
         get_exception
@@ -76,7 +76,14 @@ class Builder(object):
         outputs = tasks[0].outputs[:]
         return outputs
 
-def try_task_maker(conf, task_maker, name, body, headers, env=None):
+def try_task_maker(conf, task_maker, name, body, headers, env=None, use_cache=False):
+    """Run the tasks created by task_maker for the given code, and return
+    True if they succeeded.
+
+    If use_cache is True, the result may be taken from (and recorded in)
+    conf.conftest_cache: the tasks must then run in their own conf test
+    directory (see with_conf_blddir), as their outputs are not created when
+    the result is cached."""
     if headers:
         head = "\n".join(["#include <%s>" % h for h in headers])
     else:
@@ -96,6 +103,14 @@ def try_task_maker(conf, task_maker, name, body, headers, env=None):
         t.disable_output = True
         t.log = conf.log
 
+    key = None
+    cache = getattr(conf, "conftest_cache", None)
+    if use_cache and cache is not None:
+        key = cache.key(conf, tasks, code)
+        if key is not None and cache.get(key):
+            write_cached_log(conf, conf.log, code, cache)
+            return True
+
     succeed = False
     explanation = None
     try:
@@ -108,6 +123,8 @@ def try_task_maker(conf, task_maker, name, body, headers, env=None):
             #raise
     finally:
         write_log(conf, conf.log, tasks, code, succeed, explanation)
+    if succeed and key is not None:
+        cache.set(key)
     return succeed
 
 def _merge_env(_env, new_env):
@@ -12,7 +12,10 @@ from yaku.task_manager \
         extension, CompiledTaskGen, set_extension_hook
 from yaku.utils \
     import \
-        find_deps, ensure_dir
+        ensure_dir
+from yaku.scanner \
+    import \
+        scan_deps, include_dirs
 from yaku.compiled_fun \
     import \
         compile_fun
@@ -54,6 +57,7 @@ def ccompile_task(self, node):
     task = task_factory("cc")(inputs=[node], outputs=[target], func=ccompile, env=self.env)
     task.gen = self
     task.env_vars = cc_vars
+    task.scan = lambda: scan_deps(self.bld, node, self.scan_dirs)
     return [task]
 
 def shared_c_hook(self, node):
@@ -69,6 +73,7 @@ def shared_ccompile_task(self, node):
     task = task_factory("shcc")(inputs=[node], outputs=[target], func=shccompile, env=self.env)
     task.gen = self
     task.env_vars = cc_vars
+    task.scan = lambda: scan_deps(self.bld, node, self.scan_dirs)
     return [task]
 
 def shlink_task(self, name):
@@ -133,6 +138,7 @@ def apply_cpppath(task_gen):
     task_gen.env["INCPATH"] = [
             task_gen.env["CPPPATH_FMT"] % p
             for p in cpppaths]
+    task_gen.scan_dirs = include_dirs(srcnode, task_gen.sources, task_gen.env["CPPPATH"])
 
 def apply_libs(task_gen):
     libs = task_gen.env["LIBS"]
@@ -174,7 +180,7 @@ class CCBuilder(yaku.tools.Builder):
 
     def try_compile(self, name, body, headers=None):
         return with_conf_blddir(self.ctx, name, body,
-                                lambda : yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers))
+                                lambda : yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers, use_cache=True))
 
     def try_compile_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers, env)
@@ -207,7 +213,7 @@ class CCBuilder(yaku.tools.Builder):
 
     def try_static_library(self, name, body, headers=None):
         return with_conf_blddir(self.ctx, name, body,
-                                lambda : yaku.tools.try_task_maker(self.ctx, self._static_library, name, body, headers))
+                                lambda : yaku.tools.try_task_maker(self.ctx, self._static_library, name, body, headers, use_cache=True))
 
     def try_static_library_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._static_library, name, body, headers, env)
@@ -244,7 +250,7 @@ class CCBuilder(yaku.tools.Builder):
 
     def try_shared_library(self, name, body, headers=None):
         return with_conf_blddir(self.ctx, name, body,
-                                lambda : yaku.tools.try_task_maker(self.ctx, self._shared_library, name, body, headers))
+                                lambda : yaku.tools.try_task_maker(self.ctx, self._shared_library, name, body, headers, use_cache=True))
 
     def try_shared_library_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._shared_library, name, body, headers, env)
@@ -278,7 +284,7 @@ class CCBuilder(yaku.tools.Builder):
 
     def try_program(self, name, body, headers=None, env=None):
         return with_conf_blddir(self.ctx, name, body,
-                                lambda : yaku.tools.try_task_maker(self.ctx, self._program, name, body, headers, env))
+                                lambda : yaku.tools.try_task_maker(self.ctx, self._program, name, body, headers, env, use_cache=True))
 
     def try_program_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._program, name, body, headers, env)
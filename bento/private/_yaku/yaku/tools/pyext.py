@@ -27,6 +27,9 @@ from yaku.task \
 from yaku.utils \
     import \
         ensure_dir, get_exception
+from yaku.scanner \
+    import \
+        scan_deps, include_dirs
 from yaku.environment \
     import \
         Environment
@@ -157,6 +160,7 @@ def pycc_task(self, node):
     task.env_vars = pycc_vars
     task.env = self.env
     task.func = pycc
+    task.scan = lambda: scan_deps(self.bld, node, self.scan_dirs)
     return [task]
 
 def pycxx_hook(self, node):
@@ -175,6 +179,7 @@ def pycxx_task(self, node):
     task.env_vars = pycxx_vars
     task.env = self.env
     task.func = pycxx
+    task.scan = lambda: scan_deps(self.bld, node, self.scan_dirs)
     return [task]
 
 def pylink_task(self, name):
@@ -217,7 +222,7 @@ class PythonBuilder(yaku.tools.Builder):
         old_hook = set_extension_hook(".c", pycc_task)
         try:
             return with_conf_blddir(self.ctx, name, body,
-                                    lambda : yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers))
+                                    lambda : yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers, use_cache=True))
         finally:
             set_extension_hook(".c", old_hook)
 
@@ -225,7 +230,7 @@ class PythonBuilder(yaku.tools.Builder):
         old_hook = set_extension_hook(".c", pycc_task)
         try:
             return with_conf_blddir(self.ctx, name, body,
-                                    lambda : yaku.tools.try_task_maker(self.ctx, self._extension, name, body, headers))
+                                    lambda : yaku.tools.try_task_maker(self.ctx, self._extension, name, body, headers, use_cache=True))
         finally:
             set_extension_hook(".c", old_hook)
 
@@ -276,7 +281,7 @@ class PythonBuilder(yaku.tools.Builder):
 
     def try_extension(self, name, body, headers=None):
         return with_conf_blddir(self.ctx, name, body,
-                                lambda : yaku.tools.try_task_maker(self.ctx, self._extension, name, body, headers))
+                                lambda : yaku.tools.try_task_maker(self.ctx, self._extension, name, body, headers, use_cache=True))
 
     def configure(self, candidates=None, use_distutils=True):
         ctx = self.ctx
@@ -538,3 +543,4 @@ def apply_cpppath(task_gen):
     task_gen.env["PYEXT_INCPATH"] = [
             task_gen.env["PYEXT_CPPPATH_FMT"] % p
             for p in cpppaths]
+    task_gen.scan_dirs = include_dirs(srcnode, task_gen.sources, task_gen.env["PYEXT_CPPPATH"])
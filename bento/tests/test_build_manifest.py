@@ -68,6 +68,25 @@ class TestBUILD_MANIFEST(unittest.TestCase):
         
         self.assertEqual(json.loads(r_s), json.loads(s))
 
+    def test_binary_roundtrip(self):
+        r_build_manifest = BuildManifest(self.sections, self.meta, {})
+        f = StringIO()
+        r_build_manifest._write(f)
+        r_s = f.getvalue()
+
+        filename = os.path.join(self.src_root, "build_manifest.bin")
+        r_build_manifest.write_binary(filename)
+        build_manifest = BuildManifest.from_file(filename)
+        section = build_manifest.file_sections["pythonfiles"]["section1"]
+        # Files are only read when needed
+        self.assertTrue(section._files is None)
+
+        f = StringIO()
+        build_manifest._write(f)
+        s = f.getvalue()
+
+        self.assertEqual(json.loads(r_s), json.loads(s))
+
 class TestIterFiles(unittest.TestCase):
     def setUp(self):
         self.src_root = tempfile.mkdtemp()
@@ -94,3 +113,19 @@ class TestIterFiles(unittest.TestCase):
                ("pythonfiles", os.path.join(self.top_node.abspath(), "source", "scripts", "foo.py"),
                                os.path.join(target_dir, "scripts", "foo.py"))]
         self.assertEqual(res, ref)
+
+    def test_update_paths(self):
+        build_manifest = BuildManifest(self.sections, self.meta, {}, {"prefix": "/usr"})
+        self.assertEqual(build_manifest.resolve_path("$prefix/target"), "/usr/target")
+        build_manifest.update_paths({"prefix": "/usr/local"})
+        self.assertEqual(build_manifest.resolve_path("$prefix/target"), "/usr/local/target")
+
+    def test_iter_file_paths(self):
+        build_manifest = BuildManifest(self.sections, self.meta, {})
+        sections = build_manifest.resolve_paths(self.top_node)
+        ref = sorted([(kind, source.abspath(), target.abspath()) \
+                      for kind, source, target in iter_files(sections)])
+        self.assertEqual(sorted(build_manifest.iter_file_paths(self.top_node)), ref)
+
+        self.assertEqual(list(build_manifest.iter_file_paths(self.top_node, ["datafiles"])), [])
+        self.assertEqual(build_manifest.resolve_paths(self.top_node, ["datafiles"]), {})
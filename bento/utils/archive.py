@@ -0,0 +1,312 @@
+"""
+Archive writers for the egg and sdist commands.
+"""
+import os
+import sys
+import copy
+import stat
+import time
+import shutil
+import struct
+import zlib
+import zipfile
+
+from collections \
+    import \
+        deque
+
+import six
+
+from bento.utils.os2 \
+    import \
+        rename
+
+# Extensions of files whose content is already compressed, and is stored as is
+# in zip archives
+STORED_EXTENSIONS = [".gz", ".tgz", ".bz2", ".xz", ".lzma", ".zip", ".egg",
+                     ".whl", ".jar", ".png", ".jpg", ".jpeg", ".gif", ".ico"]
+
+# Size of the block compressed to estimate how compressible a file is, and
+# minimum gain for the file to be deflated
+_PROBE_SIZE = 64 * 1024
+_PROBE_MIN_GAIN = 0.05
+
+# Earliest date which can be stored in a zip archive, and its timestamp
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+_ZIP_EPOCH_TIMESTAMP = 315532800
+
+# Size of the chunks compressed as independent gzip members by GzipWriter
+_GZIP_CHUNK_SIZE = 1024 * 1024
+# gzip member header without file name nor mtime (see RFC 1952)
+_GZIP_HEADER = six.b("\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+
+def reproducible_timestamp():
+    """Return the timestamp to use for every archive entry in reproducible
+    archives.
+
+    This is SOURCE_DATE_EPOCH if defined, 1980-01-01 otherwise."""
+    epoch = os.environ.get("SOURCE_DATE_EPOCH", None)
+    if epoch is None:
+        return _ZIP_EPOCH_TIMESTAMP
+    return int(epoch)
+
+def reproducible_date_time():
+    """Same as reproducible_timestamp, as a (year, month, day, hours, minutes,
+    seconds) tuple usable in zip archives."""
+    return max(_ZIP_EPOCH, tuple(time.gmtime(reproducible_timestamp())[:6]))
+
+def _normalized_mode(mode):
+    if stat.S_ISDIR(mode) or mode & stat.S_IXUSR:
+        return int("755", 8)
+    else:
+        return int("644", 8)
+
+def normalize_tarinfo(tarinfo, mtime):
+    """Remove the owner and build-specific data from the given TarInfo:
+    owner and group are set to root, the mtime to the given one, and the
+    permissions to 0644 or 0755. Usable as a TarFile.add filter."""
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = "root"
+    tarinfo.mtime = mtime
+    tarinfo.mode = _normalized_mode(tarinfo.mode)
+    return tarinfo
+
+def is_compressible(filename):
+    """Return False if the given file content is likely to be already
+    compressed."""
+    if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS:
+        return False
+    fid = open(filename, "rb")
+    try:
+        data = fid.read(_PROBE_SIZE)
+    finally:
+        fid.close()
+    if not data:
+        return False
+    return len(zlib.compress(data, 1)) < (1 - _PROBE_MIN_GAIN) * len(data)
+
+class ZipArchive(object):
+    """Zip archive writer, with a ZipFile-like write/writestr interface.
+
+    Entries are written sorted by archive name when the archive is closed,
+    file contents being copied by blocks where the zipfile module supports it
+    (python >= 3.6). Files which are already compressed are stored instead of
+    deflated. Entries may also be copied as is, without being recompressed,
+    from another zip archive (see copy).
+
+    The archive is written in a temporary file, renamed to filename once
+    complete.
+
+    Parameters
+    ----------
+    filename: str
+        archive filename
+    compression_level: int or None
+        zlib compression level (0-9), only honored on python >= 3.7. The zlib
+        default is used if None.
+    date_time: tuple or None
+        if not None, date (as in ZipInfo.date_time) used for every entry
+        instead of the file modification time. File permissions are then also
+        normalized to 0644 or 0755.
+    """
+    def __init__(self, filename, compression_level=None, date_time=None):
+        self.filename = filename
+        self.compression_level = compression_level
+        self.date_time = date_time
+
+        # arcname -> (kind, filename or data)
+        self._entries = {}
+
+    def write(self, filename, arcname):
+        self._entries[arcname.replace(os.sep, "/")] = ("file", filename)
+
+    def writestr(self, arcname, data):
+        self._entries[arcname.replace(os.sep, "/")] = ("data", data)
+
+    def copy(self, archive, arcname):
+        """Copy the arcname entry of the given zip archive, which may be
+        filename itself."""
+        self._entries[arcname.replace(os.sep, "/")] = ("copy", archive)
+
+    def _zip_info(self, arcname, st=None):
+        if self.date_time is not None:
+            date_time = self.date_time
+        elif st is not None:
+            date_time = time.localtime(st.st_mtime)[:6]
+        else:
+            date_time = time.localtime(time.time())[:6]
+        zinfo = zipfile.ZipInfo(arcname, date_time)
+
+        if st is None:
+            mode = stat.S_IFREG | int("644", 8)
+        elif self.date_time is not None:
+            mode = stat.S_IFREG | _normalized_mode(st.st_mode)
+        else:
+            mode = st.st_mode
+        zinfo.external_attr = (mode & 0xFFFF) << 16
+
+        if self.compression_level == 0:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+        if self.compression_level is not None and hasattr(zinfo, "_compresslevel"):
+            # zipfile has no public API to set the level of a given entry, and
+            # no per-entry level at all before python 3.7
+            zinfo._compresslevel = self.compression_level
+        return zinfo
+
+    def _write_file(self, zid, filename, arcname):
+        st = os.stat(filename)
+        zinfo = self._zip_info(arcname, st)
+        zinfo.file_size = st.st_size
+        if not is_compressible(filename):
+            zinfo.compress_type = zipfile.ZIP_STORED
+
+        src = open(filename, "rb")
+        try:
+            if sys.version_info >= (3, 6):
+                dst = zid.open(zinfo, "w")
+                try:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                finally:
+                    dst.close()
+            else:
+                zid.writestr(zinfo, src.read())
+        finally:
+            src.close()
+
+    def close(self):
+        # archive filename -> (ZipFile, raw file object) of copied entries
+        sources = {}
+        zid = zipfile.ZipFile(self.filename + ".tmp", "w", zipfile.ZIP_DEFLATED)
+        try:
+            for arcname in sorted(self._entries):
+                kind, value = self._entries[arcname]
+                if kind == "file":
+                    self._write_file(zid, value, arcname)
+                elif kind == "data":
+                    zid.writestr(self._zip_info(arcname), value)
+                else:
+                    if not value in sources:
+                        sources[value] = (zipfile.ZipFile(value), open(value, "rb"))
+                    _copy_member(zid, sources[value][0], sources[value][1], arcname)
+        finally:
+            zid.close()
+            for source_zid, source_fid in sources.values():
+                source_zid.close()
+                source_fid.close()
+        rename(self.filename + ".tmp", self.filename)
+
+def _copy_member(zid, source_zid, source_fid, arcname):
+    # Copy the local header and compressed data of the given member as is.
+    # zipfile has no API for this, so we append the member to the ZipFile
+    # internal list of members ourselves.
+    source_info = source_zid.getinfo(arcname)
+    if source_info.flag_bits & 0x08:
+        raise ValueError("Cannot copy zip member %r with a data descriptor" % arcname)
+    source_fid.seek(source_info.header_offset)
+    header = source_fid.read(30)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipfile("Bad local header for zip member %r" % arcname)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    size = 30 + name_length + extra_length + source_info.compress_size
+
+    zinfo = copy.copy(source_info)
+    zinfo.header_offset = zid.fp.tell()
+    source_fid.seek(source_info.header_offset)
+    while size > 0:
+        block = source_fid.read(min(size, 1024 * 1024))
+        if not block:
+            raise zipfile.BadZipfile("Truncated zip member %r" % arcname)
+        zid.fp.write(block)
+        size -= len(block)
+    zid.filelist.append(zinfo)
+    zid.NameToInfo[zinfo.filename] = zinfo
+    if hasattr(zid, "start_dir"):
+        zid.start_dir = zid.fp.tell()
+
+def _gzip_trailer(crc, size):
+    return struct.pack("<II", crc & 0xFFFFFFFF, size & 0xFFFFFFFF)
+
+def _gzip_member(data, compression_level):
+    co = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return _GZIP_HEADER + co.compress(data) + co.flush() \
+            + _gzip_trailer(zlib.crc32(data), len(data))
+
+class GzipWriter(object):
+    """Write-only gzip file object, e.g. to be given to tarfile in stream
+    mode.
+
+    With more than one job, the data are cut in chunks of 1 Mb which are
+    compressed on a pool of threads (zlib releases the GIL), and written as a
+    multi-member gzip stream, as pigz does. The output is then the same for
+    any number of jobs. The gzip headers have neither a file name nor a
+    timestamp.
+
+    The underlying file object is not closed by close."""
+    def __init__(self, fileobj, compression_level=9, jobs=1):
+        self._fileobj = fileobj
+        self._compression_level = compression_level
+        self._jobs = jobs
+
+        self._buffer = []
+        self._buffered = 0
+        self._submitted = False
+
+        if jobs > 1:
+            # imported here as this is only needed for parallel compression
+            from multiprocessing.pool \
+                import \
+                    ThreadPool
+            self._pool = ThreadPool(jobs)
+            self._pending = deque()
+        else:
+            self._pool = None
+            self._compressobj = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self._crc = zlib.crc32(six.b(""))
+            self._size = 0
+            self._fileobj.write(_GZIP_HEADER)
+
+    def write(self, data):
+        if self._pool is None:
+            self._crc = zlib.crc32(data, self._crc)
+            self._size += len(data)
+            self._fileobj.write(self._compressobj.compress(data))
+        else:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= _GZIP_CHUNK_SIZE:
+                self._submit(False)
+
+    def _submit(self, last):
+        # Compress the buffered data by chunks of _GZIP_CHUNK_SIZE, keeping
+        # the remainder in the buffer unless this is the last chunk
+        data = six.b("").join(self._buffer)
+        n = len(data) - len(data) % _GZIP_CHUNK_SIZE
+        if last and (len(data) > n or not self._submitted):
+            # an empty stream still needs one member
+            n = len(data) + 1
+        for i in range(0, n, _GZIP_CHUNK_SIZE):
+            self._pending.append(self._pool.apply_async(_gzip_member,
+                    (data[i:i+_GZIP_CHUNK_SIZE], self._compression_level)))
+        self._submitted = True
+        self._buffer = [data[n:]]
+        self._buffered = len(self._buffer[0])
+        # Bound the number of chunks kept in memory
+        while len(self._pending) > 2 * self._jobs:
+            self._write_member()
+
+    def _write_member(self):
+        self._fileobj.write(self._pending.popleft().get())
+
+    def close(self):
+        if self._pool is None:
+            self._fileobj.write(self._compressobj.flush())
+            self._fileobj.write(_gzip_trailer(self._crc, self._size))
+        else:
+            try:
+                self._submit(True)
+                while self._pending:
+                    self._write_member()
+            finally:
+                self._pool.terminate()
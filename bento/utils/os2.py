@@ -1,3 +1,6 @@
+import os
+import sys
+import stat
 import errno
 import shutil
 
@@ -18,3 +21,106 @@ def rename(source, target):
         else:
             raise
 
+
+# How copy_file creates the target: by copying, hard linking or reflinking
+# the source
+LINK_MODES = ["copy", "hardlink", "reflink"]
+
+if hasattr(os, "copy_file_range"):
+    _kernel_copy = os.copy_file_range
+elif hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    _kernel_copy = lambda src, dst, count: os.sendfile(dst, src, None, count)
+else:
+    _kernel_copy = None
+# errors raised when the file systems do not support in-kernel copies
+_KERNEL_COPY_ERRORS = [getattr(errno, name) for name in
+                       ("EXDEV", "ENOSYS", "EINVAL", "ENOTSUP", "EOPNOTSUPP", "EBADF")
+                       if hasattr(errno, name)]
+
+# Linux ioctl to share the data blocks of two files (btrfs, xfs)
+_FICLONE = 0x40049409
+
+def _copy_data(fsrc, fdst):
+    # Copy in the kernel where possible
+    if _kernel_copy is not None:
+        try:
+            # Some file systems (procfs, some FUSE mounts) copy nothing
+            # without error: copy normally if the first call copies nothing
+            if _kernel_copy(fsrc.fileno(), fdst.fileno(), 1024 * 1024 * 1024) > 0:
+                while _kernel_copy(fsrc.fileno(), fdst.fileno(), 1024 * 1024 * 1024) > 0:
+                    pass
+                return
+        except OSError:
+            e = extract_exception()
+            if not e.errno in _KERNEL_COPY_ERRORS:
+                raise
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+    shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+def _reflink_data(fsrc, fdst):
+    try:
+        import fcntl
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except (ImportError, IOError, OSError):
+        _copy_data(fsrc, fdst)
+
+def _hardlink(source, target, mode):
+    # Hard link target to source, and return True, unless the target mode
+    # would differ from the source one or the link cannot be created
+    st = os.stat(source)
+    if mode is not None and stat.S_IMODE(st.st_mode) != mode:
+        return False
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return True
+    tmp = target + ".tmp"
+    try:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        os.link(source, tmp)
+    except (AttributeError, OSError):
+        return False
+    rename(tmp, target)
+    return True
+
+def copy_file(source, target, mode=None, link_mode="copy"):
+    """Copy source to target.
+
+    Parameters
+    ----------
+    source: str
+    target: str
+    mode: int or None
+        permissions of the target. Same as the source if None.
+    link_mode: str
+        one of LINK_MODES. If 'hardlink', target is a hard link to source,
+        if 'reflink', target shares its data blocks with source (copy on
+        write). A regular copy is done if the link cannot be created (e.g.
+        source and target on different file systems, or different
+        permissions for hard links).
+    """
+    if link_mode == "hardlink" and _hardlink(source, target, mode):
+        return
+    if os.path.exists(target) and os.stat(target).st_nlink > 1:
+        # Do not write through a hard link created by a previous install
+        os.remove(target)
+
+    fsrc = open(source, "rb")
+    try:
+        if mode is None:
+            mode = stat.S_IMODE(os.fstat(fsrc.fileno()).st_mode)
+        fdst = open(target, "wb")
+        try:
+            if link_mode == "reflink":
+                _reflink_data(fsrc, fdst)
+            else:
+                _copy_data(fsrc, fdst)
+            if hasattr(os, "fchmod"):
+                os.fchmod(fdst.fileno(), mode)
+        finally:
+            fdst.close()
+        if not hasattr(os, "fchmod"):
+            os.chmod(target, mode)
+    finally:
+        fsrc.close()
@@ -0,0 +1,148 @@
+import os
+import gzip
+import shutil
+import tempfile
+import zipfile
+
+from bento.compat.api.moves \
+    import \
+        unittest
+
+from bento.utils.archive \
+    import \
+        ZipArchive, GzipWriter, is_compressible, reproducible_date_time
+import bento.utils.archive
+
+class TestZipArchive(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.text = self._write("foo.txt", "some text\n" * 100)
+        self.data = self._write("bar.bin", os.urandom(4096))
+        self.gz = self._write("foo.gz", "not really gzipped, but stored anyway\n" * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.d)
+
+    def _write(self, name, content, mtime=None):
+        filename = os.path.join(self.d, name)
+        if not isinstance(content, bytes):
+            content = content.encode("ascii")
+        f = open(filename, "wb")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+        return filename
+
+    def _archive(self, name, **kw):
+        filename = os.path.join(self.d, name)
+        zid = ZipArchive(filename, **kw)
+        try:
+            zid.write(self.text, os.path.join("foo", "foo.txt"))
+            zid.write(self.gz, "foo.gz")
+            zid.writestr("META", "meta")
+            zid.write(self.data, "bar.bin")
+        finally:
+            zid.close()
+        return filename
+
+    def _read(self, filename):
+        f = open(filename, "rb")
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible(self.text))
+        self.assertFalse(is_compressible(self.data))
+        self.assertFalse(is_compressible(self.gz))
+
+    def test_content(self):
+        zid = zipfile.ZipFile(self._archive("foo.zip"))
+        try:
+            self.assertEqual(zid.namelist(), ["META", "bar.bin", "foo.gz", "foo/foo.txt"])
+            self.assertEqual(zid.read("foo/foo.txt"), self._read(self.text))
+            self.assertEqual(zid.read("META"), "meta".encode("ascii"))
+
+            self.assertEqual(zid.getinfo("foo/foo.txt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(zid.getinfo("bar.bin").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zid.getinfo("foo.gz").compress_type, zipfile.ZIP_STORED)
+        finally:
+            zid.close()
+
+    def test_reproducible(self):
+        date_time = reproducible_date_time()
+        first = self._read(self._archive("first.zip", date_time=date_time))
+
+        os.utime(self.text, (1000000000, 1000000000))
+        os.chmod(self.data, int("600", 8))
+        second = self._read(self._archive("second.zip", date_time=date_time))
+        self.assertEqual(first, second)
+
+        zid = zipfile.ZipFile(os.path.join(self.d, "first.zip"))
+        try:
+            self.assertEqual(zid.getinfo("foo/foo.txt").date_time, date_time)
+        finally:
+            zid.close()
+
+    def test_copy(self):
+        filename = self._archive("foo.zip", compression_level=9)
+        first = self._read(filename)
+
+        zid = ZipArchive(filename)
+        try:
+            for arcname in ["META", "bar.bin", "foo.gz", "foo/foo.txt"]:
+                zid.copy(filename, arcname)
+        finally:
+            zid.close()
+        self.assertEqual(self._read(filename), first)
+
+class TestGzipWriter(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.old_chunk_size = bento.utils.archive._GZIP_CHUNK_SIZE
+        bento.utils.archive._GZIP_CHUNK_SIZE = 1000
+
+    def tearDown(self):
+        bento.utils.archive._GZIP_CHUNK_SIZE = self.old_chunk_size
+        shutil.rmtree(self.d)
+
+    def _compress(self, chunks, jobs):
+        # Return the compressed stream, and its content as read by gzip
+        filename = os.path.join(self.d, "foo.gz")
+        f = open(filename, "wb")
+        try:
+            gz = GzipWriter(f, 9, jobs)
+            for chunk in chunks:
+                gz.write(chunk)
+            gz.close()
+        finally:
+            f.close()
+
+        f = open(filename, "rb")
+        try:
+            compressed = f.read()
+        finally:
+            f.close()
+        gz = gzip.GzipFile(filename)
+        try:
+            return compressed, gz.read()
+        finally:
+            gz.close()
+
+    def test_roundtrip(self):
+        chunks = [os.urandom(300) for i in range(20)]
+        data = "".encode("ascii").join(chunks)
+        for jobs in [1, 2, 4]:
+            self.assertEqual(self._compress(chunks, jobs)[1], data)
+
+    def test_jobs(self):
+        chunks = [("%d\n" % i).encode("ascii") * 30 for i in range(50)]
+        self.assertEqual(self._compress(chunks, 2)[0], self._compress(chunks, 4)[0])
+
+    def test_empty(self):
+        for jobs in [1, 2]:
+            self.assertEqual(self._compress([], jobs)[1], "".encode("ascii"))
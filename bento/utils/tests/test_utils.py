@@ -20,7 +20,7 @@ from bento.compat.api.moves \
         unittest
 
 from bento.utils.utils \
-    import subst_vars, to_camel_case, explode_path, same_content, \
+    import subst_vars, SubstitutionContext, to_camel_case, explode_path, same_content, \
         cmd_is_runnable, memoized, comma_list_split, cpu_count, pprint, \
         virtualenv_prefix
 from bento.utils.io2 \
@@ -28,7 +28,7 @@ from bento.utils.io2 \
         safe_write
 from bento.utils.os2 \
     import \
-        rename
+        rename, copy_file
 import bento.utils.path
 
 def raise_oserror(err):
@@ -63,6 +63,27 @@ class TestSubstVars(unittest.TestCase):
         for lower, camel in d:
             self.assertEqual(to_camel_case(lower), camel)
 
+class TestSubstitutionContext(unittest.TestCase):
+    def setUp(self):
+        self.d = {'prefix': '/usr/local',
+                  'eprefix': '$prefix',
+                  'datarootdir': '$prefix/share',
+                  'datadir': '$datarootdir'}
+
+    def test_simple(self):
+        context = SubstitutionContext(self.d)
+        for s in ['$datadir', '$$datadir', '$eprefix/lib', 'no variable', '']:
+            self.assertEqual(context.subst(s), subst_vars(s, self.d))
+        self.assertRaises(ValueError, lambda: context.subst('$undefined'))
+
+    def test_copy(self):
+        # Later changes of the variables are not seen by the context
+        context = SubstitutionContext(self.d)
+        self.assertEqual(context.subst('$datadir'), '/usr/local/share')
+        self.d['prefix'] = '/usr'
+        self.assertEqual(context.subst('$datadir'), '/usr/local/share')
+        self.assertEqual(SubstitutionContext(self.d).subst('$datadir'), '/usr/share')
+
 class TestExplodePath(unittest.TestCase):
     def test_simple(self):
         path = "/home/joe"
@@ -155,6 +176,27 @@ class TestMisc(unittest.TestCase):
     def test_rename_failure(self):
         self.assertRaises(OSError, self._test_rename)
 
+    # some file systems report an in-kernel copy of 0 bytes for non-empty files
+    @mock.patch("bento.utils.os2._kernel_copy", lambda src, dst, count: 0)
+    def test_copy_file_no_kernel_copy(self):
+        d = tempfile.mkdtemp()
+        try:
+            f = op.join(d, "f.txt")
+            fid = open(f, "wt")
+            try:
+                fid.write("some content")
+            finally:
+                fid.close()
+            g = op.join(d, "g.txt")
+            copy_file(f, g)
+            fid = open(g, "rt")
+            try:
+                self.assertEqual(fid.read(), "some content")
+            finally:
+                fid.close()
+        finally:
+            shutil.rmtree(d)
+
 class TestMemoize(unittest.TestCase):
     def test_simple_no_arguments(self):
         lst = []
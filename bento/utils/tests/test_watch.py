@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+
+from bento.compat.api.moves \
+    import \
+        unittest
+
+from bento.core.testing \
+    import \
+        skip_if
+from bento.utils.watch \
+    import \
+        PollingWatcher, InotifyWatcher, has_inotify, create_watcher
+
+class _TestWatcher(object):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.build = os.path.join(self.d, "build")
+        os.makedirs(os.path.join(self.d, "src"))
+        os.makedirs(self.build)
+        self.foo = self._write(os.path.join("src", "foo.c"), "foo")
+        self.watcher = self._watcher()
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.d)
+
+    def _write(self, name, content):
+        filename = os.path.join(self.d, name)
+        f = open(filename, "w")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return filename
+
+    def test_no_change(self):
+        self.assertEqual(self.watcher.wait(0.2), [])
+
+    def test_changes(self):
+        bar = self._write(os.path.join("src", "bar.c"), "bar")
+        self._write(os.path.join("src", "foo.c"), "foo modified")
+        self.assertEqual(self.watcher.wait(2), [("created", bar), ("modified", self.foo)])
+
+        os.remove(bar)
+        self.assertEqual(self.watcher.wait(2), [("deleted", bar)])
+
+    def test_ignored(self):
+        self._write(os.path.join("build", "foo.o"), "")
+        self._write(os.path.join("src", ".foo.c.swp"), "")
+        self._write(os.path.join("src", "foo.c~"), "")
+        self.assertEqual(self.watcher.wait(0.2), [])
+
+    def test_new_directory(self):
+        os.makedirs(os.path.join(self.d, "src", "sub"))
+        self.watcher.wait(2)
+        baz = self._write(os.path.join("src", "sub", "baz.c"), "baz")
+        self.assertEqual(self.watcher.wait(2), [("created", baz)])
+
+class TestPollingWatcher(_TestWatcher, unittest.TestCase):
+    def _watcher(self):
+        return PollingWatcher(self.d, [self.build], interval=0.05)
+
+    def _write(self, name, content):
+        filename = super(TestPollingWatcher, self)._write(name, content)
+        # mtimes may be too coarse to see a modification
+        os.utime(filename, (0, 0))
+        return filename
+
+    def test_new_directory(self):
+        # empty directories are not reported by polling
+        os.makedirs(os.path.join(self.d, "src", "sub"))
+        self.assertEqual(self.watcher.wait(0.2), [])
+        baz = self._write(os.path.join("src", "sub", "baz.c"), "baz")
+        self.assertEqual(self.watcher.wait(2), [("created", baz)])
+
+@skip_if(not has_inotify(), "inotify not available")
+class TestInotifyWatcher(_TestWatcher, unittest.TestCase):
+    def _watcher(self):
+        return InotifyWatcher(self.d, [self.build])
+
+class TestCreateWatcher(unittest.TestCase):
+    def test_simple(self):
+        d = tempfile.mkdtemp()
+        try:
+            watcher = create_watcher(d)
+            try:
+                self.assertEqual(watcher.wait(0.1), [])
+            finally:
+                watcher.close()
+        finally:
+            shutil.rmtree(d)
@@ -12,6 +12,7 @@ from six.moves \
     import \
         cPickle
 
+import hashlib
 import os.path as op
 
 from bento.compat.api \
@@ -69,6 +70,13 @@ def pprint(color, s, fout=None):
 _IDPATTERN = "[a-zA-Z_][a-zA-Z_0-9]*"
 _DELIM = "$"
 
+_SIMPLE_SUBST_PATTERN = re.compile(r"\%s(%s)" % (_DELIM, _IDPATTERN))
+_SUBST_PATTERN = re.compile(r"""
+        %(delim)s(?:
+            (?P<escaped>%(delim)s) |
+            (?P<named>%(id)s)
+        )""" % {"delim": r"\%s" % _DELIM, "id": _IDPATTERN}, re.VERBOSE)
+
 def _simple_subst_vars(s, local_vars):
     """Like subst_vars, but does not handle escaping."""
     def _subst(m):
@@ -81,7 +89,7 @@ def _simple_subst_vars(s, local_vars):
     def _resolve(d):
         ret = {}
         for k, v in d.items():
-            ret[k] = re.sub("\%s(%s)" % (_DELIM, _IDPATTERN), _subst, v)
+            ret[k] = _SIMPLE_SUBST_PATTERN.sub(_subst, v)
         return ret
 
     ret = _resolve(s)
@@ -90,6 +98,43 @@ def _simple_subst_vars(s, local_vars):
         ret = _resolve(s)
     return ret
 
+class SubstitutionContext(object):
+    """Compiled variable substitution: subst(s) is the same as
+    subst_vars(s, local_vars), but the variables are resolved within
+    local_vars once, and the results are memoized.
+
+    local_vars is copied: the context must be created again when the
+    variables change."""
+    def __init__(self, local_vars):
+        self.variables = _simple_subst_vars(local_vars, local_vars)
+        self._memo = {}
+
+    def _subst(self, match):
+        named = match.group("named")
+        if named is not None:
+            if named in self.variables:
+                return str(self.variables[named])
+            else:
+                raise ValueError("Invalid variable '%s'" % named)
+        if match.group("escaped") is not None:
+            return _DELIM
+        raise ValueError("This should not happen")
+
+    def subst(self, s):
+        try:
+            return self._memo[s]
+        except KeyError:
+            pass
+        if not _DELIM in s:
+            ret = s
+        else:
+            try:
+                ret = _SUBST_PATTERN.sub(self._subst, s)
+            except KeyError:
+                raise ValueError("invalid variable '$%s'" % ex_stack())
+        self._memo[s] = ret
+        return ret
+
 def subst_vars (s, local_vars):
     """Perform shell/Perl-style variable substitution.
 
@@ -99,6 +144,9 @@ def subst_vars (s, local_vars):
 
     '$' may be escaped by using '$$'
 
+    Use SubstitutionContext to substitute many strings with the same
+    variables.
+
     Parameters
     ----------
     s: str
@@ -106,33 +154,7 @@ def subst_vars (s, local_vars):
     local_vars: dict
         dict of variables
     """
-    # Resolve variable substitution within the local_vars dict
-    local_vars = _simple_subst_vars(local_vars, local_vars)
-
-    def _subst (match):
-        named = match.group("named")
-        if named is not None:
-            if named in local_vars:
-                return str(local_vars[named])
-            else:
-                raise ValueError("Invalid variable '%s'" % named)
-        if match.group("escaped") is not None:
-            return _DELIM
-        raise ValueError("This should not happen")
-
-    def _do_subst(v):
-        pattern_s = r"""
-        %(delim)s(?:
-            (?P<escaped>%(delim)s) |
-            (?P<named>%(id)s)
-        )""" % {"delim": r"\%s" % _DELIM, "id": _IDPATTERN}
-        pattern = re.compile(pattern_s, re.VERBOSE)
-        return pattern.sub(_subst, v)
-
-    try:
-        return _do_subst(s)
-    except KeyError:
-        raise ValueError("invalid variable '$%s'" % ex_stack())
+    return SubstitutionContext(local_vars).subst(s)
 
 # Taken from multiprocessing code
 def cpu_count():
@@ -173,6 +195,20 @@ def same_content(f1, f2):
     finally:
         fid1.close()
 
+def file_sha1(filename):
+    """Return the hex sha1 digest of the given file content."""
+    h = hashlib.sha1()
+    fid = open(filename, "rb")
+    try:
+        while True:
+            block = fid.read(1024 * 1024)
+            if not block:
+                break
+            h.update(block)
+    finally:
+        fid.close()
+    return h.hexdigest()
+
 def virtualenv_prefix():
     """Return the virtual environment prefix if running python is "virtualized"
     (i.e. run inside virtualenv), None otherwise."""
@@ -0,0 +1,301 @@
+"""
+Watchers of a source tree, used by build --watch.
+
+Watchers report changes as a sorted list of (event, path) pairs, event being
+one of "created", "deleted" or "modified", and path an absolute path. inotify
+is used through ctypes on linux, other platforms fall back on polling the
+tree.
+"""
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+
+import os.path as op
+
+import six
+
+from bento.utils.utils \
+    import \
+        extract_exception
+
+# Time without new events after which a set of changes is reported, so that
+# e.g. a checkout is handled as one change
+SETTLE_DELAY = 0.1
+# Interval between two scans of the tree by PollingWatcher
+POLL_INTERVAL = 0.5
+
+# Editor backup/swap files, temporary files and byte-compiled files never are
+# sources
+_IGNORED_NAMES = re.compile(r"^(\.|#)|~$|\.sw[px]$|\.tmp$|\.py[co]$|^__pycache__$")
+
+def _is_ignored(name):
+    return _IGNORED_NAMES.search(name) is not None
+
+class _Watcher(object):
+    def __init__(self, top, excluded=None):
+        self.top = op.abspath(top)
+        if excluded is None:
+            excluded = []
+        self.excluded = set(op.abspath(e) for e in excluded)
+
+    def _is_watched_dir(self, path):
+        return not path in self.excluded and not _is_ignored(op.basename(path))
+
+    def _walk(self):
+        # Yield the watched directories, top first
+        for root, dirs, files in os.walk(self.top):
+            dirs[:] = [d for d in sorted(dirs) if self._is_watched_dir(op.join(root, d))]
+            yield root, files
+
+    def wait(self, timeout=None):
+        """Wait for changes in the tree, and return them as a sorted list of
+        (event, path). An empty list is returned if nothing changed after
+        timeout seconds (None to wait forever)."""
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+def layout_changed(changes):
+    """Return True if files were added or removed in the given changes of
+    the source tree."""
+    for event, path in changes:
+        if event != "modified":
+            return True
+    return False
+
+def _merge_events(changes, event, path):
+    # A file created then modified is still created, a file deleted then
+    # created is modified
+    previous = changes.get(path, None)
+    if previous == "created" and event == "modified":
+        return
+    elif previous == "created" and event == "deleted":
+        del changes[path]
+    elif previous == "deleted" and event == "created":
+        changes[path] = "modified"
+    else:
+        changes[path] = event
+
+def _sorted_changes(changes):
+    return sorted((event, path) for path, event in changes.items())
+
+class PollingWatcher(_Watcher):
+    """Watcher comparing the size and mtime of every file of the tree every
+    interval seconds."""
+    def __init__(self, top, excluded=None, interval=POLL_INTERVAL):
+        super(PollingWatcher, self).__init__(top, excluded)
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for root, files in self._walk():
+            for name in files:
+                if not _is_ignored(name):
+                    path = op.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    state[path] = (st.st_size, st.st_mtime)
+        return state
+
+    def _changes(self):
+        state = self._scan()
+        changes = {}
+        for path, value in state.items():
+            previous = self._state.get(path, None)
+            if previous is None:
+                changes[path] = "created"
+            elif previous != value:
+                changes[path] = "modified"
+        for path in self._state:
+            if not path in state:
+                changes[path] = "deleted"
+        self._state = state
+        return changes
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while True:
+            changes = self._changes()
+            if changes:
+                return _sorted_changes(changes)
+            if timeout is not None and time.time() - start >= timeout:
+                return []
+            time.sleep(self.interval)
+
+# inotify constants, see inotify(7)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO \
+        | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+
+# struct inotify_event, without the name which follows it
+_EVENT_HEADER = struct.Struct("iIII")
+
+_LIBC = None
+
+def _libc():
+    global _LIBC
+    if _LIBC is None:
+        # imported here as ctypes may be missing, and is only needed on linux
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _LIBC = libc
+    return _LIBC
+
+def _fsencode(path):
+    if sys.version_info[0] < 3 or isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding(), "surrogateescape")
+
+def _fsdecode(name):
+    if sys.version_info[0] < 3:
+        return name
+    return name.decode(sys.getfilesystemencoding(), "surrogateescape")
+
+def _raise_errno():
+    import ctypes
+    e = ctypes.get_errno()
+    raise OSError(e, os.strerror(e))
+
+def has_inotify():
+    """Return True if inotify can be used on this platform."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        _libc()
+        return True
+    except (ImportError, OSError, AttributeError):
+        return False
+
+class InotifyWatcher(_Watcher):
+    """Watcher using linux inotify, with one watch per directory of the
+    tree."""
+    def __init__(self, top, excluded=None):
+        super(InotifyWatcher, self).__init__(top, excluded)
+        self._fd = _libc().inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            _raise_errno()
+        # watch descriptor -> directory
+        self._dirs = {}
+        try:
+            self._add_tree(self.top)
+        except Exception:
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        wd = _libc().inotify_add_watch(self._fd, _fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            _raise_errno()
+        self._dirs[wd] = path
+
+    def _add_tree(self, top):
+        for root, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if self._is_watched_dir(op.join(root, d))]
+            try:
+                self._add_watch(root)
+            except OSError:
+                e = extract_exception()
+                # removed in the meantime
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def _read_events(self, changes):
+        data = os.read(self._fd, 65536)
+        i = 0
+        while i < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, i)
+            i += _EVENT_HEADER.size
+            name = _fsdecode(data[i:i+length].rstrip(six.b("\0")))
+            i += length
+
+            if mask & _IN_Q_OVERFLOW:
+                # events were lost: the whole tree may have changed
+                changes[self.top] = "created"
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd, None)
+            if directory is None:
+                continue
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                _merge_events(changes, "deleted", directory)
+                continue
+            if _is_ignored(name):
+                continue
+            path = op.join(directory, name)
+            if mask & _IN_ISDIR:
+                if path in self.excluded:
+                    continue
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add_tree(path)
+                    _merge_events(changes, "created", path)
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    _merge_events(changes, "deleted", path)
+            elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                _merge_events(changes, "created", path)
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                _merge_events(changes, "deleted", path)
+            else:
+                _merge_events(changes, "modified", path)
+
+    def _select(self, timeout):
+        try:
+            return select.select([self._fd], [], [], timeout)[0]
+        except select.error:
+            e = extract_exception()
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def wait(self, timeout=None):
+        changes = {}
+        if self._select(timeout):
+            self._read_events(changes)
+            # Wait for the burst of events to be over
+            while self._select(SETTLE_DELAY):
+                self._read_events(changes)
+        return _sorted_changes(changes)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def create_watcher(top, excluded=None):
+    """Return a watcher of the tree rooted at top, ignoring the excluded
+    directories (e.g. the build directory): an InotifyWatcher if inotify is
+    available, a PollingWatcher otherwise."""
+    if has_inotify():
+        try:
+            return InotifyWatcher(top, excluded)
+        except OSError:
+            # e.g. the inotify watches limit was reached
+            pass
+    return PollingWatcher(top, excluded)
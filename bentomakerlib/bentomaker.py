@@ -13,7 +13,7 @@ from bento.utils.utils \
         pprint, extract_exception
 from bento._config \
     import \
-        BENTO_SCRIPT, DB_FILE, _SUB_BUILD_DIR
+        BENTO_SCRIPT, DB_FILE, _SUB_BUILD_DIR, PACKAGE_CACHE_SIZE
 from bento.core \
     import \
         PackageDescription
@@ -22,21 +22,6 @@ from bento.compat.api \
         defaultdict, input
 import bento.core.node
 
-from bento.commands.build \
-    import \
-        BuildCommand
-from bento.commands.build_egg \
-    import \
-        BuildEggCommand
-from bento.commands.build_pkg_info \
-    import \
-        BuildPkgInfoCommand
-from bento.commands.build_wininst \
-    import \
-        BuildWininstCommand
-from bento.commands.configure \
-    import \
-        ConfigureCommand
 from bento.commands.core \
     import \
         HelpCommand
@@ -47,27 +32,9 @@ from bento.commands.hooks \
     import \
         find_pre_hooks, find_post_hooks, find_startup_hooks, \
         find_shutdown_hooks, find_options_hooks, find_command_hooks
-from bento.commands.install \
-    import \
-        InstallCommand
-from bento.commands.parse \
-    import \
-        ParseCommand
-from bento.commands.register \
-    import \
-        RegisterPyPI
 from bento.commands.registries \
     import \
         CommandRegistry, ContextRegistry, OptionsRegistry
-from bento.commands.sdist \
-    import \
-        SdistCommand
-from bento.commands.sphinx_command \
-    import \
-        SphinxCommand
-from bento.commands.upload \
-    import \
-        UploadPyPI
 from bento.commands.options \
     import \
         OptionsContext, Option
@@ -75,21 +42,18 @@ from bento.commands.options \
 from bento.backends.utils \
     import \
         load_backend
-from bento.backends.yaku_backend \
-    import \
-        BuildYakuContext, ConfigureYakuContext
 from bento.commands.command_contexts \
     import \
         HelpContext, SdistContext, ContextWithBuildDirectory
 from bento.commands.wrapper_utils \
     import \
         set_main, run_with_dependencies
+from bento.commands.build \
+    import \
+        watch_build
 from bento.commands.contexts \
     import \
         GlobalContext
-from bento.convert \
-    import \
-        ConvertCommand, DetectTypeCommand
 import bento.errors
 import bento.warnings
 
@@ -99,12 +63,18 @@ from bentomakerlib.package_cache \
 from bentomakerlib.help \
     import \
         get_usage
+from bentomakerlib.client \
+    import \
+        run_client
 
 if os.environ.get("BENTOMAKER_DEBUG", "0") != "0":
     BENTOMAKER_DEBUG = True
 else:
     BENTOMAKER_DEBUG = False
 
+BENTOMAKER_PACKAGE_CACHE_SIZE = int(os.environ.get("BENTOMAKER_PACKAGE_CACHE_SIZE",
+                                                   PACKAGE_CACHE_SIZE))
+
 SCRIPT_NAME = 'bentomaker'
 
 # Path relative to build directory
@@ -112,7 +82,8 @@ CMD_DATA_DUMP = os.path.join(_SUB_BUILD_DIR, "cmd_data.db")
 
 class GlobalOptions(object):
     def __init__(self, cmd_name, cmd_argv, show_usage, build_directory,
-            bento_info, show_version, show_full_version, disable_autoconfigure):
+            bento_info, show_version, show_full_version, disable_autoconfigure,
+            daemon=False, stop_daemon=False):
         self.cmd_name = cmd_name
         self.cmd_argv = cmd_argv
         self.show_usage = show_usage
@@ -121,47 +92,62 @@ class GlobalOptions(object):
         self.show_version = show_version
         self.show_full_version = show_full_version
         self.disable_autoconfigure = disable_autoconfigure
+        self.daemon = daemon
+        self.stop_daemon = stop_daemon
 
 #================================
 #   Create the command line UI
 #================================
+# Command line name -> import path of the command class. Command modules are
+# only imported when the command is actually used, so that e.g. 'bentomaker
+# build' does not pay for importing the pypi or wininst code.
+_COMMANDS = [
+    ("configure", "bento.commands.configure:ConfigureCommand"),
+    ("build", "bento.commands.build:BuildCommand"),
+    ("install", "bento.commands.install:InstallCommand"),
+    ("convert", "bento.convert:ConvertCommand"),
+    ("sdist", "bento.commands.sdist:SdistCommand"),
+    ("build_egg", "bento.commands.build_egg:BuildEggCommand"),
+    ("build_wininst", "bento.commands.build_wininst:BuildWininstCommand"),
+    ("sphinx", "bento.commands.sphinx_command:SphinxCommand"),
+    ("register_pypi", "bento.commands.register:RegisterPyPI"),
+    ("upload_pypi", "bento.commands.upload:UploadPyPI"),
+]
+
+_PRIVATE_COMMANDS = [
+    ("build_pkg_info", "bento.commands.build_pkg_info:BuildPkgInfoCommand"),
+    ("parse", "bento.commands.parse:ParseCommand"),
+    ("detect_type", "bento.convert:DetectTypeCommand"),
+]
+
 def register_commands(global_context):
     global_context.register_command("help", HelpCommand())
-    global_context.register_command("configure", ConfigureCommand())
-    global_context.register_command("build", BuildCommand())
-    global_context.register_command("install", InstallCommand())
-    global_context.register_command("convert", ConvertCommand())
-    global_context.register_command("sdist", SdistCommand())
-    global_context.register_command("build_egg", BuildEggCommand())
-    global_context.register_command("build_wininst", BuildWininstCommand())
-    global_context.register_command("sphinx", SphinxCommand())
-    global_context.register_command("register_pypi", RegisterPyPI())
-    global_context.register_command("upload_pypi", UploadPyPI())
-
-    global_context.register_command("build_pkg_info", BuildPkgInfoCommand(), public=False)
-    global_context.register_command("parse", ParseCommand(), public=False)
-    global_context.register_command("detect_type", DetectTypeCommand(), public=False)
- 
+    for cmd_name, import_path in _COMMANDS:
+        global_context.register_lazy_command(cmd_name, import_path)
+    for cmd_name, import_path in _PRIVATE_COMMANDS:
+        global_context.register_lazy_command(cmd_name, import_path, public=False)
+
     if sys.platform == "darwin":
-        import bento.commands.build_mpkg
-        global_context.register_command("build_mpkg",
-            bento.commands.build_mpkg.BuildMpkgCommand(), public=False)
+        global_context.register_lazy_command("build_mpkg",
+            "bento.commands.build_mpkg:BuildMpkgCommand", public=False)
         global_context.set_before("build_mpkg", "build")
 
     if sys.platform == "win32":
-        from bento.commands.build_msi \
-            import \
-                BuildMsiCommand
-        global_context.register_command("build_msi", BuildMsiCommand())
+        global_context.register_lazy_command("build_msi",
+            "bento.commands.build_msi:BuildMsiCommand")
         global_context.set_before("build_msi", "build")
 
 def register_options(global_context, cmd_name):
-    """Register options for the given command."""
-    cmd = global_context.retrieve_command(cmd_name)
-    context = OptionsContext.from_command(cmd)
+    """Register options for the given command.
+
+    The options context (and the command itself) is only created the first
+    time it is retrieved."""
+    def _create_options_context():
+        cmd = global_context.retrieve_command(cmd_name)
+        return OptionsContext.from_command(cmd)
 
     if not global_context.is_options_context_registered(cmd_name):
-        global_context.register_options_context(cmd_name, context)
+        global_context.register_lazy_options_context(cmd_name, _create_options_context)
 
 def register_options_special(global_context):
     # Register options for special topics not attached to a "real" command
@@ -184,18 +170,23 @@ def register_command_contexts(global_context):
    # global_context.register_default_context(CmdContext)
     default_mapping = defaultdict(lambda: ContextWithBuildDirectory)
     default_mapping.update(dict([
-            ("configure", ConfigureYakuContext),
-            ("build", BuildYakuContext),
             ("build_egg", ContextWithBuildDirectory),
             ("build_wininst", ContextWithBuildDirectory),
             ("build_mpkg", ContextWithBuildDirectory),
             ("install", ContextWithBuildDirectory),
             ("sdist", SdistContext),
             ("help", HelpContext)]))
+    # yaku is only imported when configure/build actually run
+    lazy_mapping = {
+            "configure": "bento.backends.yaku_backend:ConfigureYakuContext",
+            "build": "bento.backends.yaku_backend:BuildYakuContext"}
 
     for cmd_name in global_context.command_names(public_only=False):
         if not global_context.is_command_context_registered(cmd_name):
-            global_context.register_command_context(cmd_name, default_mapping[cmd_name])
+            if cmd_name in lazy_mapping:
+                global_context.register_lazy_command_context(cmd_name, lazy_mapping[cmd_name])
+            else:
+                global_context.register_command_context(cmd_name, default_mapping[cmd_name])
 
 # All the global state/registration stuff goes here
 def register_stuff(global_context):
@@ -227,6 +218,34 @@ def main(argv=None):
         print(bento.__version__ + "git" + bento.__git_revision__)
         return
 
+    if popts.daemon:
+        # imported here as bentomakerlib.daemon depends on this module
+        from bentomakerlib.daemon \
+            import \
+                DaemonServer
+        DaemonServer(popts).serve()
+        return
+
+    if popts.stop_daemon:
+        if run_client(argv, stop=True) is None:
+            print("No bentomaker server running")
+        return
+
+    top_node, build_node, run_node = create_nodes(popts)
+    global_context = create_global_context(options_context, popts, build_node)
+
+    if cmd_name and cmd_name not in ["convert"]:
+        return _wrapped_main(global_context, popts, run_node, top_node, build_node)
+    else:
+        # XXX: is cached package necessary here ?
+        cached_package = None
+        register_stuff(global_context)
+        for cmd_name in global_context.command_names():
+            register_options(global_context, cmd_name)
+        return _main(global_context, cached_package, popts, run_node, top_node, build_node)
+
+def create_nodes(popts):
+    """Return the (top, build, run) nodes for the given global options."""
     source_root = os.path.join(os.getcwd(), os.path.dirname(popts.bento_info))
     build_root = os.path.join(os.getcwd(), popts.build_directory)
 
@@ -235,7 +254,9 @@ def main(argv=None):
         raise bento.errors.UsageException("You cannot execute bentomaker in a subdirectory of the source tree !")
     if run_node != build_node and run_node.is_bld():
         raise bento.errors.UsageException("You cannot execute bentomaker in a subdirectory of the build tree !")
+    return top_node, build_node, run_node
 
+def create_global_context(options_context, popts, build_node):
     global_context = GlobalContext(build_node.make_node(CMD_DATA_DUMP),
                                    CommandRegistry(), ContextRegistry(),
                                    OptionsRegistry(), CommandScheduler())
@@ -246,25 +267,29 @@ def main(argv=None):
     global_context.set_before("build_egg", "build")
     global_context.set_before("build_wininst", "build")
     global_context.set_before("install", "build")
+    return global_context
 
-    if cmd_name and cmd_name not in ["convert"]:
-        return _wrapped_main(global_context, popts, run_node, top_node, build_node)
-    else:
-        # XXX: is cached package necessary here ?
-        cached_package = None
-        register_stuff(global_context)
-        for cmd_name in global_context.command_names():
-            register_options(global_context, cmd_name)
+def _wrapped_main(global_context, popts, run_node, top_node, build_node):
+    cached_package, shutdown_hooks = prepare_global_context(global_context, top_node, build_node)
+    try:
         return _main(global_context, cached_package, popts, run_node, top_node, build_node)
+    finally:
+        if shutdown_hooks:
+            shutdown_hooks[0](global_context)
 
-def _wrapped_main(global_context, popts, run_node, top_node, build_node):
+def prepare_global_context(global_context, top_node, build_node):
+    """Register the package, backend, hooks, commands and options of the
+    project in global_context.
+
+    Returns the package cache (None if there is no bento.info) and the
+    shutdown hooks."""
     # Some commands work without a bento description file (convert, help)
     # FIXME: this should not be called here then - clearly separate commands
     # which require bento.info from the ones who do not
     bento_info_node = top_node.find_node(BENTO_SCRIPT)
     if bento_info_node is not None:
         db_node = build_node.make_node(DB_FILE)
-        cached_package = CachedPackage(db_node)
+        cached_package = CachedPackage(db_node, BENTOMAKER_PACKAGE_CACHE_SIZE)
         package = cached_package.get_package(bento_info_node)
         package_options = cached_package.get_options(bento_info_node)
 
@@ -321,11 +346,7 @@ def _wrapped_main(global_context, popts, run_node, top_node, build_node):
         for hook in find_post_hooks(mods, cmd_name):
             global_context.add_post_hook(hook, cmd_name)
 
-    try:
-        return _main(global_context, cached_package, popts, run_node, top_node, build_node)
-    finally:
-        if shutdown_hooks:
-            shutdown_hooks[0](global_context)
+    return cached_package, shutdown_hooks
 
 def create_global_options_context():
     context = OptionsContext(usage="%prog [options] [cmd_name [cmd_options]]")
@@ -347,8 +368,15 @@ expected to know what he is doing. This is mainly useful for developers, to
 avoid running configure everytime (default: '%default')."""))
     context.add_option(Option("-h", "--help", dest="show_help", action="store_true",
                               help="Display help and exit"))
+    context.add_option(Option("--daemon", dest="daemon", action="store_true",
+                              help="Run a server keeping the project loaded, which the "
+                                   "configure, build, install and sdist commands of the "
+                                   "build directory are then sent to"))
+    context.add_option(Option("--stop-daemon", dest="stop_daemon", action="store_true",
+                              help="Stop the server of the build directory"))
     context.parser.set_defaults(show_version=False, show_full_version=False, show_help=False,
-                                build_directory="build", bento_info="bento.info")
+                                build_directory="build", bento_info="bento.info",
+                                daemon=False, stop_daemon=False)
     return context
 
 def parse_global_options(context, argv):
@@ -379,7 +407,7 @@ def parse_global_options(context, argv):
 
     global_options = GlobalOptions(cmd_name, cmd_argv, show_usage,
             build_directory, bento_info, show_version, show_full_version,
-            o.disable_autoconfigure)
+            o.disable_autoconfigure, o.daemon, o.stop_daemon)
     return global_options
 
 def _main(global_context, cached_package, popts, run_node, top_node, build_node):
@@ -466,12 +494,19 @@ def run_cmd(global_context, cached_package, cmd_name, cmd_argv, run_node, top_no
         raise bento.errors.UsageException("Error: no %s found !" % os.path.join(top_node.abspath(), BENTO_SCRIPT))
 
     running_package = get_running_package(global_context, cached_package, bento_info)
-    run_with_dependencies(global_context, cmd_name, cmd_argv, run_node, top_node, running_package)
+    cmd, context = run_with_dependencies(global_context, cmd_name, cmd_argv, run_node, top_node,
+                                         running_package)
 
     global_context.save_command_argv(cmd_name, cmd_argv)
     global_context.store()
 
-def noexc_main(argv=None):
+    # build --watch: the contexts are kept to build again on changes
+    if getattr(context, "watch", False):
+        watch_build(cmd, context)
+
+def run_noexc(func, *a):
+    """Run func, reporting its exceptions as bentomaker errors, and return
+    the exit status."""
     def _print_debug():
         if BENTOMAKER_DEBUG:
             tb = sys.exc_info()[2]
@@ -483,12 +518,12 @@ def noexc_main(argv=None):
                           "BENTOMAKER_DEBUG=1 environment variable)")
 
     try:
-        main(argv)
+        func(*a)
     except bento.errors.BentoError:
         _print_debug()
         e = extract_exception()
         _print_error(str(e))
-        sys.exit(2)
+        return 2
     except Exception:
         msg = """\
 %s: Error: %s crashed (uncaught exception %s: %s).
@@ -500,7 +535,13 @@ Please report this on bento issue tracker:
             _print_debug()
         e = extract_exception()
         pprint('RED',  msg % (SCRIPT_NAME, SCRIPT_NAME, e.__class__, str(e)))
-        sys.exit(1)
+        return 1
+    return 0
+
+def noexc_main(argv=None):
+    status = run_noexc(main, argv)
+    if status:
+        sys.exit(status)
 
 if __name__ == '__main__':
     noexc_main()
@@ -0,0 +1,135 @@
+"""
+Thin client of the bentomaker server (see bentomakerlib.daemon), and entry
+point of the bentomaker script.
+
+When a server runs for the build directory, the configure, build, install
+and sdist commands are sent to it through its unix socket, and their output
+is written back as if they had run in this process. Everything else, and
+every command when no server is running, runs in this process. This module
+is kept cheap to import: bentomakerlib.bentomaker is only imported when
+needed.
+"""
+import os
+import sys
+import socket
+import struct
+
+# bento must be imported first, for its bundled six
+from bento._config \
+    import \
+        DAEMON_SOCKET_PATH
+
+import six
+
+from six.moves import cPickle
+
+# Commands which may be run by the server
+DAEMON_COMMANDS = ["configure", "build", "install", "sdist"]
+
+# Message: channel (1 byte) + payload size + payload
+_HEADER = struct.Struct("<cI")
+
+REQUEST = six.b("q")
+STDOUT = six.b("o")
+STDERR = six.b("e")
+EXIT = six.b("x")
+REJECT = six.b("r")
+
+def send_message(sock, channel, data):
+    sock.sendall(_HEADER.pack(channel, len(data)) + data)
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return six.b("").join(chunks)
+
+def recv_message(sock):
+    """Return the (channel, data) of the next message of sock."""
+    channel, size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return channel, _recv_exactly(sock, size)
+
+def socket_path(build_directory):
+    """Path of the server socket of the given build directory, relative to
+    the current directory (socket paths are limited to about 100
+    characters)."""
+    return os.path.join(build_directory, DAEMON_SOCKET_PATH)
+
+def _parse_argv(argv):
+    # Return the build directory and command name as parse_global_options
+    # would: global options are the arguments before the command name
+    build_directory = "build"
+    for arg in argv:
+        if arg.startswith("--build-directory="):
+            build_directory = arg.split("=", 1)[1]
+        elif not arg.startswith("-"):
+            return build_directory, arg
+    return build_directory, None
+
+def _output(stream, data):
+    stream = getattr(stream, "buffer", stream)
+    stream.write(data)
+    stream.flush()
+
+def run_client(argv, stop=False):
+    """Run the given bentomaker arguments in the server of the current
+    directory, and return the exit status.
+
+    None is returned if no server may run them: no server running, a command
+    not in DAEMON_COMMANDS, or a request rejected by the server. If stop is
+    True, the server is stopped instead."""
+    build_directory, cmd_name = _parse_argv(argv)
+    if not stop and not cmd_name in DAEMON_COMMANDS:
+        return None
+    path = socket_path(build_directory)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error:
+            # stale socket of a dead server
+            return None
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ),
+                   "version": tuple(sys.version_info[:2]), "stop": stop}
+        send_message(sock, REQUEST, cPickle.dumps(request, 2))
+        while True:
+            try:
+                channel, data = recv_message(sock)
+            except (EOFError, socket.error):
+                sys.stderr.write("bentomaker: connection to the bentomaker server lost\n")
+                return 1
+            if channel == STDOUT:
+                _output(sys.stdout, data)
+            elif channel == STDERR:
+                _output(sys.stderr, data)
+            elif channel == EXIT:
+                return int(data.decode("ascii"))
+            else:
+                return None
+    finally:
+        sock.close()
+
+def client_main(argv=None):
+    """Entry point of the bentomaker script."""
+    if argv is None:
+        argv = sys.argv[1:]
+    # bentomaker asks for a confirmation when run as root, which the server
+    # cannot do
+    if not (hasattr(os, "getuid") and os.getuid() == 0):
+        status = run_client(argv)
+        if status is not None:
+            if status:
+                sys.exit(status)
+            return
+
+    from bentomakerlib.bentomaker \
+        import \
+            noexc_main
+    noexc_main(argv)
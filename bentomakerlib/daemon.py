@@ -0,0 +1,280 @@
+"""
+bentomaker server, started by ``bentomaker --daemon``.
+
+The server listens on a unix socket in the build directory, and runs the
+commands sent by the bentomaker client (see bentomakerlib.client) one at a
+time. The global context is kept between commands, so that python startup,
+the package cache, the hook modules and the options parsers are only paid
+once. It is set up again when bento.info or a hook file changes, or when the
+configure arguments change.
+
+The output of the commands is sent back to the client, except what
+subprocesses write directly to the server file descriptors.
+"""
+import os
+import sys
+import socket
+import threading
+
+from six.moves import cPickle
+
+from bento._config \
+    import \
+        BENTO_SCRIPT
+from bento.utils.utils \
+    import \
+        extract_exception, pprint
+from bento.commands.build \
+    import \
+        _description_files
+import bento.errors
+
+from bentomakerlib.bentomaker \
+    import \
+        CMD_DATA_DUMP, create_global_options_context, parse_global_options, \
+        create_nodes, create_global_context, prepare_global_context, _main, run_noexc
+from bentomakerlib.client \
+    import \
+        DAEMON_COMMANDS, REQUEST, STDOUT, STDERR, EXIT, REJECT, send_message, \
+        recv_message, socket_path
+
+# The server exits after this number of seconds without any command
+DAEMON_IDLE_TIMEOUT = 3600
+
+class _ChannelWriter(object):
+    """File-like object sending what is written to the client of the
+    current request, or to the given stream outside requests.
+
+    The writers are installed as sys.stdout/sys.stderr for the whole life of
+    the server, as some modules keep a reference to the streams they found
+    when imported (e.g. yaku output)."""
+    def __init__(self, channel, stream, encoding="utf-8"):
+        self._channel = channel
+        self._stream = stream
+        self.encoding = encoding
+        self._conn = None
+        # commands may write from several threads (e.g. parallel builds)
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        self._lock.acquire()
+        try:
+            self._conn = conn
+        finally:
+            self._lock.release()
+
+    def detach(self):
+        self.attach(None)
+
+    def write(self, data):
+        self._lock.acquire()
+        try:
+            if self._conn is None:
+                self._stream.write(data)
+                return
+            if not isinstance(data, bytes):
+                data = data.encode(self.encoding, "replace")
+            if data:
+                try:
+                    send_message(self._conn, self._channel, data)
+                except socket.error:
+                    # client gone: the command still runs to completion
+                    self._conn = None
+        finally:
+            self._lock.release()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self._conn is None:
+            self._stream.flush()
+
+    def isatty(self):
+        return False
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime)
+
+class _ProjectState(object):
+    """Global context of a project kept between commands."""
+    def __init__(self, popts):
+        self.top_node, self.build_node, self.run_node = create_nodes(popts)
+        options_context = create_global_options_context()
+        self.global_context = create_global_context(options_context, popts, self.build_node)
+        self.cached_package, self.shutdown_hooks = \
+                prepare_global_context(self.global_context, self.top_node, self.build_node)
+
+        bento_info = self.top_node.find_node(BENTO_SCRIPT)
+        if self.cached_package is not None and bento_info is not None:
+            files = _description_files(self.cached_package.get_package(bento_info),
+                                       self.top_node)
+        else:
+            files = [self.top_node.make_node(BENTO_SCRIPT).abspath()]
+        self._description_signatures = dict((f, _file_signature(f)) for f in files)
+
+        self._cmd_data = self.build_node.make_node(CMD_DATA_DUMP).abspath()
+        self._cmd_data_signature = _file_signature(self._cmd_data)
+        self._configure_argv = self.global_context.retrieve_command_argv("configure")
+
+    def is_outdated(self):
+        """Return True if the state must be set up again: the package
+        description or the commands data were modified, or the configure
+        arguments changed."""
+        for f, signature in self._description_signatures.items():
+            if _file_signature(f) != signature:
+                return True
+        if _file_signature(self._cmd_data) != self._cmd_data_signature:
+            return True
+        return self.global_context.retrieve_command_argv("configure") != self._configure_argv
+
+    def run(self, popts):
+        try:
+            _main(self.global_context, self.cached_package, popts, self.run_node,
+                  self.top_node, self.build_node)
+        finally:
+            if self.shutdown_hooks:
+                self.shutdown_hooks[0](self.global_context)
+            # the commands data are written by every command
+            self._cmd_data_signature = _file_signature(self._cmd_data)
+
+class DaemonServer(object):
+    """Server of the commands of the project in the current directory, for
+    the given global options."""
+    def __init__(self, popts, idle_timeout=DAEMON_IDLE_TIMEOUT):
+        self.popts = popts
+        self.idle_timeout = idle_timeout
+        self.cwd = os.getcwd()
+        self.socket_path = socket_path(popts.build_directory)
+        self._state = None
+        self._stdout = self._stderr = None
+
+    def _bind(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise bento.errors.UsageException("bentomaker server is not supported on this platform")
+        if os.path.exists(self.socket_path):
+            if self._is_alive():
+                raise bento.errors.UsageException("A bentomaker server is already running for %s" \
+                                                  % self.popts.build_directory)
+            # stale socket of a dead server
+            os.remove(self.socket_path)
+        elif not os.path.exists(os.path.dirname(self.socket_path)):
+            os.makedirs(os.path.dirname(self.socket_path))
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the user may connect
+        old_umask = os.umask(int("077", 8))
+        try:
+            sock.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        sock.listen(5)
+        return sock
+
+    def _is_alive(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                sock.connect(self.socket_path)
+                return True
+            except socket.error:
+                return False
+        finally:
+            sock.close()
+
+    def serve(self):
+        """Serve commands until stopped, or idle for idle_timeout seconds."""
+        sock = self._bind()
+        pprint("GREEN", "bentomaker server listening on %s" % self.socket_path)
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        self._stdout = sys.stdout = _ChannelWriter(STDOUT, old_stdout)
+        self._stderr = sys.stderr = _ChannelWriter(STDERR, old_stderr)
+        try:
+            sock.settimeout(self.idle_timeout)
+            while True:
+                try:
+                    conn, address = sock.accept()
+                except socket.timeout:
+                    break
+                try:
+                    conn.settimeout(None)
+                    if not self._handle(conn):
+                        break
+                except (EOFError, socket.error):
+                    # client gone
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            sock.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def _handle(self, conn):
+        # Return False if the server must stop
+        channel, data = recv_message(conn)
+        if channel != REQUEST:
+            return True
+        request = cPickle.loads(data)
+        if request["version"] != tuple(sys.version_info[:2]) or request["cwd"] != self.cwd:
+            send_message(conn, REJECT, data[:0])
+            return True
+        if request["stop"]:
+            send_message(conn, EXIT, "0".encode("ascii"))
+            return False
+
+        status = self._run_request(conn, request)
+        if status is None:
+            send_message(conn, REJECT, data[:0])
+        else:
+            send_message(conn, EXIT, str(status).encode("ascii"))
+        return True
+
+    def _run_request(self, conn, request):
+        old_environ = dict(os.environ)
+        self._stdout.attach(conn)
+        self._stderr.attach(conn)
+        os.environ.clear()
+        os.environ.update(request["env"])
+        try:
+            try:
+                return self._run(request["argv"])
+            except SystemExit:
+                # e.g. option parsing errors
+                e = extract_exception()
+                if e.code is None:
+                    return 0
+                elif isinstance(e.code, int):
+                    return e.code
+                else:
+                    sys.stderr.write("%s\n" % e.code)
+                    return 1
+        finally:
+            self._stdout.detach()
+            self._stderr.detach()
+            os.environ.clear()
+            os.environ.update(old_environ)
+
+    def _run(self, argv):
+        # Return the exit status, or None if the command must be run by the
+        # client itself
+        popts = parse_global_options(create_global_options_context(), argv)
+        if (popts.build_directory, popts.bento_info, popts.disable_autoconfigure) != \
+                (self.popts.build_directory, self.popts.bento_info, self.popts.disable_autoconfigure):
+            return None
+        if not popts.cmd_name in DAEMON_COMMANDS or popts.show_usage or "--watch" in popts.cmd_argv:
+            return None
+
+        if self._state is not None and self._state.is_outdated():
+            self._state = None
+        def _run_command():
+            if self._state is None:
+                self._state = _ProjectState(popts)
+            self._state.run(popts)
+        return run_noexc(_run_command)
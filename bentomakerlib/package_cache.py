@@ -1,14 +1,20 @@
 """
-Cache version 1
+Cache version 4
 
 db["version"] : version number
 db["magic"]   : "BENTOMAGIC"
-db["bento_checkums"] : pickled dictionary {filename: checksum(filename)} for
-                       each bento.info (including subentos)
-db["package_description"] : pickled PackageDescription instance
-db["user_flags"] : pickled user_flags dict
+db["bentos_signatures"] : dictionary {filename: (stat_key, checksum)} for
+                          each bento.info (including subentos) and hook
+                          file, where stat_key is (size, mtime_ns, inode)
+db["packages"] : list of (user_flags_key, pickled PackageDescription) pairs,
+                 most recently used first, where user_flags_key is
+                 frozenset(user_flags.items()). At most cache_size entries
+                 are kept.
 db["parsed_dict"]: pickled raw parsed dictionary (as returned by
                    raw_parse, before having been seen by the visitor)
+
+A file is only checksummed again when its stat_key changed since the last
+run, and the db is only written back to disk when something changed.
 """
 import os
 import sys
@@ -24,6 +30,9 @@ from bento.core.options \
     import \
         raw_to_options_kw, PackageOptions
 from bento.utils.utils import extract_exception
+from bento._config \
+    import \
+        PACKAGE_CACHE_SIZE
 import bento.utils.path
 import bento.utils.io2
 
@@ -39,25 +48,26 @@ except ImportError:
 
 
 class CachedPackage(object):
-    def __init__(self, db_node):
+    def __init__(self, db_node, cache_size=PACKAGE_CACHE_SIZE):
         self._db_location = db_node
+        self._cache_size = cache_size
 
     def get_package(self, bento_info, user_flags=None):
-        cache = _CachedPackageImpl(self._db_location.abspath())
+        cache = _CachedPackageImpl(self._db_location.abspath(), self._cache_size)
         try:
             return cache.get_package(bento_info, user_flags)
         finally:
             cache.close()
 
     def get_options(self, bento_info):
-        cache = _CachedPackageImpl(self._db_location.abspath())
+        cache = _CachedPackageImpl(self._db_location.abspath(), self._cache_size)
         try:
             return cache.get_options(bento_info)
         finally:
             cache.close()
 
 class _CachedPackageImpl(object):
-    __version__ = "2"
+    __version__ = "4"
     __magic__ = "CACHED_PACKAGE_BENTOMAGIC"
 
     def _has_valid_magic(self, db):
@@ -75,6 +85,7 @@ class _CachedPackageImpl(object):
         self.db["magic"] = self.__magic__
         self.db["version"] = self.__version__
         self._first_time = True
+        self._dirty = True
 
     def _load_existing_cache(self, db_location):
         fid = open(db_location, "rb")
@@ -83,6 +94,7 @@ class _CachedPackageImpl(object):
             if not self._has_valid_magic(db):
                 warnings.warn("Resetting invalid cached db")
                 self._reset()
+                return self.db
         finally:
             fid.close()
 
@@ -90,12 +102,17 @@ class _CachedPackageImpl(object):
         if version != self.__version__:
             warnings.warn("Resetting invalid version of cached db")
             self._reset()
+            return self.db
 
         return db
 
-    def __init__(self, db_location):
+    def __init__(self, db_location, cache_size=PACKAGE_CACHE_SIZE):
+        if cache_size < 1:
+            raise ValueError("Invalid cache size %r (should be >= 1)" % (cache_size,))
         self._location = db_location
+        self._cache_size = cache_size
         self._first_time = False
+        self._dirty = False
         if not os.path.exists(db_location):
             bento.utils.path.ensure_dir(db_location)
             self._reset()
@@ -108,12 +125,22 @@ class _CachedPackageImpl(object):
                 self._reset()
 
     def _has_invalidated_cache(self):
-        if "bentos_checksums" in self.db:
-            r_checksums = pickle.loads(self.db["bentos_checksums"])
-            for f in r_checksums:
-                checksum = md5(open(f, "rb").read()).hexdigest()
-                if checksum != r_checksums[f]:
+        if "bentos_signatures" in self.db:
+            signatures = self.db["bentos_signatures"]
+            for f, (stat_key, checksum) in signatures.items():
+                try:
+                    current_stat_key = _stat_key(f)
+                except OSError:
+                    return True
+                if current_stat_key == stat_key:
+                    continue
+                if _checksum(f) != checksum:
                     return True
+                # Content is unchanged (touched file, checkout, etc...):
+                # remember the new stat so that the next run does not need to
+                # read the file again
+                signatures[f] = (current_stat_key, checksum)
+                self._dirty = True
             return False
         else:
             return True
@@ -130,21 +157,36 @@ class _CachedPackageImpl(object):
     def _get_package(self, bento_info, user_flags=None):
         if self._first_time:
             self._first_time = False
+            self._dirty = True
             return _create_package_nocached(bento_info, user_flags, self.db)
         else:
             if self._has_invalidated_cache():
+                self._dirty = True
                 return _create_package_nocached(bento_info, user_flags, self.db)
             else:
-                r_user_flags = pickle.loads(self.db["user_flags"])
-                if user_flags is None:
-                    # FIXME: this case is wrong
-                    return pickle.loads(self.db["package_description"])
-                elif r_user_flags != user_flags:
-                    return _create_package_nocached(bento_info, user_flags, self.db)
-                else:
+                key = _user_flags_key(user_flags)
+                pkg = self._lookup_package(key)
+                if pkg is None:
                     raw = pickle.loads(self.db["parsed_dict"])
                     pkg, files = _raw_to_pkg(raw, user_flags, bento_info)
-                    return pkg
+                    self._store_package(key, pickle.dumps(pkg))
+                return pkg
+
+    def _lookup_package(self, key):
+        packages = self.db["packages"]
+        for i, (k, pickled_pkg) in enumerate(packages):
+            if k == key:
+                if i > 0:
+                    packages.insert(0, packages.pop(i))
+                    self._dirty = True
+                return pickle.loads(pickled_pkg)
+        return None
+
+    def _store_package(self, key, pickled_pkg):
+        packages = self.db["packages"]
+        packages.insert(0, (key, pickled_pkg))
+        del packages[self._cache_size:]
+        self._dirty = True
 
     def get_options(self, bento_info):
         try:
@@ -158,16 +200,40 @@ class _CachedPackageImpl(object):
     def _get_options(self, bento_info):
         if self._first_time:
             self._first_time = False
+            self._dirty = True
             return _create_options_nocached(bento_info, {}, self.db)
         else:
             if self._has_invalidated_cache():
+                self._dirty = True
                 return _create_options_nocached(bento_info, {}, self.db)
             else:
                 raw = pickle.loads(self.db["parsed_dict"])
                 return _raw_to_options(raw)
 
     def close(self):
-        bento.utils.io2.safe_write(self._location, lambda fd: pickle.dump(self.db, fd))
+        if self._dirty:
+            bento.utils.io2.safe_write(self._location, lambda fd: pickle.dump(self.db, fd))
+            self._dirty = False
+
+def _stat_key(filename):
+    st = os.stat(filename)
+    mtime_ns = getattr(st, "st_mtime_ns", None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1e9)
+    return (st.st_size, mtime_ns, st.st_ino)
+
+def _checksum(filename):
+    fid = open(filename, "rb")
+    try:
+        return md5(fid.read()).hexdigest()
+    finally:
+        fid.close()
+
+def _user_flags_key(user_flags):
+    # No user flags means every flag takes its default value
+    if user_flags is None:
+        user_flags = {}
+    return frozenset(user_flags.items())
 
 def _create_package_nocached(bento_info, user_flags, db):
     pkg, options = _create_objects_no_cached(bento_info, user_flags, db)
@@ -195,12 +261,18 @@ def _create_objects_no_cached(bento_info, user_flags, db):
 
         pkg, files = _raw_to_pkg(raw, user_flags, bento_info)
         files = [os.path.join(d, f) for f in files]
+        if pkg.description_from_file:
+            files.append(os.path.join(d, pkg.description_from_file))
         options = _raw_to_options(raw)
 
-        checksums = [md5(open(f, "rb").read()).hexdigest() for f in files]
-        db["bentos_checksums"] = pickle.dumps(dict(zip(files, checksums)))
-        db["package_description"] = pickle.dumps(pkg)
-        db["user_flags"] = pickle.dumps(user_flags)
+        # stat before reading so that a modification racing with us is seen
+        # as a stat change on the next run
+        signatures = {}
+        for f in files:
+            stat_key = _stat_key(f)
+            signatures[f] = (stat_key, _checksum(f))
+        db["bentos_signatures"] = signatures
+        db["packages"] = [(_user_flags_key(user_flags), pickle.dumps(pkg))]
         db["parsed_dict"] = pickle.dumps(raw)
 
         return pkg, options
@@ -0,0 +1,11 @@
+from bento.core.testing \
+    import \
+        disable_conftest_cache
+
+_RESTORE = []
+
+def setup_package():
+    _RESTORE.append(disable_conftest_cache())
+
+def teardown_package():
+    _RESTORE.pop()()
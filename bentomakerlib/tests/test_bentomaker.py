@@ -1,7 +1,10 @@
 import os
+import re
 import sys
+import time
 import tempfile
 import shutil
+import subprocess
 
 import os.path as op
 
@@ -152,6 +155,36 @@ Name: foo
     def test_mpkg(self):
         main(["build_mpkg"])
 
+class TestReproducibleEgg(Common):
+    def _build_egg(self, tz, output):
+        try:
+            with mock.patch.dict(os.environ, {"TZ": tz, "SOURCE_DATE_EPOCH": "1600000000"}):
+                time.tzset()
+                main(["build_egg", "--reproducible", "--output-file=%s" % output])
+        finally:
+            time.tzset()
+        f = open(op.join("dist", output), "rb")
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    @unittest.skipIf(not hasattr(time, "tzset"), "time.tzset is not available on this platform")
+    @unittest.skipIf(sys.version_info[:2] >= (3, 4), "bento cannot byte-compile on python >= 3.4")
+    def test_timezone(self):
+        self.top_node.make_node("bento.info").write("""\
+Name: foo
+
+Library:
+    Packages: foo
+""")
+        self.top_node.make_node("foo").mkdir()
+        self.top_node.make_node(op.join("foo", "__init__.py")).write("")
+
+        egg = self._build_egg("UTC0", "utc.egg")
+        self.assertEqual(self._build_egg("JST-9", "jst.egg"), egg)
+        self.assertEqual(self._build_egg("EST5EDT", "est.egg"), egg)
+
 # Add SubprocessTestCase mixin as convert depends on distutils which uses
 # globals
 class TestConvertCommand(Common, SubprocessTestCase):
@@ -402,3 +435,56 @@ def startup(context):
         self.assertRaises(ValueError, _wrapped_main,
                           global_context, popts, self.run_node, self.top_node,
                            self.build_node)
+
+_STARTUP_SCRIPT = """\
+import sys
+from bentomakerlib.bentomaker import main
+main(%(argv)r)
+sys.stderr.write("modules: %%s\\n" %% " ".join(sorted(sys.modules)))
+"""
+
+# Modules which are only needed by commands other than help/build
+_LAZY_MODULES = ["bento.commands.register", "bento.commands.upload",
+                 "bento.commands.sphinx_command", "bento.convert", "bento.pypi"]
+
+class TestStartup(Common):
+    """Check that bentomaker only imports what a command needs."""
+    def _run(self, argv):
+        root = op.dirname(op.dirname(op.abspath(bentomakerlib.__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([root, env.get("PYTHONPATH", "")])
+        cmd = [sys.executable, "-c", _STARTUP_SCRIPT % {"argv": argv}]
+        p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, env=env)
+        # answer 'y' if bentomaker asks for confirmation when run as root
+        out, err = p.communicate("y\n".encode())
+        err = err.decode()
+        self.assertEqual(p.returncode, 0, err)
+        return err
+
+    def _check_startup(self, argv, lazy_modules):
+        err = self._run(argv)
+
+        modules = re.search("^modules: (.*)$", err, re.M).group(1).split()
+        for m in modules:
+            for lazy_module in lazy_modules:
+                if m == lazy_module or m.startswith(lazy_module + "."):
+                    self.fail("%r imported by 'bentomaker %s'" % (m, " ".join(argv)))
+
+    def test_help(self):
+        self._check_startup(["help"], _LAZY_MODULES)
+
+    def test_noop_build(self):
+        self.top_node.make_node("bento.info").write("""\
+Name: foo
+
+Library:
+    Packages: foo
+""")
+        self.top_node.make_node("foo").mkdir()
+        self.top_node.make_node(op.join("foo", "__init__.py")).write("")
+        self._run(["build"])
+
+        self._check_startup(["build"], _LAZY_MODULES +
+                            ["bento.commands.build_egg", "bento.commands.build_wininst",
+                             "bento.commands.sdist"])
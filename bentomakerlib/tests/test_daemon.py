@@ -0,0 +1,107 @@
+import os
+import time
+import socket
+import tempfile
+import shutil
+import threading
+
+import os.path as op
+
+import mock
+
+from bento.compat.api.moves \
+    import \
+        unittest
+from bento.core.node \
+    import \
+        create_base_nodes
+from bento.core.testing \
+    import \
+        skip_if
+
+from bentomakerlib.bentomaker \
+    import \
+        parse_global_options, create_global_options_context
+from bentomakerlib.client \
+    import \
+        run_client, socket_path
+from bentomakerlib.daemon \
+    import \
+        DaemonServer
+
+BENTO_INFO = """\
+Name: foo
+"""
+
+@skip_if(not hasattr(socket, "AF_UNIX"), "unix sockets are not available on this platform")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        super(TestDaemon, self).setUp()
+
+        self.d = tempfile.mkdtemp()
+        self.old = os.getcwd()
+        os.chdir(self.d)
+        self.top_node = create_base_nodes(self.d, op.join(self.d, "build"), self.d)[0]
+        self.top_node.make_node("bento.info").write(BENTO_INFO)
+
+        # client and server run in the same process here: the client output
+        # must not go through the server streams
+        self.output = []
+        self._output_patch = mock.patch("bentomakerlib.client._output",
+                                        lambda stream, data: self.output.append(data))
+        self._output_patch.start()
+
+        popts = parse_global_options(create_global_options_context(), ["--daemon"])
+        self.server = DaemonServer(popts, idle_timeout=60)
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+        for i in range(100):
+            if op.exists(self.server.socket_path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        try:
+            if self.thread.is_alive():
+                run_client([], stop=True)
+                self.thread.join()
+        finally:
+            self._output_patch.stop()
+            os.chdir(self.old)
+            shutil.rmtree(self.d)
+            super(TestDaemon, self).tearDown()
+
+    def test_commands(self):
+        self.assertEqual(run_client(["configure"]), 0)
+        self.assertEqual(run_client(["build"]), 0)
+        state = self.server._state
+        self.assertEqual(run_client(["build"]), 0)
+        self.assertTrue(self.server._state is state)
+        self.assertEqual(run_client(["sdist"]), 0)
+        self.assertTrue(op.exists(op.join("dist", "foo.tar.gz")))
+
+    def test_outdated(self):
+        self.assertEqual(run_client(["configure"]), 0)
+        state = self.server._state
+
+        self.top_node.make_node("bento.info").write(BENTO_INFO + "Version: 1.0\n")
+        # make sure the signature changes on filesystems with a coarse mtime
+        os.utime("bento.info", (time.time() + 10, time.time() + 10))
+        self.assertEqual(run_client(["build"]), 0)
+        self.assertTrue(self.server._state is not state)
+
+    def test_error(self):
+        self.assertEqual(run_client(["build", "--floupi"]), 2)
+        self.assertTrue(self.output)
+
+    def test_rejected(self):
+        self.assertEqual(run_client(["convert"]), None)
+        self.assertEqual(run_client(["build", "--watch"]), None)
+        self.assertEqual(run_client(["--build-directory=build2", "build"]), None)
+        self.assertEqual(self.server._state, None)
+
+    def test_stop(self):
+        self.assertEqual(run_client([], stop=True), 0)
+        self.thread.join()
+        self.assertFalse(op.exists(socket_path("build")))
+        self.assertEqual(run_client(["build"]), None)
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+
+import os.path as op
+
+import mock
+
+from bento.compat.api.moves \
+    import \
+        unittest
+from bento.core.node \
+    import \
+        create_base_nodes
+
+from bentomakerlib.package_cache \
+    import \
+        CachedPackage, _CachedPackageImpl
+
+BENTO_INFO = """\
+Name: foo
+
+Flag: debug
+    Description: debug flag
+    Default: false
+
+Library:
+    if flag(debug):
+        Packages: foo_debug
+    else:
+        Packages: foo
+"""
+
+class TestCachedPackage(unittest.TestCase):
+    def setUp(self):
+        super(TestCachedPackage, self).setUp()
+
+        self.d = tempfile.mkdtemp()
+        self.top_node, self.build_node, self.run_node = \
+                create_base_nodes(self.d, op.join(self.d, "build"), self.d)
+        self.bento_info = self.top_node.make_node("bento.info")
+        self.bento_info.write(BENTO_INFO)
+        self.db_node = self.build_node.make_node(op.join("bento", "cache.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.d)
+        super(TestCachedPackage, self).tearDown()
+
+    def _touch(self, n, delta=10):
+        st = os.stat(n.abspath())
+        os.utime(n.abspath(), (st.st_atime + delta, st.st_mtime + delta))
+
+    def test_first_time(self):
+        cached_package = CachedPackage(self.db_node)
+        package = cached_package.get_package(self.bento_info, {"debug": False})
+        self.assertEqual(package.packages, ["foo"])
+        self.assertTrue(op.exists(self.db_node.abspath()))
+
+    def test_clean_cache_not_written(self):
+        cached_package = CachedPackage(self.db_node)
+        cached_package.get_package(self.bento_info, {"debug": False})
+
+        with mock.patch("bento.utils.io2.safe_write") as safe_write:
+            package = cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertEqual(package.packages, ["foo"])
+            self.assertFalse(safe_write.called)
+
+    def test_unchanged_stat_not_checksummed(self):
+        cached_package = CachedPackage(self.db_node)
+        cached_package.get_package(self.bento_info, {"debug": False})
+
+        with mock.patch("bentomakerlib.package_cache._checksum") as checksum:
+            cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertFalse(checksum.called)
+
+    def test_touched_file(self):
+        cached_package = CachedPackage(self.db_node)
+        cached_package.get_package(self.bento_info, {"debug": False})
+        self._touch(self.bento_info)
+
+        with mock.patch("bentomakerlib.package_cache._create_package_nocached") as create:
+            package = cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertEqual(package.packages, ["foo"])
+            self.assertFalse(create.called)
+
+        # The new stat is stored, so the file is not checksummed anymore
+        with mock.patch("bentomakerlib.package_cache._checksum") as checksum:
+            cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertFalse(checksum.called)
+
+    def test_modified_file(self):
+        cached_package = CachedPackage(self.db_node)
+        cached_package.get_package(self.bento_info, {"debug": False})
+
+        self.bento_info.write(BENTO_INFO.replace("Packages: foo\n", "Packages: bar\n"))
+        self._touch(self.bento_info)
+        package = cached_package.get_package(self.bento_info, {"debug": False})
+        self.assertEqual(package.packages, ["bar"])
+
+    def test_flags_switch(self):
+        cached_package = CachedPackage(self.db_node)
+        package = cached_package.get_package(self.bento_info, {"debug": False})
+        self.assertEqual(package.packages, ["foo"])
+        package = cached_package.get_package(self.bento_info, {"debug": True})
+        self.assertEqual(package.packages, ["foo_debug"])
+
+        with mock.patch("bentomakerlib.package_cache._raw_to_pkg") as raw_to_pkg:
+            package = cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertEqual(package.packages, ["foo"])
+            package = cached_package.get_package(self.bento_info, {"debug": True})
+            self.assertEqual(package.packages, ["foo_debug"])
+            self.assertFalse(raw_to_pkg.called)
+
+    def test_invalid_version(self):
+        cached_package = CachedPackage(self.db_node)
+        cached_package.get_package(self.bento_info, {"debug": False})
+
+        with mock.patch.object(_CachedPackageImpl, "__version__", "0"):
+            with mock.patch("warnings.warn") as warn:
+                package = cached_package.get_package(self.bento_info, {"debug": False})
+                self.assertEqual(package.packages, ["foo"])
+                self.assertTrue(warn.called)
+
+    def test_default_flags(self):
+        cached_package = CachedPackage(self.db_node)
+        package = cached_package.get_package(self.bento_info, {"debug": True})
+        self.assertEqual(package.packages, ["foo_debug"])
+
+        # No user flags means default flag values, not the last evaluated ones
+        package = cached_package.get_package(self.bento_info)
+        self.assertEqual(package.packages, ["foo"])
+
+    def test_lru_eviction(self):
+        cached_package = CachedPackage(self.db_node, 2)
+        cached_package.get_package(self.bento_info, {"debug": False})
+        cached_package.get_package(self.bento_info, {"debug": True})
+        # Use the first entry again so that it becomes the most recent one
+        cached_package.get_package(self.bento_info, {"debug": False})
+        cached_package.get_package(self.bento_info, {"debug": "false"})
+
+        with mock.patch("bentomakerlib.package_cache._raw_to_pkg") as raw_to_pkg:
+            package = cached_package.get_package(self.bento_info, {"debug": False})
+            self.assertEqual(package.packages, ["foo"])
+            self.assertFalse(raw_to_pkg.called)
+
+        with mock.patch("bentomakerlib.package_cache._raw_to_pkg") as raw_to_pkg:
+            raw_to_pkg.return_value = (None, [])
+            cached_package.get_package(self.bento_info, {"debug": True})
+            self.assertTrue(raw_to_pkg.called)
+
+    def test_invalid_cache_size(self):
+        self.assertRaises(ValueError, lambda: CachedPackage(self.db_node, 0).get_package(self.bento_info))
@@ -0,0 +1,74 @@
+"""
+Benchmark for the evaluation of parsed bento.info files (ast_walk +
+Dispatcher), i.e. the part of startup which is paid every time a package
+description is created from a parsed (or cached) bento.info.
+
+Usage::
+
+    python tools/bench_ast_walk.py [-n repeat]
+"""
+import os
+import sys
+import glob
+import time
+import optparse
+
+import os.path as op
+
+sys.path.insert(0, op.abspath(op.join(op.dirname(__file__), os.pardir)))
+try:
+    from bento.parser.misc import raw_parse, build_ast_from_raw_dict
+finally:
+    sys.path.pop(0)
+
+ROOT = op.abspath(op.join(op.dirname(__file__), os.pardir))
+
+def synthetic_bento_info(n_lines=5000):
+    """Create a bento.info of roughly n_lines lines, with one conditional
+    extension every nine lines."""
+    lines = ["Name: synthetic", "Version: 1.0", "",
+             "Flag: debug", "    Description: debug flag", "    Default: false", "",
+             "Library:", "    Packages: synthetic"]
+    i = 0
+    while len(lines) < n_lines:
+        lines.extend(["    if flag(debug):",
+                      "        Extension: synthetic._ext%d" % i,
+                      "            Sources:",
+                      "                src/ext%d/a.c," % i,
+                      "                src/ext%d/b.c" % i,
+                      "    else:",
+                      "        Extension: synthetic._ext%d" % i,
+                      "            Sources: src/ext%d/a.c" % i,
+                      "            IncludeDirs: src/ext%d/include" % i])
+        i += 1
+    return "\n".join(lines) + "\n"
+
+def bench(raw, repeat):
+    t0 = time.time()
+    for i in range(repeat):
+        build_ast_from_raw_dict(raw, {"debug": "false"})
+    return (time.time() - t0) / repeat
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = optparse.OptionParser(usage="%prog [options]")
+    p.add_option("-n", "--repeat", type="int", dest="repeat", default=20)
+    o, a = p.parse_args(argv)
+
+    examples = sorted(glob.glob(op.join(ROOT, "examples", "*", "*", "bento.info")))
+    total = 0.0
+    for f in examples:
+        fid = open(f)
+        try:
+            raw = raw_parse(fid.read(), f)
+        finally:
+            fid.close()
+        total += bench(raw, o.repeat)
+    print("examples (%d bento.info): %.3f ms" % (len(examples), total * 1e3))
+
+    raw = raw_parse(synthetic_bento_info())
+    print("synthetic (5000 lines): %.3f ms" % (bench(raw, o.repeat) * 1e3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark for the resolution of the paths of a build manifest, i.e. the
+substitution of the path variables in every section and the computation of
+every installed file path, as done by install.
+
+Usage::
+
+    python tools/bench_build_manifest.py [-n files] [-s files per section]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+
+import os.path as op
+
+sys.path.insert(0, op.abspath(op.join(op.dirname(__file__), os.pardir)))
+try:
+    from bento.core.node \
+        import \
+            create_root_with_source_tree
+    from bento.installed_package_description \
+        import \
+            BuildManifest, InstalledSection
+finally:
+    sys.path.pop(0)
+
+_META = {"name": "bench", "version": "1.0"}
+
+def synthetic_manifest(n_files=50000, files_per_section=10):
+    """Create a build manifest of n_files python files, in sections of
+    files_per_section files each installed in its own package directory."""
+    sections = {}
+    for i in range(0, n_files, files_per_section):
+        name = "pkg%d" % (i // files_per_section)
+        files = ["%s/mod%d.py" % (name, j) for j in range(i, min(i + files_per_section, n_files))]
+        sections[name] = InstalledSection.from_source_target_directories("pythonfiles",
+                name, "$_srcrootdir", "$sitedir", files)
+    return BuildManifest({"pythonfiles": sections}, _META, {})
+
+def bench(build_manifest, top_node):
+    t0 = time.time()
+    n = 0
+    for category, source, target in build_manifest.iter_file_paths(top_node, use_destdir=True):
+        n += 1
+    return n, time.time() - t0
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = optparse.OptionParser(usage="%prog [options]")
+    p.add_option("-n", "--files", type="int", dest="files", default=50000)
+    p.add_option("-s", "--section-size", type="int", dest="section_size", default=10)
+    o, a = p.parse_args(argv)
+
+    d = tempfile.mkdtemp()
+    try:
+        root = create_root_with_source_tree(d, op.join(d, "build"))
+        build_manifest = synthetic_manifest(o.files, o.section_size)
+        build_manifest.update_paths({"destdir": op.join(d, "destdir")})
+        n, elapsed = bench(build_manifest, root.find_node(d))
+        print("%d files in sections of %d: %.3f ms" % (n, o.section_size, elapsed * 1e3))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark for the startup of bentomaker, i.e. the wall time taken to import
+bentomaker and run 'bentomaker help' and a no-op 'bentomaker build' on a
+trivial package. The interpreter startup itself is not counted.
+
+Usage::
+
+    python tools/bench_startup.py [-r repeat] [-b budget in ms]
+
+If a budget is given, exit with an error when the best run of a command takes
+longer than the budget.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+import os.path as op
+
+ROOT = op.abspath(op.join(op.dirname(__file__), os.pardir))
+
+_SCRIPT = """\
+import sys
+import time
+t0 = time.time()
+from bentomakerlib.bentomaker import main
+main(%(argv)r)
+sys.stderr.write("time: %%f\\n" %% (time.time() - t0))
+"""
+
+_BENTO_INFO = """\
+Name: foo
+
+Library:
+    Packages: foo
+"""
+
+def run_bentomaker(argv, cwd):
+    """Run bentomaker in a new interpreter, and return the time (in s) spent
+    importing and running it."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, env.get("PYTHONPATH", "")])
+    p = subprocess.Popen([sys.executable, "-c", _SCRIPT % {"argv": argv}], cwd=cwd,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, env=env)
+    # answer 'y' if bentomaker asks for confirmation when run as root
+    out, err = p.communicate("y\n".encode())
+    err = err.decode()
+    if p.returncode != 0:
+        raise RuntimeError("bentomaker %s failed:\n%s" % (" ".join(argv), err))
+    for line in err.splitlines():
+        if line.startswith("time: "):
+            return float(line[len("time: "):])
+    raise RuntimeError("no timing in bentomaker %s output:\n%s" % (" ".join(argv), err))
+
+def bench(argv, cwd, repeat):
+    return min(run_bentomaker(argv, cwd) for i in range(repeat))
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = optparse.OptionParser(usage="%prog [options]")
+    p.add_option("-r", "--repeat", type="int", dest="repeat", default=5)
+    p.add_option("-b", "--budget", type="float", dest="budget", default=None)
+    o, a = p.parse_args(argv)
+
+    d = tempfile.mkdtemp()
+    try:
+        f = open(op.join(d, "bento.info"), "w")
+        try:
+            f.write(_BENTO_INFO)
+        finally:
+            f.close()
+        os.mkdir(op.join(d, "foo"))
+        open(op.join(d, "foo", "__init__.py"), "w").close()
+        # configure once so that the timed builds are no-op
+        run_bentomaker(["build"], d)
+
+        over_budget = False
+        for command in ["help", "build"]:
+            elapsed = bench([command], d, o.repeat) * 1e3
+            print("bentomaker %s: %.1f ms" % (command, elapsed))
+            if o.budget is not None and elapsed > o.budget:
+                over_budget = True
+    finally:
+        shutil.rmtree(d)
+
+    if over_budget:
+        sys.exit("bentomaker startup over budget (%.1f ms)" % o.budget)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark for the yaku TaskManager, i.e. the grouping and ordering of tasks
+done before any task is run by the serial runner.
+
+Usage::
+
+    python tools/bench_task_manager.py [-n tasks] [-g groups]
+"""
+import os
+import sys
+import time
+import optparse
+
+import os.path as op
+
+sys.path.insert(0, op.abspath(op.join(op.dirname(__file__), os.pardir, "bento", "private", "_yaku")))
+try:
+    from yaku.task \
+        import \
+            task_factory
+    from yaku.task_manager \
+        import \
+            TaskManager
+finally:
+    sys.path.pop(0)
+
+class _Node(object):
+    def __init__(self, name):
+        self.name = name
+
+def synthetic_tasks(n_tasks=10000, n_groups=1000):
+    """Create n_tasks tasks split in n_groups groups. Half of the groups form
+    a chain (each one consumes the extension produced by the previous one),
+    the other half are independent compilations."""
+    classes = [task_factory("bench%d" % i) for i in range(n_groups)]
+    tasks = []
+    for i in range(n_tasks):
+        g = i % n_groups
+        if g % 2:
+            ext_in, ext_out = ".c%d" % g, ".o%d" % g
+        else:
+            ext_in, ext_out = ".o%d" % (g - 2), ".o%d" % g
+        tasks.append(classes[g](inputs=[_Node("t%d%s" % (i, ext_in))],
+                                outputs=[_Node("t%d%s" % (i, ext_out))], env={}))
+    return tasks
+
+def bench(tasks):
+    t0 = time.time()
+    manager = TaskManager(tasks)
+    n = 0
+    grp = manager.next_set()
+    while grp:
+        n += len(grp)
+        grp = manager.next_set()
+    assert n == len(tasks)
+    return time.time() - t0
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    p = optparse.OptionParser(usage="%prog [options]")
+    p.add_option("-n", "--tasks", type="int", dest="tasks", default=10000)
+    p.add_option("-g", "--groups", type="int", dest="groups", default=1000)
+    o, a = p.parse_args(argv)
+
+    tasks = synthetic_tasks(o.tasks, o.groups)
+    print("%d tasks in %d groups: %.3f ms" % (o.tasks, o.groups, bench(tasks) * 1e3))
+
+if __name__ == "__main__":
+    main()